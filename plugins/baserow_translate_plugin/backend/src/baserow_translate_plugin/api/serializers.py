@@ -0,0 +1,29 @@
+from rest_framework import serializers
+
+from baserow_translate_plugin.budgets import estimate_cost
+from baserow_translate_plugin.models import FieldRecomputeJob
+
+
+class FieldRecomputeJobSerializer(serializers.ModelSerializer):
+    estimated_cost = serializers.SerializerMethodField()
+
+    class Meta:
+        model = FieldRecomputeJob
+        fields = (
+            'id',
+            'field_id',
+            'state',
+            'progress_percentage',
+            'last_row_id',
+            'error',
+            'estimated_tokens',
+            'estimated_cost',
+            'created_on',
+            'updated_on',
+        )
+
+    def get_estimated_cost(self, job):
+        """in dollars, from BASEROW_TRANSLATE_PLUGIN_CHATGPT_PRICE_PER_1K_TOKENS"""
+        if job.estimated_tokens == None:
+            return None
+        return round(estimate_cost(job.estimated_tokens), 4)
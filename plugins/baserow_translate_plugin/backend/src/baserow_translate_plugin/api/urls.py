@@ -0,0 +1,14 @@
+from django.urls import re_path
+
+from .views import FieldRecomputeJobView, MetricsView
+
+app_name = "baserow_translate_plugin.api"
+
+urlpatterns = [
+    re_path(
+        r"fields/(?P<field_id>[0-9]+)/recompute-job/$",
+        FieldRecomputeJobView.as_view(),
+        name="recompute_job",
+    ),
+    re_path(r"metrics/$", MetricsView.as_view(), name="metrics"),
+]
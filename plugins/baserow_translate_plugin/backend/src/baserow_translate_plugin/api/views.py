@@ -0,0 +1,94 @@
+import hmac
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.http import HttpResponse
+from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.status import HTTP_204_NO_CONTENT
+from rest_framework.views import APIView
+
+from baserow.api.decorators import map_exceptions
+from baserow.contrib.database.api.fields.errors import ERROR_FIELD_DOES_NOT_EXIST
+from baserow.contrib.database.fields.exceptions import FieldDoesNotExist
+from baserow.contrib.database.fields.handler import FieldHandler
+from baserow.contrib.database.fields.operations import (
+    ReadFieldOperationType,
+    UpdateFieldOperationType,
+)
+from baserow.core.handler import CoreHandler
+
+from baserow_translate_plugin import jobs, metrics, metrics_store
+from baserow_translate_plugin.models import DirtyCell, FieldRecomputeJob
+
+from .serializers import FieldRecomputeJobSerializer
+
+
+class FieldRecomputeJobView(APIView):
+    """progress of the background recomputation of a translation / chatgpt field"""
+
+    permission_classes = (IsAuthenticated,)
+
+    def get_field(self, user, field_id, operation_type):
+        field = FieldHandler().get_field(field_id)
+        CoreHandler().check_permissions(
+            user,
+            operation_type,
+            workspace=field.table.database.workspace,
+            context=field,
+        )
+        return field
+
+    @map_exceptions({FieldDoesNotExist: ERROR_FIELD_DOES_NOT_EXIST})
+    def get(self, request, field_id):
+        field = self.get_field(request.user, field_id, ReadFieldOperationType.type)
+        job = jobs.get_latest_recompute_job(field)
+        if job is None:
+            return Response(None)
+        return Response(FieldRecomputeJobSerializer(job).data)
+
+    @map_exceptions({FieldDoesNotExist: ERROR_FIELD_DOES_NOT_EXIST})
+    @transaction.atomic
+    def delete(self, request, field_id):
+        field = self.get_field(request.user, field_id, UpdateFieldOperationType.type)
+        jobs.cancel_recompute_jobs(field)
+        return Response(status=HTTP_204_NO_CONTENT)
+
+    @map_exceptions({FieldDoesNotExist: ERROR_FIELD_DOES_NOT_EXIST})
+    @transaction.atomic
+    def post(self, request, field_id):
+        """resume a job paused by a token budget, e.g. after the monthly usage was reset"""
+        field = self.get_field(request.user, field_id, UpdateFieldOperationType.type)
+        jobs.resume_recompute_job(field)
+        return Response(FieldRecomputeJobSerializer(jobs.get_latest_recompute_job(field)).data)
+
+
+class MetricsView(APIView):
+    """the metrics of all the processes (see metrics_store.py), in the prometheus text
+    format. only enabled when BASEROW_TRANSLATE_PLUGIN_METRICS_TOKEN is set, and the scraper
+    has to send it"""
+
+    authentication_classes = ()
+    permission_classes = (AllowAny,)
+
+    def get(self, request):
+        token = settings.BASEROW_TRANSLATE_PLUGIN_METRICS_TOKEN
+        authorization = request.headers.get('Authorization', '')
+        if not token:
+            return HttpResponse(status=404)
+        if not hmac.compare_digest(authorization, f'Bearer {token}'):
+            return HttpResponse(status=401)
+
+        # queue depths are read from the database, they're shared by all the processes
+        metrics.set_gauge('dirty_cells', DirtyCell.objects.count())
+        job_counts = dict(FieldRecomputeJob.objects.filter(state__in=jobs.ACTIVE_STATES)
+                          .order_by().values_list('state').annotate(count=Count('id')))
+        for state in jobs.ACTIVE_STATES:
+            metrics.set_gauge('recompute_jobs', job_counts.get(state, 0), state=state)
+
+        # what this process recorded since its last export is included right away
+        metrics.ensure_exporter()
+        metrics_store.export()
+        return HttpResponse(metrics.render_prometheus(metrics_store.load_samples()),
+                            content_type='text/plain; version=0.0.4; charset=utf-8')
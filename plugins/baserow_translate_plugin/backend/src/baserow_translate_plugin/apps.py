@@ -4,23 +4,12 @@ from baserow.core.registries import plugin_registry
 from django.apps import AppConfig
 
 
-def install_argos_translate_package(from_code, to_code):
-    import argostranslate.package
-    argostranslate.package.update_package_index()
-    available_packages = argostranslate.package.get_available_packages()
-    package_to_install = next(
-        filter(lambda x: x.from_code == from_code and x.to_code == to_code, available_packages)
-    )
-    argostranslate.package.install_from_path(package_to_install.download())        
-
 class BaserowTranslatePluginDjangoAppConfig(AppConfig):
     name = "baserow_translate_plugin"
 
     def ready(self):
-        # install argostranslate language packs. they need to be installed by the user id running baserow,
-        # as their data will be stored in $HOME/.local/share/argos-translate/
-        install_argos_translate_package('en', 'fr')
-        install_argos_translate_package('fr', 'en')
+        # no argos translate packages are installed or loaded here, this would slow down the
+        # start of every web and celery worker. see packages.py and translators.py
 
         # configure OpenAI
         openai_api_key = os.environ.get('OPENAI_API_KEY', '')
@@ -38,3 +27,12 @@ class BaserowTranslatePluginDjangoAppConfig(AppConfig):
 
         field_type_registry.register(TranslationFieldType())
         field_type_registry.register(ChatGPTFieldType())
+
+        # register the translation engines
+        from .engines import (translation_engine_registry, ArgosEngine, LibreTranslateEngine,
+                              MarianEngine, FakeEngine)
+
+        translation_engine_registry.register(ArgosEngine())
+        translation_engine_registry.register(LibreTranslateEngine())
+        translation_engine_registry.register(MarianEngine())
+        translation_engine_registry.register(FakeEngine())
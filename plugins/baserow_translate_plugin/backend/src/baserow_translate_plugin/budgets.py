@@ -0,0 +1,106 @@
+"""
+chatgpt token budgets, so that a careless prompt edit can't go through the monthly quota. the
+tokens used by the requests made for a field are written to a usage ledger (ChatGPTUsage). a
+field can have a monthly token budget (ChatGPTField.token_budget), and every workspace gets
+BASEROW_TRANSLATE_PLUGIN_CHATGPT_WORKSPACE_MONTHLY_TOKENS. before sending prompts, their tokens
+are counted locally, and nothing is sent when they don't fit in what's left of the budgets:
+full-table recomputations are paused (see jobs.py), and so are the edited cells.
+"""
+
+import threading
+
+from django.conf import settings
+from django.db.models import Sum
+from django.utils import timezone
+
+from . import metrics
+from .chatgpt_scheduler import estimate_tokens
+from .models import ChatGPTUsage
+
+# the length of the answers isn't known in advance, this is added for each prompt
+ESTIMATED_COMPLETION_TOKENS = 100
+
+
+class BudgetExceeded(Exception):
+    pass
+
+
+class TokenUsage:
+    """counts the tokens used by concurrent requests"""
+
+    def __init__(self):
+        self.tokens = 0
+        self.lock = threading.Lock()
+
+    def add(self, tokens):
+        with self.lock:
+            self.tokens += tokens
+
+
+_encoding = None
+
+
+def count_tokens(text):
+    """with tiktoken installed, the exact number of tokens, otherwise an estimate"""
+    global _encoding
+    if _encoding == None:
+        try:
+            import tiktoken
+
+            # the encoding of gpt-3.5-turbo and gpt-4
+            _encoding = tiktoken.get_encoding('cl100k_base')
+        except ImportError:
+            _encoding = False
+    if _encoding == False:
+        return estimate_tokens(text)
+    return len(_encoding.encode(text))
+
+
+def estimate_prompt_tokens(prompts):
+    return sum(count_tokens(prompt) + ESTIMATED_COMPLETION_TOKENS for prompt in prompts)
+
+
+def estimate_cost(tokens):
+    return tokens / 1000 * settings.BASEROW_TRANSLATE_PLUGIN_CHATGPT_PRICE_PER_1K_TOKENS
+
+
+def get_month_start():
+    return timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def get_workspace_id(field):
+    return field.table.database.workspace_id
+
+
+def get_used_tokens(**filters):
+    return ChatGPTUsage.objects.filter(
+        created_on__gte=get_month_start(), **filters
+    ).aggregate(tokens=Sum('tokens'))['tokens'] or 0
+
+
+def get_remaining_tokens(field):
+    """tokens left this month for this field, None when there's no limit"""
+    remaining = []
+    if field.token_budget > 0:
+        remaining.append(field.token_budget - get_used_tokens(field_id=field.id))
+    workspace_budget = settings.BASEROW_TRANSLATE_PLUGIN_CHATGPT_WORKSPACE_MONTHLY_TOKENS
+    if workspace_budget > 0:
+        remaining.append(workspace_budget - get_used_tokens(workspace_id=get_workspace_id(field)))
+    if len(remaining) == 0:
+        return None
+    return max(0, min(remaining))
+
+
+def check_budget(field, tokens):
+    """raises BudgetExceeded if the field can't use that many tokens"""
+    remaining = get_remaining_tokens(field)
+    if remaining != None and tokens > remaining:
+        metrics.increment('chatgpt_budget_exceeded')
+        raise BudgetExceeded(f'about {tokens} tokens (${estimate_cost(tokens):.2f}) needed, '
+                             f'{remaining} tokens left in this month\'s budget')
+
+
+def record_usage(field, model, tokens):
+    if tokens > 0:
+        ChatGPTUsage.objects.create(field_id=field.id, workspace_id=get_workspace_id(field),
+                                    model=model, tokens=tokens)
@@ -0,0 +1,231 @@
+"""
+translation memory: the same strings (category names, status labels, repeated descriptions)
+come up again and again in tables, so translations are stored in the database and looked up
+before calling the translation engine. an in-process LRU sits in front of the database table.
+chatgpt completions are cached the same way, so that re-saving a field doesn't re-bill
+thousands of identical prompts.
+"""
+
+import hashlib
+import json
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import metrics
+from .models import TranslationCacheEntry, ChatGPTCacheEntry
+
+
+class LRUCache:
+    """a small thread-safe LRU, evicts the least recently used key once max_size is reached"""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            if key not in self.entries:
+                return default
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def set(self, key, value):
+        if self.max_size <= 0:
+            return
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+def normalize_text(text):
+    return unicodedata.normalize('NFC', text).strip()
+
+
+def is_cacheable(text):
+    return isinstance(text, str) and len(text.strip()) > 0
+
+
+def hash_key(*parts):
+    return hashlib.sha256('\x00'.join(parts).encode('utf-8')).hexdigest()
+
+
+class DatabaseCache:
+    """an in-process LRU in front of a database table. the model needs a unique `key`, a
+    `created_on` and a `last_used_on`. entries older than ttl (if any) are ignored, and
+    evict() deletes them along with the least recently used entries beyond max_entries"""
+
+    model_class = None
+    value_field = None
+    metrics_name = None
+
+    def __init__(self, lru_size, max_entries, ttl=None):
+        self.lru = LRUCache(lru_size)
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+    def lookup(self, keys, labels):
+        """keys is a dict of key -> value we're looking up. returns a dict of value -> cached
+        result"""
+        result = {}
+        keys_to_lookup = {}
+        for key, value in keys.items():
+            cached = self.lru.get(key)
+            if cached != None and (cached[1] == None or cached[1] > time.time()):
+                result[value] = cached[0]
+            else:
+                keys_to_lookup[key] = value
+
+        if len(keys_to_lookup) > 0:
+            queryset = self.model_class.objects.filter(key__in=keys_to_lookup.keys())
+            if self.ttl != None:
+                queryset = queryset.filter(created_on__gt=timezone.now() - self.ttl)
+            found_keys = []
+            for key, cached_value, created_on in queryset.values_list(
+                    'key', self.value_field, 'created_on'):
+                result[keys_to_lookup[key]] = cached_value
+                self.lru.set(key, (cached_value, self.get_expiry(created_on)))
+                found_keys.append(key)
+            if len(found_keys) > 0:
+                # keeps the entries from being evicted
+                self.model_class.objects.filter(key__in=found_keys).update(
+                    last_used_on=timezone.now())
+
+        hits = len(result)
+        metrics.increment(f'{self.metrics_name}_hits', hits, **labels)
+        metrics.increment(f'{self.metrics_name}_misses', len(keys) - hits, **labels)
+        return result
+
+    def store(self, entries):
+        for entry in entries:
+            self.lru.set(entry.key, (getattr(entry, self.value_field),
+                                     self.get_expiry(timezone.now())))
+        # another worker may have computed the same value at the same time
+        self.model_class.objects.bulk_create(entries, ignore_conflicts=True)
+
+    def get_expiry(self, created_on):
+        if self.ttl == None:
+            return None
+        return created_on.timestamp() + self.ttl.total_seconds()
+
+    def evict(self, max_entries=None):
+        """delete the expired entries and the least recently used entries beyond
+        max_entries, returns the number of deleted entries"""
+        if max_entries == None:
+            max_entries = self.max_entries
+        deleted = 0
+        if self.ttl != None:
+            deleted, _ = self.model_class.objects.filter(
+                created_on__lte=timezone.now() - self.ttl).delete()
+
+        # the first entry which doesn't fit anymore, it and everything older gets deleted
+        threshold = list(self.model_class.objects.order_by('-last_used_on', '-id').values_list(
+            'last_used_on', 'id')[max_entries:max_entries + 1])
+        if len(threshold) > 0:
+            last_used_on, entry_id = threshold[0]
+            deleted_lru, _ = self.model_class.objects.filter(last_used_on__lte=last_used_on).exclude(
+                last_used_on=last_used_on, id__gt=entry_id).delete()
+            deleted += deleted_lru
+        metrics.increment(f'{self.metrics_name}_evictions', deleted)
+        return deleted
+
+    def clear(self):
+        self.lru.clear()
+        self.model_class.objects.all().delete()
+
+
+class TranslationCache(DatabaseCache):
+    model_class = TranslationCacheEntry
+    value_field = 'translated_text'
+    metrics_name = 'translation_cache'
+
+    def get_key(self, text, source_language, target_language, engine_version):
+        return hash_key(engine_version, source_language, target_language, normalize_text(text))
+
+    def get_many(self, texts, source_language, target_language, engine_version):
+        """returns a dict of text -> translation, for the texts which were found in the cache"""
+        keys = {self.get_key(text, source_language, target_language, engine_version): text
+                for text in set(texts) if is_cacheable(text)}
+        labels = {'source_language': source_language, 'target_language': target_language}
+        return self.lookup(keys, labels)
+
+    def set_many(self, translations, source_language, target_language, engine_version):
+        """translations is a dict of text -> translation"""
+        self.store([
+            TranslationCacheEntry(
+                key=self.get_key(text, source_language, target_language, engine_version),
+                source_language=source_language,
+                target_language=target_language,
+                engine_version=engine_version,
+                translated_text=translated_text,
+            )
+            for text, translated_text in translations.items()
+            if is_cacheable(text) and translated_text != None
+        ])
+
+
+class ChatGPTCache(DatabaseCache):
+    model_class = ChatGPTCacheEntry
+    value_field = 'completion'
+    metrics_name = 'chatgpt_cache'
+
+    def get_key(self, prompt, model, parameters):
+        return hash_key(model, json.dumps(parameters, sort_keys=True), prompt)
+
+    def get_many(self, prompts, model, parameters):
+        """returns a dict of prompt -> completion, for the prompts which were found in the
+        cache"""
+        keys = {self.get_key(prompt, model, parameters): prompt for prompt in set(prompts)}
+        return self.lookup(keys, {'model': model})
+
+    def set_many(self, completions, model, parameters):
+        """completions is a dict of prompt -> completion"""
+        self.store([
+            ChatGPTCacheEntry(
+                key=self.get_key(prompt, model, parameters),
+                model=model,
+                completion=completion,
+            )
+            for prompt, completion in completions.items()
+            if completion != None
+        ])
+
+
+_translation_cache = None
+_chatgpt_cache = None
+
+
+def get_translation_cache():
+    global _translation_cache
+    if _translation_cache == None:
+        _translation_cache = TranslationCache(
+            settings.BASEROW_TRANSLATE_PLUGIN_TRANSLATION_CACHE_LRU_SIZE,
+            settings.BASEROW_TRANSLATE_PLUGIN_TRANSLATION_CACHE_MAX_ENTRIES,
+        )
+    return _translation_cache
+
+
+def get_chatgpt_cache():
+    global _chatgpt_cache
+    if _chatgpt_cache == None:
+        ttl = None
+        if settings.BASEROW_TRANSLATE_PLUGIN_CHATGPT_CACHE_TTL_DAYS > 0:
+            ttl = timedelta(days=settings.BASEROW_TRANSLATE_PLUGIN_CHATGPT_CACHE_TTL_DAYS)
+        _chatgpt_cache = ChatGPTCache(
+            settings.BASEROW_TRANSLATE_PLUGIN_CHATGPT_CACHE_LRU_SIZE,
+            settings.BASEROW_TRANSLATE_PLUGIN_CHATGPT_CACHE_MAX_ENTRIES,
+            ttl=ttl,
+        )
+    return _chatgpt_cache
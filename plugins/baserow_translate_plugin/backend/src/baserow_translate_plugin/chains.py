@@ -0,0 +1,123 @@
+"""
+plugin fields can be computed from other plugin fields, e.g. a chatgpt prompt using {French}
+where French is a translation of English. the full-table recomputations write their values
+with bulk UPDATEs, which don't notify the fields depending on them, so a recompute job also
+recomputes the plugin fields depending on its field: in a single pass over the table, each
+chunk of rows is computed field after field in dependency order, in memory, and written with
+one bulk UPDATE.
+"""
+
+from baserow.contrib.database.fields.dependencies.models import FieldDependency
+from baserow.contrib.database.fields.registries import field_type_registry
+
+from . import translation
+
+
+def is_plugin_field(field):
+    return hasattr(field_type_registry.get_by_model(field), 'get_recompute_step')
+
+
+def get_dependant_fields(fields):
+    """the plugin fields of the same table which are computed from these fields, directly or
+    through other plugin fields"""
+    table_id = fields[0].table_id
+    found_field_ids = set(field.id for field in fields)
+    field_ids = list(found_field_ids)
+    dependant_fields = []
+    while len(field_ids) > 0:
+        field_dependencies = FieldDependency.objects.filter(
+            dependency_id__in=field_ids,
+            via__isnull=True,
+            dependant__table_id=table_id,
+            dependant__trashed=False,
+        ).select_related('dependant')
+        field_ids = []
+        for field_dependency in field_dependencies:
+            dependant = field_dependency.dependant.specific
+            if dependant.id in found_field_ids or not is_plugin_field(dependant):
+                continue
+            if getattr(dependant, 'lazy', False):
+                # computed when read, see lazy.py
+                continue
+            found_field_ids.add(dependant.id)
+            field_ids.append(dependant.id)
+            dependant_fields.append(dependant)
+    return dependant_fields
+
+
+def has_eager_dependants(field):
+    """whether fields computed when a cell changes (formulas, lookups, chatgpt and non-lazy
+    translation fields) depend on this field"""
+    field_dependencies = FieldDependency.objects.filter(
+        dependency_id=field.id,
+        dependant__trashed=False,
+    ).select_related('dependant')
+    return any(not getattr(field_dependency.dependant.specific, 'lazy', False)
+               for field_dependency in field_dependencies)
+
+
+def get_dependency_fields(field):
+    """the plugin fields of the same table this field is computed from, directly or through
+    other plugin fields"""
+    found_field_ids = set([field.id])
+    field_ids = [field.id]
+    dependency_fields = []
+    while len(field_ids) > 0:
+        field_dependencies = FieldDependency.objects.filter(
+            dependant_id__in=field_ids,
+            via__isnull=True,
+            dependency__table_id=field.table_id,
+            dependency__trashed=False,
+        ).select_related('dependency')
+        field_ids = []
+        for field_dependency in field_dependencies:
+            dependency = field_dependency.dependency.specific
+            if dependency.id in found_field_ids or not is_plugin_field(dependency):
+                continue
+            found_field_ids.add(dependency.id)
+            field_ids.append(dependency.id)
+            dependency_fields.append(dependency)
+    return dependency_fields
+
+
+def order_in_groups(fields):
+    """returns lists of fields, each list only depends on the lists before it. the fields
+    which their field type computes together (e.g. translations of the same source field) are
+    in the same list"""
+    field_ids = [field.id for field in fields]
+    dependencies = {field_id: set() for field_id in field_ids}
+    for dependant_id, dependency_id in FieldDependency.objects.filter(
+            dependant_id__in=field_ids, dependency_id__in=field_ids,
+            via__isnull=True).values_list('dependant_id', 'dependency_id'):
+        dependencies[dependant_id].add(dependency_id)
+
+    # baserow doesn't allow circular references
+    depths = {}
+
+    def get_depth(field_id):
+        if field_id not in depths:
+            depths[field_id] = 1 + max([get_depth(dependency_id)
+                                        for dependency_id in dependencies[field_id]], default=-1)
+        return depths[field_id]
+
+    groups = {}
+    for field in fields:
+        field_type = field_type_registry.get_by_model(field)
+        key = (get_depth(field.id), field_type.type, field_type.get_recompute_group_key(field))
+        groups.setdefault(key, []).append(field)
+    return [groups[key] for key in sorted(groups, key=lambda key: key[0])]
+
+
+def update_all_rows(groups, start_after_row_id=None, progress=None, chunk_size=None):
+    """recompute the groups of fields (see order_in_groups) in one pass over their table.
+    returns False if the progress callback asked us to stop (job cancelled)"""
+    table = groups[0][0].table
+    table_model = table.get_model()
+    steps = []
+    for group in groups:
+        field_type = field_type_registry.get_by_model(group[0])
+        step = field_type.get_recompute_step(group, table_model)
+        step.field_type = field_type.type
+        steps.append(step)
+    return translation.update_all_rows_in_chunks(table, table_model, steps, start_after_row_id,
+                                                 progress, chunk_size)
@@ -0,0 +1,100 @@
+"""
+short prompts (e.g. "Summarize: {Description}" over thousands of rows) spend most of their time
+in per-request latency. with BASEROW_TRANSLATE_PLUGIN_CHATGPT_BATCH_TOKENS set, the prompts are
+packed into requests of up to that many (estimated) tokens: the prompts are sent as a JSON
+array, and chatgpt is asked to answer with a JSON array of the same length. a batch whose
+answer isn't such an array is sent again one prompt per request.
+"""
+
+import json
+import logging
+
+from django.conf import settings
+
+from . import metrics
+from .chatgpt_scheduler import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+BATCH_INSTRUCTIONS = (
+    'Answer each of the following prompts independently. The prompts are given as a JSON '
+    'array of strings. Reply with only a JSON array of strings, containing the answer to each '
+    'prompt in the same order, with exactly {count} elements.\n\n'
+)
+
+# the quotes, comma and escaping around each prompt in the JSON array
+PROMPT_OVERHEAD_TOKENS = 4
+
+
+class MalformedBatchResponse(ValueError):
+    pass
+
+
+def pack_prompts(prompts, max_tokens, max_prompts):
+    """split the prompts into batches of at most max_tokens estimated tokens and max_prompts
+    prompts, keeping the order. a prompt larger than max_tokens gets a batch of its own"""
+    batches = []
+    batch = []
+    batch_tokens = 0
+    for prompt in prompts:
+        tokens = estimate_tokens(prompt) + PROMPT_OVERHEAD_TOKENS
+        if len(batch) > 0 and (batch_tokens + tokens > max_tokens or len(batch) >= max_prompts):
+            batches.append(batch)
+            batch = []
+            batch_tokens = 0
+        batch.append(prompt)
+        batch_tokens += tokens
+    if len(batch) > 0:
+        batches.append(batch)
+    return batches
+
+
+def build_batch_prompt(prompts):
+    return BATCH_INSTRUCTIONS.format(count=len(prompts)) + json.dumps(prompts, ensure_ascii=False)
+
+
+def parse_batch_response(content, count):
+    """returns the list of answers, raises MalformedBatchResponse unless the content is a JSON
+    array of count strings (possibly in a markdown code block)"""
+    start = content.find('[')
+    end = content.rfind(']')
+    if start == -1 or end < start:
+        raise MalformedBatchResponse('no JSON array in the response')
+    try:
+        answers = json.loads(content[start:end + 1])
+    except json.JSONDecodeError as e:
+        raise MalformedBatchResponse(f'invalid JSON: {e}')
+    if not isinstance(answers, list) or len(answers) != count:
+        raise MalformedBatchResponse(f'expected {count} answers')
+    if not all(isinstance(answer, str) for answer in answers):
+        raise MalformedBatchResponse('answers must be strings')
+    return answers
+
+
+def run_batched(prompts, scheduler, call, max_tokens=None, max_prompts=None, usage=None):
+    """like scheduler.run(prompts, call, usage), with several prompts per request. returns the
+    results in the same order"""
+    if max_tokens == None:
+        max_tokens = settings.BASEROW_TRANSLATE_PLUGIN_CHATGPT_BATCH_TOKENS
+    if max_prompts == None:
+        max_prompts = settings.BASEROW_TRANSLATE_PLUGIN_CHATGPT_BATCH_MAX_PROMPTS
+
+    batches = pack_prompts(prompts, max_tokens, max_prompts)
+    multi_prompt_batches = [batch for batch in batches if len(batch) > 1]
+    single_prompts = [batch[0] for batch in batches if len(batch) == 1]
+
+    results = {}
+    batch_contents = scheduler.run([build_batch_prompt(batch) for batch in multi_prompt_batches],
+                                   call, usage)
+    for batch, content in zip(multi_prompt_batches, batch_contents):
+        metrics.observe('chatgpt_batch_size', len(batch), metrics.SIZE_BUCKETS)
+        try:
+            results.update(zip(batch, parse_batch_response(content, len(batch))))
+        except MalformedBatchResponse as e:
+            logger.warning(f'malformed answer to a batch of {len(batch)} prompts ({e}), '
+                           f'sending them one by one')
+            metrics.increment('chatgpt_batch_fallbacks')
+            single_prompts.extend(batch)
+
+    results.update(zip(single_prompts, scheduler.run(single_prompts, call, usage)))
+    return [results[prompt] for prompt in prompts]
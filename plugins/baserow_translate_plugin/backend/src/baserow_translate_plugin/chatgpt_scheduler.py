@@ -0,0 +1,142 @@
+"""
+sends chatgpt requests concurrently from a thread pool, while staying under the OpenAI
+requests-per-minute and tokens-per-minute limits, and retrying with backoff when the API
+tells us to slow down (429) or has a problem (5xx). results come back in the same order as
+the prompts.
+"""
+
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_HTTP_STATUSES = [429, 500, 502, 503, 504]
+
+
+def estimate_tokens(text):
+    # ~4 characters per token for english text, good enough for rate limiting
+    return max(1, len(text) // 4)
+
+
+class TokenBucket:
+    """allows `per_minute` units per minute, with bursts up to the same amount. per_minute=0
+    disables the limit"""
+
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.tokens = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount):
+        """block until `amount` units are available, then take them"""
+        if self.capacity <= 0:
+            return
+        amount = min(amount, self.capacity)
+        while True:
+            with self.lock:
+                self.refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def adjust(self, amount):
+        """once we know the real usage of a request, take (or give back) the difference with
+        what we acquired. the bucket may go negative, which delays the next requests"""
+        if self.capacity <= 0:
+            return
+        with self.lock:
+            self.refill()
+            self.tokens -= amount
+
+
+def is_retryable(error):
+    import openai.error
+
+    if isinstance(error, (openai.error.Timeout, openai.error.APIConnectionError)):
+        return True
+    return getattr(error, 'http_status', None) in RETRYABLE_HTTP_STATUSES
+
+
+def get_retry_after(error):
+    headers = getattr(error, 'headers', None) or {}
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+
+class ChatGPTScheduler:
+    def __init__(self, concurrency, requests_per_minute, tokens_per_minute, max_retries,
+                 backoff_seconds=1.0, max_backoff_seconds=60.0):
+        self.concurrency = concurrency
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+
+    def run(self, prompts, call, usage=None):
+        """call(prompt) must return (result, total_tokens_used). returns the results, in the
+        same order as the prompts. the tokens used are added to usage (budgets.TokenUsage)"""
+        if len(prompts) <= 1 or self.concurrency <= 1:
+            return [self.call_with_retry(call, prompt, usage) for prompt in prompts]
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(prompts))) as executor:
+            return list(executor.map(lambda prompt: self.call_with_retry(call, prompt, usage),
+                                     prompts))
+
+    def call_with_retry(self, call, prompt, usage=None):
+        estimated_tokens = estimate_tokens(prompt)
+        attempt = 0
+        while True:
+            self.request_bucket.acquire(1)
+            self.token_bucket.acquire(estimated_tokens)
+            try:
+                result, total_tokens = call(prompt)
+                if total_tokens != None:
+                    self.token_bucket.adjust(total_tokens - estimated_tokens)
+                    if usage != None:
+                        usage.add(total_tokens)
+                return result
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                delay = get_retry_after(e)
+                if delay == None:
+                    delay = min(self.max_backoff_seconds, self.backoff_seconds * 2 ** attempt)
+                    delay = delay * random.uniform(0.5, 1.0)
+                logger.warning(f'chatgpt request failed ({e}), retrying in {delay:.1f}s')
+                metrics.increment('chatgpt_api_retries')
+                time.sleep(delay)
+                attempt += 1
+
+
+_scheduler = None
+
+
+def get_scheduler():
+    """the rate limits are shared by every request made from this process"""
+    global _scheduler
+    if _scheduler == None:
+        _scheduler = ChatGPTScheduler(
+            concurrency=settings.BASEROW_TRANSLATE_PLUGIN_CHATGPT_CONCURRENCY,
+            requests_per_minute=settings.BASEROW_TRANSLATE_PLUGIN_CHATGPT_REQUESTS_PER_MINUTE,
+            tokens_per_minute=settings.BASEROW_TRANSLATE_PLUGIN_CHATGPT_TOKENS_PER_MINUTE,
+            max_retries=settings.BASEROW_TRANSLATE_PLUGIN_CHATGPT_MAX_RETRIES,
+        )
+    return _scheduler
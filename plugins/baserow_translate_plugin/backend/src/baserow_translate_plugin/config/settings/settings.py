@@ -1,3 +1,6 @@
+import os
+
+
 def setup(settings):
     """
     This function is called after Baserow as setup its own Django settings file but
@@ -8,3 +11,158 @@ def setup(settings):
     for db, value in settings.DATABASES:
         value['engine'] = 'some custom engine'
     """
+
+    # number of rows read, computed and written back at once when recomputing a whole table
+    settings.BASEROW_TRANSLATE_PLUGIN_CHUNK_SIZE = int(
+        os.getenv("BASEROW_TRANSLATE_PLUGIN_CHUNK_SIZE", "500")
+    )
+
+    # translation memory: number of entries kept in each process, and in the database
+    settings.BASEROW_TRANSLATE_PLUGIN_TRANSLATION_CACHE_LRU_SIZE = int(
+        os.getenv("BASEROW_TRANSLATE_PLUGIN_TRANSLATION_CACHE_LRU_SIZE", "10000")
+    )
+    settings.BASEROW_TRANSLATE_PLUGIN_TRANSLATION_CACHE_MAX_ENTRIES = int(
+        os.getenv("BASEROW_TRANSLATE_PLUGIN_TRANSLATION_CACHE_MAX_ENTRIES", "1000000")
+    )
+
+    # maximum number of sentences sent through the translation model at once
+    settings.BASEROW_TRANSLATE_PLUGIN_MAX_BATCH_SIZE = int(
+        os.getenv("BASEROW_TRANSLATE_PLUGIN_MAX_BATCH_SIZE", "32")
+    )
+
+    # sentences longer than this (in characters) are split on spaces before translation
+    settings.BASEROW_TRANSLATE_PLUGIN_MAX_SEGMENT_LENGTH = int(
+        os.getenv("BASEROW_TRANSLATE_PLUGIN_MAX_SEGMENT_LENGTH", "1000")
+    )
+
+    # chatgpt requests: number of requests in flight, OpenAI rate limits (0 disables them),
+    # and how many times a request is retried after a 429 / 5xx response
+    settings.BASEROW_TRANSLATE_PLUGIN_CHATGPT_CONCURRENCY = int(
+        os.getenv("BASEROW_TRANSLATE_PLUGIN_CHATGPT_CONCURRENCY", "4")
+    )
+    settings.BASEROW_TRANSLATE_PLUGIN_CHATGPT_REQUESTS_PER_MINUTE = int(
+        os.getenv("BASEROW_TRANSLATE_PLUGIN_CHATGPT_REQUESTS_PER_MINUTE", "500")
+    )
+    settings.BASEROW_TRANSLATE_PLUGIN_CHATGPT_TOKENS_PER_MINUTE = int(
+        os.getenv("BASEROW_TRANSLATE_PLUGIN_CHATGPT_TOKENS_PER_MINUTE", "90000")
+    )
+    settings.BASEROW_TRANSLATE_PLUGIN_CHATGPT_MAX_RETRIES = int(
+        os.getenv("BASEROW_TRANSLATE_PLUGIN_CHATGPT_MAX_RETRIES", "5")
+    )
+
+    # pack several prompts into each chatgpt request, up to this many estimated tokens and
+    # prompts per request (0 tokens: one prompt per request)
+    settings.BASEROW_TRANSLATE_PLUGIN_CHATGPT_BATCH_TOKENS = int(
+        os.getenv("BASEROW_TRANSLATE_PLUGIN_CHATGPT_BATCH_TOKENS", "0")
+    )
+    settings.BASEROW_TRANSLATE_PLUGIN_CHATGPT_BATCH_MAX_PROMPTS = int(
+        os.getenv("BASEROW_TRANSLATE_PLUGIN_CHATGPT_BATCH_MAX_PROMPTS", "20")
+    )
+
+    # chatgpt tokens each workspace can use per month (0: no limit), see budgets.py. fields
+    # can also have their own budget
+    settings.BASEROW_TRANSLATE_PLUGIN_CHATGPT_WORKSPACE_MONTHLY_TOKENS = int(
+        os.getenv("BASEROW_TRANSLATE_PLUGIN_CHATGPT_WORKSPACE_MONTHLY_TOKENS", "0")
+    )
+    # only used to show the estimated cost of a recompute job, in dollars
+    settings.BASEROW_TRANSLATE_PLUGIN_CHATGPT_PRICE_PER_1K_TOKENS = float(
+        os.getenv("BASEROW_TRANSLATE_PLUGIN_CHATGPT_PRICE_PER_1K_TOKENS", "0.002")
+    )
+
+    # chatgpt completions cache: entries kept in each process, in the database, and for how
+    # many days a completion is reused (0: forever)
+    settings.BASEROW_TRANSLATE_PLUGIN_CHATGPT_CACHE_LRU_SIZE = int(
+        os.getenv("BASEROW_TRANSLATE_PLUGIN_CHATGPT_CACHE_LRU_SIZE", "1000")
+    )
+    settings.BASEROW_TRANSLATE_PLUGIN_CHATGPT_CACHE_MAX_ENTRIES = int(
+        os.getenv("BASEROW_TRANSLATE_PLUGIN_CHATGPT_CACHE_MAX_ENTRIES", "100000")
+    )
+    settings.BASEROW_TRANSLATE_PLUGIN_CHATGPT_CACHE_TTL_DAYS = int(
+        os.getenv("BASEROW_TRANSLATE_PLUGIN_CHATGPT_CACHE_TTL_DAYS", "30")
+    )
+
+    # install a missing argos translate package (from the argos package index) the first
+    # time a language pair is used. disable when packages are pre-installed with the
+    # install_translation_packages management command.
+    settings.BASEROW_TRANSLATE_PLUGIN_AUTO_INSTALL_PACKAGES = os.getenv(
+        "BASEROW_TRANSLATE_PLUGIN_AUTO_INSTALL_PACKAGES", "true"
+    ).lower() in ("true", "1", "yes")
+
+    # when set, translations are sent to the translation service listening on this unix
+    # socket (see the run_translation_service management command) instead of loading the
+    # models in every process
+    settings.BASEROW_TRANSLATE_PLUGIN_TRANSLATION_SERVICE_SOCKET = os.getenv(
+        "BASEROW_TRANSLATE_PLUGIN_TRANSLATION_SERVICE_SOCKET", ""
+    )
+    settings.BASEROW_TRANSLATE_PLUGIN_TRANSLATION_SERVICE_TIMEOUT = int(
+        os.getenv("BASEROW_TRANSLATE_PLUGIN_TRANSLATION_SERVICE_TIMEOUT", "600")
+    )
+
+    # number of processes translating in parallel during full-table recomputations, each
+    # of them loads its own copy of the translation models. 1 translates in the job's process
+    settings.BASEROW_TRANSLATE_PLUGIN_TRANSLATION_PROCESSES = int(
+        os.getenv("BASEROW_TRANSLATE_PLUGIN_TRANSLATION_PROCESSES", "1")
+    )
+
+    # while recomputing a whole table, the updated rows are sent to the front-end at most
+    # once every this many seconds
+    settings.BASEROW_TRANSLATE_PLUGIN_REALTIME_UPDATE_INTERVAL = float(
+        os.getenv("BASEROW_TRANSLATE_PLUGIN_REALTIME_UPDATE_INTERVAL", "2")
+    )
+
+    # when enabled, editing a source cell doesn't recompute the translation / chatgpt cells
+    # within the row update request, they're queued and recomputed by a celery worker
+    settings.BASEROW_TRANSLATE_PLUGIN_ASYNC_DEPENDENCY_UPDATES = os.getenv(
+        "BASEROW_TRANSLATE_PLUGIN_ASYNC_DEPENDENCY_UPDATES", "false"
+    ).lower() in ("true", "1", "yes")
+
+    # a queued cell is recomputed once it hasn't been edited for this many seconds, so that
+    # several quick edits only result in one recomputation
+    settings.BASEROW_TRANSLATE_PLUGIN_DEBOUNCE_SECONDS = float(
+        os.getenv("BASEROW_TRANSLATE_PLUGIN_DEBOUNCE_SECONDS", "2")
+    )
+
+    # translation engine of the fields which don't select one: argos, libretranslate, marian
+    # or fake (see engines.py)
+    settings.BASEROW_TRANSLATE_PLUGIN_DEFAULT_ENGINE = os.getenv(
+        "BASEROW_TRANSLATE_PLUGIN_DEFAULT_ENGINE", "argos"
+    )
+
+    # LibreTranslate compatible API used by the libretranslate engine
+    settings.BASEROW_TRANSLATE_PLUGIN_LIBRETRANSLATE_URL = os.getenv(
+        "BASEROW_TRANSLATE_PLUGIN_LIBRETRANSLATE_URL", "http://localhost:5000"
+    )
+    settings.BASEROW_TRANSLATE_PLUGIN_LIBRETRANSLATE_API_KEY = os.getenv(
+        "BASEROW_TRANSLATE_PLUGIN_LIBRETRANSLATE_API_KEY", ""
+    )
+    settings.BASEROW_TRANSLATE_PLUGIN_LIBRETRANSLATE_MAX_BATCH_SIZE = int(
+        os.getenv("BASEROW_TRANSLATE_PLUGIN_LIBRETRANSLATE_MAX_BATCH_SIZE", "50")
+    )
+    settings.BASEROW_TRANSLATE_PLUGIN_LIBRETRANSLATE_CONCURRENCY = int(
+        os.getenv("BASEROW_TRANSLATE_PLUGIN_LIBRETRANSLATE_CONCURRENCY", "4")
+    )
+    settings.BASEROW_TRANSLATE_PLUGIN_LIBRETRANSLATE_TIMEOUT = int(
+        os.getenv("BASEROW_TRANSLATE_PLUGIN_LIBRETRANSLATE_TIMEOUT", "60")
+    )
+
+    # directory containing one CTranslate2 converted MarianMT model per language pair (e.g.
+    # de-fr/), used by the marian engine
+    settings.BASEROW_TRANSLATE_PLUGIN_MARIAN_MODELS_DIR = os.getenv(
+        "BASEROW_TRANSLATE_PLUGIN_MARIAN_MODELS_DIR", ""
+    )
+
+    # latency of each batch translated by the fake engine, in milliseconds
+    settings.BASEROW_TRANSLATE_PLUGIN_FAKE_ENGINE_LATENCY_MS = float(
+        os.getenv("BASEROW_TRANSLATE_PLUGIN_FAKE_ENGINE_LATENCY_MS", "0")
+    )
+
+    # the metrics endpoint (/api/baserow_translate_plugin/metrics/, prometheus format) is
+    # disabled unless a token is set, scrapers send it as "Authorization: Bearer <token>"
+    settings.BASEROW_TRANSLATE_PLUGIN_METRICS_TOKEN = os.getenv(
+        "BASEROW_TRANSLATE_PLUGIN_METRICS_TOKEN", ""
+    )
+    # how often each process adds its metrics to the totals in the database, which the
+    # metrics endpoint shows (see metrics_store.py)
+    settings.BASEROW_TRANSLATE_PLUGIN_METRICS_EXPORT_SECONDS = float(
+        os.getenv("BASEROW_TRANSLATE_PLUGIN_METRICS_EXPORT_SECONDS", "15")
+    )
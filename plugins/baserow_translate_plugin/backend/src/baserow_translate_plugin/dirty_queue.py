@@ -0,0 +1,100 @@
+"""
+with BASEROW_TRANSLATE_PLUGIN_ASYNC_DEPENDENCY_UPDATES enabled, editing a source cell doesn't
+translate / query chatgpt inside the row update request: the (field, row) is written to the
+DirtyCell table, and a celery worker recomputes it once the cell hasn't been edited for
+BASEROW_TRANSLATE_PLUGIN_DEBOUNCE_SECONDS. several edits of the same cell within that window
+result in a single recomputation. the queue is a database table, so nothing is lost when a
+worker restarts.
+"""
+
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from baserow.contrib.database.fields.dependencies.update_collector import FieldUpdateCollector
+from baserow.contrib.database.fields.field_cache import FieldCache
+from baserow.contrib.database.fields.models import Field
+from baserow.contrib.database.fields.registries import field_type_registry
+from baserow.contrib.database.views.handler import ViewHandler
+
+from .models import DirtyCell
+from .realtime import RowsUpdatedBroadcaster
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue(field, row_ids):
+    """the cells are recomputed after the debounce delay, cells which are already queued are
+    pushed back"""
+    if len(row_ids) == 0:
+        return
+    debounce_seconds = settings.BASEROW_TRANSLATE_PLUGIN_DEBOUNCE_SECONDS
+    due_on = timezone.now() + timedelta(seconds=debounce_seconds)
+    DirtyCell.objects.filter(field_id=field.id, row_id__in=row_ids).update(due_on=due_on)
+    DirtyCell.objects.bulk_create(
+        [DirtyCell(field_id=field.id, row_id=row_id, due_on=due_on) for row_id in row_ids],
+        ignore_conflicts=True
+    )
+
+    from .tasks import process_dirty_cells_task
+    transaction.on_commit(lambda: process_dirty_cells_task.apply_async(countdown=debounce_seconds))
+
+
+def process_due_cells():
+    """recompute the cells whose debounce delay is over, executed by the celery worker"""
+    now = timezone.now()
+    field_ids = list(DirtyCell.objects.filter(due_on__lte=now).values_list(
+        'field_id', flat=True).distinct())
+    for field_id in field_ids:
+        row_ids = claim_due_cells(field_id, now)
+        if len(row_ids) == 0:
+            continue
+        try:
+            recompute_cells(field_id, row_ids)
+        except Exception:
+            # same as when the recomputation happens within the row update, the cells keep
+            # their previous value until their inputs are edited again
+            logger.exception(f'could not recompute {len(row_ids)} cells of field {field_id}')
+
+
+def claim_due_cells(field_id, now):
+    """removes the due cells of the field from the queue and returns their row ids. cells
+    claimed by another worker are skipped, cells edited again in the meantime (so no longer
+    due) stay in the queue"""
+    with transaction.atomic():
+        row_ids = list(DirtyCell.objects.select_for_update(skip_locked=True).filter(
+            field_id=field_id, due_on__lte=now).values_list('row_id', flat=True))
+        DirtyCell.objects.filter(field_id=field_id, row_id__in=row_ids, due_on__lte=now).delete()
+    return row_ids
+
+
+def recompute_cells(field_id, row_ids):
+    try:
+        field = Field.objects.get(id=field_id).specific
+    except Field.DoesNotExist:
+        # the field was deleted in the meantime
+        return
+    if field.trashed:
+        return
+
+    table = field.table
+    model = table.get_model()
+    field_type = field_type_registry.get_by_model(field)
+    with transaction.atomic():
+        rows = list(model.objects.filter(id__in=row_ids))
+        values_before_update = {row.id: {field.db_column: getattr(row, field.db_column)}
+                                for row in rows}
+        # the fields depending on this one are updated too, like within a row update
+        update_collector = FieldUpdateCollector(table, starting_row_ids=[row.id for row in rows])
+        field_cache = FieldCache()
+        field_type.recompute_rows(field, rows, update_collector, field_cache, [])
+        updated_fields = update_collector.apply_updates_and_get_updated_fields(field_cache)
+        ViewHandler().field_value_updated(updated_fields)
+
+    # the row update request has returned long ago, send the new values to the front-end
+    broadcaster = RowsUpdatedBroadcaster(table, model, [field.db_column])
+    broadcaster.add(rows, values_before_update)
+    broadcaster.flush()
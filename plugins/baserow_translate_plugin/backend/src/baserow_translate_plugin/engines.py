@@ -0,0 +1,274 @@
+"""
+translation engines. each engine translates a batch of texts for a language pair, and declares
+how many texts it accepts in one batch (max_batch_size, None for no limit) and how many
+batches it can translate at the same time (concurrency). translate_in_batches() splits the
+texts accordingly. the engine is selected per translation field (TranslationField.engine),
+fields without one use BASEROW_TRANSLATE_PLUGIN_DEFAULT_ENGINE.
+"""
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from rest_framework import serializers
+
+from baserow.core.registry import Instance, Registry
+
+from . import translators
+from . import translation_service
+from . import parallel as parallel_translation
+
+logger = logging.getLogger(__name__)
+
+# the argos translation chain goes through english when there's no direct package
+ARGOS_PIVOT_LANGUAGE = 'en'
+
+
+class TranslationEngine(Instance):
+    max_batch_size = None
+    concurrency = 1
+
+    def translate_batch(self, texts, source_language, target_language, parallel=False):
+        """returns the translations in the same order. parallel: the caller translates a large
+        batch (full-table recomputation) and the engine may use more resources"""
+        raise NotImplementedError
+
+    def get_version(self, source_language, target_language):
+        """identifies the models used to translate this language pair, it's part of the
+        translation memory key"""
+        raise NotImplementedError
+
+    def has_direct_model(self, source_language, target_language):
+        """when False, the pair is translated through the pivot language"""
+        return True
+
+
+class ArgosEngine(TranslationEngine):
+    """argos translate packages, run by the translation service (if configured), by the
+    translation process pool, or within this process (see translators.py)"""
+
+    type = 'argos'
+
+    def __init__(self):
+        super().__init__()
+        # (source_language, target_language) -> version string of the installed packages
+        self.versions = {}
+        # modification time of the package directory when the versions were computed
+        self.packages_mtime = None
+
+    def translate_batch(self, texts, source_language, target_language, parallel=False):
+        socket_path = settings.BASEROW_TRANSLATE_PLUGIN_TRANSLATION_SERVICE_SOCKET
+        if socket_path:
+            # the models live in the translation service process
+            return translation_service.translate_batch(
+                texts, source_language, target_language, socket_path,
+                timeout=settings.BASEROW_TRANSLATE_PLUGIN_TRANSLATION_SERVICE_TIMEOUT)
+        processes = settings.BASEROW_TRANSLATE_PLUGIN_TRANSLATION_PROCESSES
+        if parallel and processes > 1 and len(texts) > 1:
+            # shard the texts across the translation process pool
+            return parallel_translation.translate_batch(texts, source_language, target_language,
+                                                        processes)
+        # call argos translate, through the translator which is kept loaded for this language pair
+        return translators.translate_batch(texts, source_language, target_language)
+
+    def get_version(self, source_language, target_language):
+        """upgrading an argos package doesn't return stale translations from the cache. only
+        the packages used for this pair count: the direct package, or when there's none the
+        two packages of the argos translation chain, which pivots through english"""
+        # packages installed by another process (install_translation_packages, the translation
+        # service, other workers) change the package directory
+        packages_mtime = get_packages_mtime()
+        if packages_mtime != self.packages_mtime:
+            self.versions = {}
+            self.packages_mtime = packages_mtime
+        language_pair = (source_language, target_language)
+        if language_pair not in self.versions:
+            import argostranslate.package
+            installed_packages = {(package.from_code, package.to_code): package
+                                  for package in argostranslate.package.get_installed_packages()}
+            if language_pair in installed_packages:
+                used_pairs = [language_pair]
+            else:
+                used_pairs = [(source_language, ARGOS_PIVOT_LANGUAGE),
+                              (ARGOS_PIVOT_LANGUAGE, target_language)]
+            packages = [f'{pair[0]}-{pair[1]}-{installed_packages[pair].package_version}'
+                        for pair in used_pairs if pair in installed_packages]
+            self.versions[language_pair] = 'argos:' + ','.join(packages)
+        return self.versions[language_pair]
+
+    def clear_versions(self):
+        self.versions = {}
+
+    def has_direct_model(self, source_language, target_language):
+        return translators.has_direct_package(source_language, target_language)
+
+
+def get_packages_mtime():
+    """changes when an argos package is installed, upgraded or removed"""
+    import argostranslate.settings
+
+    try:
+        return os.stat(argostranslate.settings.package_data_dir).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+class LibreTranslateEngine(TranslationEngine):
+    """a LibreTranslate compatible HTTP API, at BASEROW_TRANSLATE_PLUGIN_LIBRETRANSLATE_URL"""
+
+    type = 'libretranslate'
+
+    @property
+    def max_batch_size(self):
+        return settings.BASEROW_TRANSLATE_PLUGIN_LIBRETRANSLATE_MAX_BATCH_SIZE
+
+    @property
+    def concurrency(self):
+        return settings.BASEROW_TRANSLATE_PLUGIN_LIBRETRANSLATE_CONCURRENCY
+
+    def translate_batch(self, texts, source_language, target_language, parallel=False):
+        import requests
+
+        payload = {
+            'q': texts,
+            'source': source_language,
+            'target': target_language,
+            'format': 'text',
+        }
+        if settings.BASEROW_TRANSLATE_PLUGIN_LIBRETRANSLATE_API_KEY:
+            payload['api_key'] = settings.BASEROW_TRANSLATE_PLUGIN_LIBRETRANSLATE_API_KEY
+        response = requests.post(
+            settings.BASEROW_TRANSLATE_PLUGIN_LIBRETRANSLATE_URL.rstrip('/') + '/translate',
+            json=payload,
+            timeout=settings.BASEROW_TRANSLATE_PLUGIN_LIBRETRANSLATE_TIMEOUT,
+        )
+        response.raise_for_status()
+        # with a list of texts, translatedText is a list too
+        return response.json()['translatedText']
+
+    def get_version(self, source_language, target_language):
+        return f'libretranslate:{settings.BASEROW_TRANSLATE_PLUGIN_LIBRETRANSLATE_URL}'
+
+
+# the end of sentence token of the marian (opus-mt) vocabularies
+END_OF_SENTENCE = '</s>'
+
+
+class MarianEngine(TranslationEngine):
+    """MarianMT (opus-mt) models converted to CTranslate2, one directory per language pair in
+    BASEROW_TRANSLATE_PLUGIN_MARIAN_MODELS_DIR, e.g. de-fr/ containing the converted model
+    along with the source.spm and target.spm sentencepiece models"""
+
+    type = 'marian'
+
+    def __init__(self):
+        super().__init__()
+        # (source_language, target_language) -> (translator, source tokenizer, target tokenizer)
+        self.models = {}
+        self.lock = threading.Lock()
+
+    def get_model_path(self, source_language, target_language):
+        return os.path.join(settings.BASEROW_TRANSLATE_PLUGIN_MARIAN_MODELS_DIR,
+                            f'{source_language}-{target_language}')
+
+    def get_model(self, source_language, target_language):
+        language_pair = (source_language, target_language)
+        with self.lock:
+            if language_pair not in self.models:
+                import ctranslate2
+                import sentencepiece
+
+                model_path = self.get_model_path(source_language, target_language)
+                logger.info(f'loading marian model {model_path}')
+                self.models[language_pair] = (
+                    ctranslate2.Translator(model_path, device='cpu'),
+                    sentencepiece.SentencePieceProcessor(
+                        model_file=os.path.join(model_path, 'source.spm')),
+                    sentencepiece.SentencePieceProcessor(
+                        model_file=os.path.join(model_path, 'target.spm')),
+                )
+            return self.models[language_pair]
+
+    def translate_batch(self, texts, source_language, target_language, parallel=False):
+        if len(texts) == 0:
+            return []
+        translator, source_tokenizer, target_tokenizer = self.get_model(source_language,
+                                                                        target_language)
+        # marian models expect the end of sentence token, otherwise the translation gets cut
+        # short or runs on
+        tokenized = [source_tokenizer.encode(text.strip(), out_type=str) + [END_OF_SENTENCE]
+                     for text in texts]
+        results = translator.translate_batch(
+            tokenized,
+            max_batch_size=settings.BASEROW_TRANSLATE_PLUGIN_MAX_BATCH_SIZE,
+            beam_size=4,
+            num_hypotheses=1,
+        )
+        return [target_tokenizer.decode(result.hypotheses[0]) for result in results]
+
+    def get_version(self, source_language, target_language):
+        model_file = os.path.join(self.get_model_path(source_language, target_language),
+                                  'model.bin')
+        modified = int(os.path.getmtime(model_file)) if os.path.exists(model_file) else 0
+        return f'marian:{source_language}-{target_language}:{modified}'
+
+    def has_direct_model(self, source_language, target_language):
+        return os.path.isdir(self.get_model_path(source_language, target_language))
+
+
+class FakeEngine(TranslationEngine):
+    """deterministic translations, for tests and benchmarks. every batch takes
+    BASEROW_TRANSLATE_PLUGIN_FAKE_ENGINE_LATENCY_MS"""
+
+    type = 'fake'
+
+    def translate_batch(self, texts, source_language, target_language, parallel=False):
+        latency = settings.BASEROW_TRANSLATE_PLUGIN_FAKE_ENGINE_LATENCY_MS
+        if latency > 0:
+            time.sleep(latency / 1000)
+        return [f'translation ({source_language} to {target_language}): {text}' for text in texts]
+
+    def get_version(self, source_language, target_language):
+        return 'test'
+
+
+class TranslationEngineRegistry(Registry):
+    name = 'translation_engine'
+
+
+translation_engine_registry = TranslationEngineRegistry()
+
+
+def get_engine(engine_type=None):
+    """engine_type is the engine of a translation field, empty for the default engine"""
+    if engine_type == None or engine_type == '':
+        engine_type = settings.BASEROW_TRANSLATE_PLUGIN_DEFAULT_ENGINE
+    return translation_engine_registry.get(engine_type)
+
+
+def validate_engine(engine_type):
+    if engine_type not in ('', None) and engine_type not in translation_engine_registry.get_types():
+        raise serializers.ValidationError(f'unknown translation engine {engine_type}')
+
+
+def split_into_batches(items, batch_size):
+    if batch_size == None or len(items) <= batch_size:
+        return [items]
+    return [items[start:start + batch_size] for start in range(0, len(items), batch_size)]
+
+
+def translate_in_batches(engine, texts, source_language, target_language, parallel=False):
+    """send the texts to the engine in batches of at most its max_batch_size, up to its
+    concurrency batches at the same time. returns the translations in the same order"""
+    batches = split_into_batches(texts, engine.max_batch_size)
+    translate = lambda batch: engine.translate_batch(batch, source_language, target_language,
+                                                     parallel)
+    if len(batches) == 1 or engine.concurrency <= 1:
+        results = [translate(batch) for batch in batches]
+    else:
+        with ThreadPoolExecutor(max_workers=min(engine.concurrency, len(batches))) as executor:
+            results = list(executor.map(translate, batches))
+    return [translation for result in results for translation in result]
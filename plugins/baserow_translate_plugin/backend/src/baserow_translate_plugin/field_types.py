@@ -1,15 +1,16 @@
-import re
+import logging
 from typing import Dict, Any, Optional, List
 
 from baserow.contrib.database.fields.deferred_field_fk_updater import \
     DeferredFieldFkUpdater
 from baserow.contrib.database.formula import BaserowFormulaType, BaserowFormulaTextType
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Case, F, Value, When
 from django.core.exceptions import ValidationError
 
 from rest_framework import serializers
 
-from baserow.contrib.database.views.handler import ViewHandler
 from django.db import models
 from baserow.contrib.database.fields.registries import FieldType
 from baserow.contrib.database.fields.models import Field, TextField, LinkRowField
@@ -23,6 +24,56 @@ from baserow.contrib.database.table.models import TableModelQuerySet
 
 from .models import TranslationField, ChatGPTField
 from . import translation
+from . import chains
+from . import engines
+from . import jobs
+from . import dirty_queue
+from . import fingerprints
+from . import prompt_templates
+from . import metrics
+from . import tracing
+from . import lazy
+from . import budgets
+
+logger = logging.getLogger(__name__)
+
+
+def get_row_list(starting_row):
+    # Would be nice if instead Baserow did this for you before calling this func!
+    # Not suggesting you do anything, but instead the Baserow project itself should
+    # have a nicer API here :)
+
+    if isinstance(starting_row, TableModelQuerySet):
+        # if starting_row is TableModelQuerySet (when creating multiple rows in a batch), we want to iterate over its TableModel objects
+        return starting_row
+    elif isinstance(starting_row, list):
+        # if we have a list, it's a list of TableModels, iterate over them
+        return starting_row
+    else:
+        # we got a single TableModel, transform it into a list of one element
+        return [starting_row]
+
+
+def add_pending_update(field, update_collector, rows, via_path_to_starting_table):
+    """the new values (already set on the rows) are written by baserow along with the rest of
+    the row update: the fields depending on the updated cells are all set in one UPDATE, and
+    the views are updated once"""
+    update_statement = Case(
+        *[When(id=row.id, then=Value(getattr(row, field.db_column),
+                                     output_field=models.TextField()))
+          for row in rows],
+        default=F(field.db_column),
+        output_field=models.TextField(),
+    )
+    update_collector.add_field_with_pending_update_statement(
+        field, update_statement, via_path_to_starting_table=via_path_to_starting_table)
+
+
+def record_recomputed_cells(field_type, row_count, recomputed_count):
+    metrics.observe('dependency_update_rows', row_count, metrics.SIZE_BUCKETS,
+                    field_type=field_type)
+    metrics.increment('cells_recomputed', recomputed_count, field_type=field_type)
+    metrics.increment('cells_skipped', row_count - recomputed_count, field_type=field_type)
 
 
 class TranslationFieldType(FieldType):
@@ -58,12 +109,16 @@ class TranslationFieldType(FieldType):
     allowed_fields = [
         'source_field_id',
         'source_language',
-        'target_language'
+        'target_language',
+        'engine',
+        'lazy'
     ]
     serializer_field_names = [
         'source_field_id',
         'source_language',
-        'target_language'
+        'target_language',
+        'engine',
+        'lazy'
     ]
 
     serializer_field_overrides = {
@@ -83,6 +138,17 @@ class TranslationFieldType(FieldType):
             allow_null=False,
             allow_blank=False
         ),
+        "engine": serializers.CharField(
+            required=False,
+            allow_blank=True,
+            max_length=32,
+            validators=[engines.validate_engine],
+            help_text="The translation engine, empty for the default engine",
+        ),
+        "lazy": serializers.BooleanField(
+            required=False,
+            help_text="Translate the cells when they are read instead of for the whole table",
+        ),
     }
 
     def get_serializer_field(self, instance, **kwargs):
@@ -97,6 +163,12 @@ class TranslationFieldType(FieldType):
             }
         )
 
+    def get_response_serializer_field(self, instance, **kwargs):
+        if instance.lazy:
+            # the pending cells of the rows being returned are translated first
+            return lazy.LazyTranslationSerializerField(instance, **kwargs)
+        return self.get_serializer_field(instance, **kwargs)
+
     def get_model_field(self, instance, **kwargs):
         return models.TextField(
             default=None, blank=True, null=True, **kwargs
@@ -121,40 +193,41 @@ class TranslationFieldType(FieldType):
             field_cache: "FieldCache",
             via_path_to_starting_table,
     ):
+        with tracing.span('row_of_dependency_updated', {'field_type': self.type},
+                          field_id=field.id):
+            if field.lazy and not chains.has_eager_dependants(field):
+                # translated when the rows are read, the fingerprints tell which cells are
+                # pending (see lazy.py). when other fields are computed from this one, it's
+                # translated now, otherwise they'd get the old value of the cell
+                super().row_of_dependency_updated(field, starting_row, update_collector,
+                                                  field_cache, via_path_to_starting_table)
+                return
+            if settings.BASEROW_TRANSLATE_PLUGIN_ASYNC_DEPENDENCY_UPDATES:
+                # recomputed later by a celery worker, which also updates the fields depending
+                # on this one
+                dirty_queue.enqueue(field, [row.id for row in get_row_list(starting_row)])
+                return
+            self.recompute_rows(field, starting_row, update_collector, field_cache,
+                                via_path_to_starting_table)
+
+    def recompute_rows(
+            self,
+            field,
+            starting_row,
+            update_collector,
+            field_cache: "FieldCache",
+            via_path_to_starting_table,
+    ):
+        with metrics.field_type(self.type):
+            rows_to_update, changed_fingerprints = self.translate_changed_rows(
+                field, get_row_list(starting_row))
 
-        # Minor change, can use this property to get the internal/db column name
-        source_internal_field_name = field.source_field.db_column
-        target_internal_field_name = field.db_column
-        source_language = field.source_language
-        target_language = field.target_language
-
-        # Would be nice if instead Baserow did this for you before calling this func!
-        # Not suggesting you do anything, but instead the Baserow project itself should
-        # have a nicer API here :)
-
-        if isinstance(starting_row, TableModelQuerySet):
-            # if starting_row is TableModelQuerySet (when creating multiple rows in a batch), we want to iterate over its TableModel objects
-            row_list = starting_row
-        elif isinstance(starting_row, list):
-            # if we have a list, it's a list of TableModels, iterate over them
-            row_list = starting_row            
-        else:
-            # we got a single TableModel, transform it into a list of one element
-            row_list = [starting_row]
-
-        rows_to_bulk_update = []
-        for row in row_list:
-            source_value = getattr(row, source_internal_field_name)
-            translated_value = translation.translate(source_value, source_language,
-                                                     target_language)
-            setattr(row, target_internal_field_name, translated_value)
-            rows_to_bulk_update.append(row)
-
-        model = field.table.get_model()
-        model.objects.bulk_update(rows_to_bulk_update,
-                                  fields=[target_internal_field_name])
+        if len(rows_to_update) > 0:
+            add_pending_update(field, update_collector, rows_to_update,
+                               via_path_to_starting_table)
+            fingerprints.store_fingerprints(field.id, changed_fingerprints)
 
-        ViewHandler().field_value_updated(field)
+        # the dependant fields get the rows with the new values
         super().row_of_dependency_updated(
             field,
             starting_row,
@@ -163,8 +236,65 @@ class TranslationFieldType(FieldType):
             via_path_to_starting_table,
         )
 
+    def translate_changed_rows(self, field, row_list):
+        """sets the translation on the rows whose source value changed since they were last
+        translated, returns (those rows, their new fingerprints)"""
+        # Minor change, can use this property to get the internal/db column name
+        source_internal_field_name = field.source_field.db_column
+        target_internal_field_name = field.db_column
+        source_language = field.source_language
+        target_language = field.target_language
+
+        # only translate the cells whose source value changed since they were last translated
+        settings_fingerprint = translation.get_translation_settings_fingerprint(source_language,
+                                                                                target_language,
+                                                                                field.engine)
+        changed_fingerprints = fingerprints.get_changed_fingerprints(field.id, {
+            row.id: fingerprints.compute_fingerprint(settings_fingerprint,
+                                                     getattr(row, source_internal_field_name))
+            for row in row_list
+        })
+        rows_to_update = [row for row in row_list if row.id in changed_fingerprints]
+        record_recomputed_cells(self.type, len(row_list), len(rows_to_update))
+
+        source_values = [getattr(row, source_internal_field_name) for row in rows_to_update]
+        translated_values = translation.translate_many(source_values, source_language,
+                                                       target_language, engine=field.engine)
+        for row, translated_value in zip(rows_to_update, translated_values):
+            setattr(row, target_internal_field_name, translated_value)
+        return rows_to_update, changed_fingerprints
+
+    def translate_pending_rows(self, field, rows):
+        """lazy fields: translate the pending cells of these rows, and store them"""
+        if field.source_field == None or len(rows) == 0:
+            return
+        # the rows come from the same queryset, so the same model
+        model = type(rows[0])
+        source_internal_field_name = field.source_field.db_column
+        deferred_rows = [row for row in rows
+                         if source_internal_field_name in row.get_deferred_fields()]
+        if len(deferred_rows) > 0:
+            # e.g. the source field is hidden in a public view
+            source_values = dict(model.objects.filter(
+                id__in=[row.id for row in deferred_rows]
+            ).values_list('id', source_internal_field_name))
+            for row in deferred_rows:
+                setattr(row, source_internal_field_name, source_values.get(row.id))
+
+        with metrics.field_type(self.type):
+            rows_to_update, changed_fingerprints = self.translate_changed_rows(field, rows)
+        if len(rows_to_update) > 0:
+            # a fingerprint is only stored with its translation
+            with transaction.atomic():
+                model.objects.bulk_update(rows_to_update, fields=[field.db_column])
+                fingerprints.store_fingerprints(field.id, changed_fingerprints)
+
     def after_create(self, field, model, user, connection, before, field_kwargs):
-        self.update_all_rows(field)
+        fingerprints.clear_fingerprints(field.id)
+        if field.lazy:
+            # every cell is pending
+            return
+        jobs.start_recompute_job(field)
 
     def after_update(
             self,
@@ -178,21 +308,57 @@ class TranslationFieldType(FieldType):
             before,
             to_field_kwargs
     ):
-        self.update_all_rows(to_field)
-
-    def update_all_rows(self, field):
-        source_internal_field_name = field.source_field.db_column
-        target_internal_field_name = field.db_column
-
-        source_language = field.source_language
-        target_language = field.target_language
-
-        table_id = field.table.id
-
-        translation.translate_all_rows(table_id, source_internal_field_name,
-                                       target_internal_field_name,
-                                       source_language,
-                                       target_language)
+        if not self.settings_changed(from_field, to_field):
+            # e.g. only the name of the field changed, the values stay the same
+            return
+        if not isinstance(from_field, self.model_class):
+            # converted from another field type, the column contains values which weren't
+            # computed by us
+            fingerprints.clear_fingerprints(to_field.id)
+        if to_field.lazy:
+            # the new settings are part of the fingerprints, so every cell is pending
+            jobs.cancel_recompute_jobs(to_field)
+            return
+        jobs.start_recompute_job(to_field)
+
+    def settings_changed(self, from_field, to_field):
+        if not isinstance(from_field, TranslationField):
+            return True
+        return (from_field.source_field_id != to_field.source_field_id or
+                from_field.source_language != to_field.source_language or
+                from_field.target_language != to_field.target_language or
+                from_field.engine != to_field.engine or
+                from_field.lazy != to_field.lazy)
+
+    def update_all_rows(self, field, start_after_row_id=None, progress=None):
+        """recompute every row of the table"""
+        return chains.update_all_rows([[field]], start_after_row_id=start_after_row_id,
+                                      progress=progress)
+
+    def get_recompute_siblings(self, field):
+        """the other translations of the same source field, their pending recomputations are
+        done in the same pass over the table (see jobs.py)"""
+        return TranslationField.objects.filter(
+            table_id=field.table_id,
+            source_field_id=field.source_field_id,
+            source_language=field.source_language,
+            engine=field.engine,
+            trashed=False,
+        ).exclude(id=field.id)
+
+    def get_recompute_group_key(self, field):
+        """translations with the same key are computed together, see chains.py"""
+        return (field.source_field_id, field.source_language, field.engine)
+
+    def get_recompute_step(self, fields, table_model):
+        """recompute several translations of the same source field, reading the rows and
+        translating the source texts once for all of them"""
+        source_internal_field_name = fields[0].source_field.db_column
+        source_language = fields[0].source_language
+
+        targets = [(field.db_column, field.target_language, field.id) for field in fields]
+        return translation.get_translation_step(source_internal_field_name, source_language,
+                                                targets, engine=fields[0].engine)
 
     # Used by some of our helper scripts
     def random_value(self, instance, fake, cache):
@@ -263,7 +429,8 @@ class TranslationFieldType(FieldType):
             field_cache: "FieldCache",
             via_path_to_starting_table: Optional[List[LinkRowField]],
     ):
-        self.update_all_rows(field)
+        if not field.lazy:
+            jobs.start_recompute_job(field)
 
         super().field_dependency_updated(
             field,
@@ -291,10 +458,12 @@ class ChatGPTFieldType(FieldType):
     field_data_is_derived_from_attrs = False
 
     allowed_fields = [
-        'prompt'
+        'prompt',
+        'token_budget'
     ]
     serializer_field_names = [
-        'prompt'
+        'prompt',
+        'token_budget'
     ]
 
     serializer_field_overrides = {
@@ -303,6 +472,10 @@ class ChatGPTFieldType(FieldType):
             allow_null=False,
             allow_blank=False
         ),
+        "token_budget": serializers.IntegerField(
+            required=False,
+            min_value=0
+        ),
     }
 
     def get_serializer_field(self, instance, **kwargs):
@@ -323,8 +496,14 @@ class ChatGPTFieldType(FieldType):
         )
 
     def get_fields_in_prompt(self, prompt):
-        fields_to_expand = re.findall(r'{(.*?)}', prompt)
-        return fields_to_expand
+        return prompt_templates.get_fields_in_prompt(prompt)
+
+    def get_compiled_prompt(self, field, field_cache: FieldCache):
+        """the prompt, parsed once per version of the field, with field names resolved to
+        db columns"""
+        return prompt_templates.get_compiled_template(
+            field.id, field.prompt,
+            lambda field_name: field_cache.lookup_by_name(field.table, field_name).db_column)
 
     def get_field_dependencies(self, field_instance: Field,
                                field_lookup_cache: FieldCache):
@@ -354,43 +533,65 @@ class ChatGPTFieldType(FieldType):
             field_cache: "FieldCache",
             via_path_to_starting_table,
     ):
+        with tracing.span('row_of_dependency_updated', {'field_type': self.type},
+                          field_id=field.id):
+            if settings.BASEROW_TRANSLATE_PLUGIN_ASYNC_DEPENDENCY_UPDATES:
+                # recomputed later by a celery worker, see dirty_queue.py
+                dirty_queue.enqueue(field, [row.id for row in get_row_list(starting_row)])
+                return
+            self.recompute_rows(field, starting_row, update_collector, field_cache,
+                                via_path_to_starting_table)
+
+    def recompute_rows(
+            self,
+            field,
+            starting_row,
+            update_collector,
+            field_cache: "FieldCache",
+            via_path_to_starting_table,
+    ):
 
-        # the prompt template, with field variables not yet expanded
-        prompt_template = field.prompt
-        # the field names present in the prompt
-        fields_to_expand = self.get_fields_in_prompt(prompt_template)
+        # the prompt template, parsed and with field names resolved to db columns
+        prompt_template = self.get_compiled_prompt(field, field_cache)
         # internal field name that we'll store the result into
         target_internal_field_name = field.db_column
 
-        if isinstance(starting_row, TableModelQuerySet):
-            # if starting_row is TableModelQuerySet (when creating multiple rows in a batch), we want to iterate over its TableModel objects
-            row_list = starting_row
-        elif isinstance(starting_row, list):
-            # if we have a list, it's a list of TableModels, iterate over them
-            row_list = starting_row            
-        else:
-            # we got a single TableModel, transform it into a list of one element
-            row_list = [starting_row]
-
-        rows_to_bulk_update = []
-        for row in row_list:
-            # fully expand the prompt
-            expanded_prompt = prompt_template
-            for field_name in fields_to_expand:
-                internal_field_name = field_cache.lookup_by_name(field.table, field_name).db_column
-                field_value = getattr(row, internal_field_name)
-                # now, replace inside the prompt
-                expanded_prompt = expanded_prompt.replace('{' + field_name + '}', field_value)
-            # call chatgpt API
-            translated_value = translation.chatgpt(expanded_prompt)
+        row_list = get_row_list(starting_row)
+
+        # only query chatgpt for the cells whose prompt field values changed since they were
+        # last computed
+        settings_fingerprint = translation.get_chatgpt_settings_fingerprint(field.prompt)
+        changed_fingerprints = fingerprints.get_changed_fingerprints(field.id, {
+            row.id: fingerprints.compute_fingerprint(
+                settings_fingerprint,
+                *[getattr(row, db_column) for db_column in prompt_template.source_db_columns])
+            for row in row_list
+        })
+        rows_to_update = [row for row in row_list if row.id in changed_fingerprints]
+        record_recomputed_cells(self.type, len(row_list), len(rows_to_update))
+
+        # fully expand the prompt for each row
+        expanded_prompts = [prompt_template.render(row) for row in rows_to_update]
+        # call chatgpt API, the prompts of all the rows are sent concurrently
+        try:
+            with metrics.field_type(self.type):
+                translated_values = translation.chatgpt_many(expanded_prompts, field)
+        except budgets.BudgetExceeded as e:
+            # the cells keep their old value, a paused job recomputes them once the budget is
+            # raised
+            logger.warning(f'chatgpt field {field.id} not recomputed: {e}')
+            jobs.pause_for_budget(field, [row.id for row in rows_to_update], str(e))
+            rows_to_update = []
+            translated_values = []
+        for row, translated_value in zip(rows_to_update, translated_values):
             setattr(row, target_internal_field_name, translated_value)
-            rows_to_bulk_update.append(row)
 
-        model = field.table.get_model()
-        model.objects.bulk_update(rows_to_bulk_update,
-                                  fields=[target_internal_field_name])
+        if len(rows_to_update) > 0:
+            add_pending_update(field, update_collector, rows_to_update,
+                               via_path_to_starting_table)
+            fingerprints.store_fingerprints(field.id, changed_fingerprints)
 
-        ViewHandler().field_value_updated(field)
+        # the dependant fields get the rows with the new values
         super().row_of_dependency_updated(
             field,
             starting_row,
@@ -400,7 +601,8 @@ class ChatGPTFieldType(FieldType):
         )
 
     def after_create(self, field, model, user, connection, before, field_kwargs):
-        self.update_all_rows(field)
+        fingerprints.clear_fingerprints(field.id)
+        jobs.start_recompute_job(field)
 
     def after_update(
             self,
@@ -414,19 +616,47 @@ class ChatGPTFieldType(FieldType):
             before,
             to_field_kwargs
     ):
-        self.update_all_rows(to_field)
-
-    def update_all_rows(self, field):
+        if not self.settings_changed(from_field, to_field):
+            if isinstance(from_field, ChatGPTField) and \
+                    from_field.token_budget != to_field.token_budget:
+                # a job paused by the old budget may fit in the new one
+                jobs.resume_recompute_job(to_field)
+            # e.g. only the name of the field changed, the values stay the same
+            return
+        if not isinstance(from_field, self.model_class):
+            # converted from another field type, the column contains values which weren't
+            # computed by us
+            fingerprints.clear_fingerprints(to_field.id)
+        jobs.start_recompute_job(to_field)
+
+    def settings_changed(self, from_field, to_field):
+        if not isinstance(from_field, ChatGPTField):
+            return True
+        return from_field.prompt != to_field.prompt
+
+    def estimate_tokens(self, field, start_after_row_id=None):
+        """pre-flight estimate of the tokens needed to recompute the rows, see budgets.py"""
+        return translation.estimate_chatgpt_all_rows(field.table.get_model(), field.prompt,
+                                                     field.id, start_after_row_id)
+
+    def update_all_rows(self, field, start_after_row_id=None, progress=None):
+        """recompute every row of the table"""
+        return chains.update_all_rows([[field]], start_after_row_id=start_after_row_id,
+                                      progress=progress)
+
+    def get_recompute_group_key(self, field):
+        # every prompt is computed on its own
+        return field.id
+
+    def get_recompute_step(self, fields, table_model):
+        field = fields[0]
         # this is the internal field id where we'll put the result of the chatgpt query
         target_internal_field_name = field.db_column
         # the prompt, with field variables not expanded yet
         prompt = field.prompt
-        # the table id which contains the target field
-        table_id = field.table.id
-        # get all the field names present in the prompt
-        prompt_field_names = self.get_fields_in_prompt(prompt)
 
-        translation.chatgpt_all_rows(table_id, target_internal_field_name, prompt, prompt_field_names)
+        return translation.get_chatgpt_step(table_model, target_internal_field_name, prompt,
+                                            field_id=field.id, field=field)
 
     # Used by some of our helper scripts
     def random_value(self, instance, fake, cache):
@@ -497,7 +727,9 @@ class ChatGPTFieldType(FieldType):
             field_cache: "FieldCache",
             via_path_to_starting_table: Optional[List[LinkRowField]],
     ):
-        self.update_all_rows(field)
+        # a field used in the prompt changed, maybe its name
+        prompt_templates.invalidate_compiled_templates(field.id)
+        jobs.start_recompute_job(field)
 
         super().field_dependency_updated(
             field,
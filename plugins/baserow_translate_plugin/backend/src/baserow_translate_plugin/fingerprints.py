@@ -0,0 +1,59 @@
+"""
+every computed translation / chatgpt cell remembers a fingerprint of what it was computed
+from (the source value or prompt field values, plus the field settings). when we're asked to
+recompute a cell whose inputs haven't changed, we can skip the translation or the chatgpt
+round-trip entirely.
+"""
+
+import hashlib
+import json
+
+from django.db import connection
+
+from .models import CellFingerprint
+
+# rows per INSERT statement
+STORE_BATCH_SIZE = 1000
+
+
+def compute_fingerprint(*parts):
+    value = json.dumps(parts, default=str)
+    return hashlib.sha256(value.encode('utf-8')).hexdigest()
+
+
+def get_changed_fingerprints(field_id, fingerprints):
+    """fingerprints is a dict of row id -> fingerprint. returns the entries which differ from
+    the stored fingerprints (or have none), i.e. the cells which need to be recomputed"""
+    stored_fingerprints = dict(CellFingerprint.objects.filter(
+        field_id=field_id, row_id__in=fingerprints.keys()).values_list('row_id', 'fingerprint'))
+    return {row_id: fingerprint for row_id, fingerprint in fingerprints.items()
+            if stored_fingerprints.get(row_id) != fingerprint}
+
+
+def store_fingerprints(field_id, fingerprints):
+    """should run in the same transaction as the one writing the computed values. the same
+    cells can be stored concurrently (e.g. a row edit during a full-table job, two lazy reads
+    of a page), so this is an upsert: the last writer wins instead of failing on the unique
+    constraint. django 3.2's bulk_create can't update on conflict, hence the SQL"""
+    if len(fingerprints) == 0:
+        return
+    table_name = connection.ops.quote_name(CellFingerprint._meta.db_table)
+    # always locking the rows in the same order, concurrent writers can't deadlock
+    entries = sorted(fingerprints.items())
+    with connection.cursor() as cursor:
+        for start in range(0, len(entries), STORE_BATCH_SIZE):
+            batch = entries[start:start + STORE_BATCH_SIZE]
+            cursor.execute(
+                f'INSERT INTO {table_name} (field_id, row_id, fingerprint) VALUES '
+                + ', '.join(['(%s, %s, %s)'] * len(batch))
+                + ' ON CONFLICT (field_id, row_id) '
+                  'DO UPDATE SET fingerprint = EXCLUDED.fingerprint',
+                [value for row_id, fingerprint in batch
+                 for value in (field_id, row_id, fingerprint)]
+            )
+
+
+def clear_fingerprints(field_id):
+    """the column's content can't be trusted anymore (e.g. the field was converted from
+    another type), so every cell needs to be recomputed"""
+    CellFingerprint.objects.filter(field_id=field_id).delete()
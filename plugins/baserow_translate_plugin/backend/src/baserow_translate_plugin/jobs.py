@@ -0,0 +1,243 @@
+"""
+full-table recomputations (translating or querying chatgpt for every row of a table) can take
+minutes on large tables, so they run as a background job in a celery worker instead of
+inside the HTTP request which created / updated the field. a job which would go over a chatgpt
+token budget is paused (see budgets.py), and resumed once the budget is raised.
+"""
+
+import logging
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from baserow.contrib.database.fields.registries import field_type_registry
+
+from .models import FieldRecomputeJob
+from . import budgets
+from . import chains
+from . import metrics
+from . import tracing
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATES = [FieldRecomputeJob.STATE_PENDING, FieldRecomputeJob.STATE_RUNNING]
+
+
+def start_recompute_job(field):
+    """schedule a recomputation of all the rows of this field. the celery task is only sent
+    once the current transaction commits, so that the worker can see the new field"""
+
+    # any job still running for this field was computing values for the old settings
+    cancel_recompute_jobs(field)
+    job = FieldRecomputeJob.objects.create(field=field)
+
+    from .tasks import run_recompute_job_task
+    transaction.on_commit(lambda: run_recompute_job_task.delay(job.id))
+    return job
+
+
+def cancel_recompute_jobs(field):
+    """the running job notices the cancellation at its next checkpoint"""
+    return FieldRecomputeJob.objects.filter(
+        field_id=field.id, state__in=ACTIVE_STATES + [FieldRecomputeJob.STATE_PAUSED]
+    ).update(state=FieldRecomputeJob.STATE_CANCELLED, updated_on=timezone.now())
+
+
+def get_latest_recompute_job(field):
+    return FieldRecomputeJob.objects.filter(field_id=field.id).first()
+
+
+def run_recompute_job(job_id):
+    """executed by the celery worker. if the job was interrupted (worker restart), running it
+    again resumes after the last checkpointed row. pending jobs of fields which can be computed
+    in the same pass over the table (e.g. several translations of one source field) are run
+    together with this one, and so are the plugin fields depending on this one (see
+    chains.py)"""
+
+    try:
+        job = FieldRecomputeJob.objects.select_related('field').get(id=job_id)
+    except FieldRecomputeJob.DoesNotExist:
+        # the field was deleted in the meantime
+        return
+    if job.state not in ACTIVE_STATES:
+        dispatch_waiting_jobs([job.field])
+        return
+    if job.state == FieldRecomputeJob.STATE_RUNNING and job.shared_with_id != None:
+        # another job's pass computes this field
+        return
+
+    field = job.field.specific
+    if field.trashed:
+        FieldRecomputeJob.objects.filter(id=job.id).update(
+            state=FieldRecomputeJob.STATE_CANCELLED, updated_on=timezone.now())
+        dispatch_waiting_jobs([field])
+        return
+    if job.state == FieldRecomputeJob.STATE_PENDING and has_active_dependency_jobs(field):
+        # the job of a field this one is computed from takes this job over, or sends it again
+        # once it's done
+        return
+
+    FieldRecomputeJob.objects.filter(id=job.id).update(
+        state=FieldRecomputeJob.STATE_RUNNING, updated_on=timezone.now())
+
+    field_type = field_type_registry.get_by_model(field)
+    fields = [field]
+    if hasattr(field_type, 'get_recompute_siblings'):
+        sibling_jobs = claim_sibling_jobs(job, field_type.get_recompute_siblings(field))
+        fields.extend(sibling_job.field.specific for sibling_job in sibling_jobs)
+    else:
+        sibling_jobs = []
+    # the fields computed from these ones are recomputed in the same pass, taking over their
+    # jobs. the ones whose job runs on its own are left to it
+    dependant_fields = chains.get_dependant_fields(fields)
+    sibling_jobs.extend(claim_sibling_jobs(job, dependant_fields))
+    job_ids = [job.id] + [sibling_job.id for sibling_job in sibling_jobs]
+    busy_field_ids = set(FieldRecomputeJob.objects.filter(
+        field__in=dependant_fields, state__in=ACTIVE_STATES
+    ).exclude(id__in=job_ids).values_list('field_id', flat=True))
+    fields.extend(dependant_field for dependant_field in dependant_fields
+                  if dependant_field.id not in busy_field_ids)
+
+    def progress(last_row_id, rows_done, rows_total):
+        # store the checkpoint. this only matches the jobs which haven't been cancelled, if
+        # any was we tell the caller to stop.
+        percentage = 100 if rows_total == 0 else int(rows_done * 100 / rows_total)
+        updated = FieldRecomputeJob.objects.filter(
+            id__in=job_ids, state=FieldRecomputeJob.STATE_RUNNING
+        ).update(last_row_id=last_row_id, progress_percentage=percentage,
+                 updated_on=timezone.now())
+        return updated == len(job_ids)
+
+    try:
+        check_budgets(fields, [job] + sibling_jobs, job.last_row_id)
+        with tracing.span('update_all_rows', {'field_type': field_type.type}, job_id=job.id,
+                          field_ids=[field.id for field in fields]):
+            completed = chains.update_all_rows(chains.order_in_groups(fields),
+                                               start_after_row_id=job.last_row_id,
+                                               progress=progress)
+    except budgets.BudgetExceeded as e:
+        # the rows done so far are checkpointed, resume_recompute_job continues from there
+        logger.warning(f'recompute job {job.id} for field {field.id} paused: {e}')
+        FieldRecomputeJob.objects.filter(
+            id__in=job_ids, state=FieldRecomputeJob.STATE_RUNNING
+        ).update(state=FieldRecomputeJob.STATE_PAUSED, error=str(e), updated_on=timezone.now())
+        dispatch_waiting_jobs(fields)
+        return
+    except Exception as e:
+        logger.exception(f'recompute job {job.id} for field {field.id} failed')
+        metrics.increment('recompute_jobs_failed', field_type=field_type.type)
+        FieldRecomputeJob.objects.filter(id__in=job_ids).update(
+            state=FieldRecomputeJob.STATE_FAILED, error=str(e), updated_on=timezone.now())
+        dispatch_waiting_jobs(fields)
+        raise
+
+    if completed:
+        metrics.increment('recompute_jobs_finished', len(job_ids), field_type=field_type.type)
+        FieldRecomputeJob.objects.filter(
+            id__in=job_ids, state=FieldRecomputeJob.STATE_RUNNING
+        ).update(state=FieldRecomputeJob.STATE_FINISHED, progress_percentage=100,
+                 updated_on=timezone.now())
+    else:
+        # one of the fields was cancelled, the others resume from the checkpoint on their own
+        reschedule_running_jobs(job_ids)
+    dispatch_waiting_jobs(fields)
+
+
+def check_budgets(fields, field_jobs, start_after_row_id):
+    """pre-flight: estimate the chatgpt tokens each field of the pass needs, store the
+    estimate on its job, and raise budgets.BudgetExceeded if it doesn't fit in its budgets"""
+    job_by_field_id = {field_job.field_id: field_job for field_job in field_jobs}
+    for field in fields:
+        field_type = field_type_registry.get_by_model(field)
+        if not hasattr(field_type, 'estimate_tokens'):
+            continue
+        tokens = field_type.estimate_tokens(field, start_after_row_id)
+        if field.id in job_by_field_id:
+            FieldRecomputeJob.objects.filter(id=job_by_field_id[field.id].id).update(
+                estimated_tokens=tokens, updated_on=timezone.now())
+        budgets.check_budget(field, tokens)
+
+
+def resume_recompute_job(field):
+    """resume the paused job of this field, along with the jobs of the fields which were
+    recomputed in the same pass. returns the number of jobs resumed"""
+    job = get_latest_recompute_job(field)
+    if job == None or job.state != FieldRecomputeJob.STATE_PAUSED:
+        return 0
+    lead_job_id = job.shared_with_id if job.shared_with_id != None else job.id
+    paused_jobs = FieldRecomputeJob.objects.filter(
+        Q(id=lead_job_id) | Q(shared_with_id=lead_job_id), state=FieldRecomputeJob.STATE_PAUSED)
+    job_ids = list(paused_jobs.values_list('id', flat=True))
+    FieldRecomputeJob.objects.filter(
+        id__in=job_ids, state=FieldRecomputeJob.STATE_PAUSED
+    ).update(state=FieldRecomputeJob.STATE_PENDING, shared_with=None, error='',
+             updated_on=timezone.now())
+
+    from .tasks import run_recompute_job_task
+    for job_id in job_ids:
+        transaction.on_commit(lambda job_id=job_id: run_recompute_job_task.delay(job_id))
+    return len(job_ids)
+
+
+def pause_for_budget(field, row_ids, error):
+    """the budget didn't allow recomputing these rows (e.g. edited cells), they're left to a
+    paused job of the field, resumed when the budget is raised. its pass over the table skips
+    the cells whose fingerprint didn't change, so only the ones left behind use tokens"""
+    job = get_latest_recompute_job(field)
+    if job != None and job.state == FieldRecomputeJob.STATE_PAUSED:
+        if job.last_row_id != None and min(row_ids) <= job.last_row_id:
+            # the rows are before its checkpoint, its pass starts over
+            FieldRecomputeJob.objects.filter(id=job.id).update(
+                last_row_id=None, progress_percentage=0, updated_on=timezone.now())
+        return job
+    return FieldRecomputeJob.objects.create(field=field, state=FieldRecomputeJob.STATE_PAUSED,
+                                            error=error)
+
+
+def has_active_dependency_jobs(field):
+    return FieldRecomputeJob.objects.filter(
+        field__in=chains.get_dependency_fields(field), state__in=ACTIVE_STATES).exists()
+
+
+def dispatch_waiting_jobs(fields):
+    """send the pending jobs which were waiting for the jobs of these fields again, see
+    run_recompute_job"""
+    from .tasks import run_recompute_job_task
+
+    for job_id in FieldRecomputeJob.objects.filter(
+            field__in=chains.get_dependant_fields(fields),
+            state=FieldRecomputeJob.STATE_PENDING).values_list('id', flat=True):
+        transaction.on_commit(lambda job_id=job_id: run_recompute_job_task.delay(job_id))
+
+
+def claim_sibling_jobs(job, sibling_fields):
+    """take over the pending jobs of the sibling (or dependant) fields which are at the same
+    checkpoint, and the ones this job had already taken over before being interrupted"""
+    sibling_jobs = FieldRecomputeJob.objects.select_related('field').filter(
+        field__in=sibling_fields)
+    claimed_jobs = list(sibling_jobs.filter(state=FieldRecomputeJob.STATE_RUNNING,
+                                            shared_with_id=job.id))
+    for sibling_job in sibling_jobs.filter(state=FieldRecomputeJob.STATE_PENDING,
+                                           last_row_id=job.last_row_id):
+        # the sibling's own celery task may be starting right now, only one of us wins
+        claimed = FieldRecomputeJob.objects.filter(
+            id=sibling_job.id, state=FieldRecomputeJob.STATE_PENDING
+        ).update(state=FieldRecomputeJob.STATE_RUNNING, shared_with=job,
+                 updated_on=timezone.now())
+        if claimed == 1:
+            claimed_jobs.append(sibling_job)
+    return claimed_jobs
+
+
+def reschedule_running_jobs(job_ids):
+    from .tasks import run_recompute_job_task
+
+    for job_id in FieldRecomputeJob.objects.filter(
+            id__in=job_ids, state=FieldRecomputeJob.STATE_RUNNING).values_list('id', flat=True):
+        rescheduled = FieldRecomputeJob.objects.filter(
+            id=job_id, state=FieldRecomputeJob.STATE_RUNNING
+        ).update(state=FieldRecomputeJob.STATE_PENDING, shared_with=None,
+                 updated_on=timezone.now())
+        if rescheduled == 1:
+            transaction.on_commit(lambda job_id=job_id: run_recompute_job_task.delay(job_id))
@@ -0,0 +1,46 @@
+"""
+lazy translation fields (TranslationField.lazy) aren't translated for the whole table when
+they're created, nor when a source cell changes: the cells are pending (their fingerprint
+doesn't match, see fingerprints.py) until they are read through the API. then the pending
+cells of the rows being returned (e.g. the page of the grid view) are translated in one batch
+and stored, so the cost is proportional to what the users actually look at. filtering /
+sorting on a lazy field uses the values stored so far.
+"""
+
+from rest_framework import serializers
+
+from baserow.contrib.database.fields.registries import field_type_registry
+
+
+class LazyTranslationSerializerField(serializers.Field):
+    """the value of a lazy translation field. the first row serialized translates the pending
+    cells of all the rows serialized together"""
+
+    def __init__(self, field, **kwargs):
+        self.field = field
+        # the whole row is needed, to translate the source value
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        kwargs.pop('required', None)
+        super().__init__(**kwargs)
+        self.translated_row_ids = set()
+
+    def to_representation(self, row):
+        if row.id not in self.translated_row_ids:
+            rows = self.get_serialized_rows(row)
+            field_type = field_type_registry.get_by_model(self.field)
+            field_type.translate_pending_rows(self.field, rows)
+            self.translated_row_ids.update(serialized_row.id for serialized_row in rows)
+        return getattr(row, self.field.db_column)
+
+    def get_serialized_rows(self, row):
+        """the rows of the list (page) being serialized, or just this row"""
+        list_serializer = getattr(self.parent, 'parent', None)
+        if not isinstance(list_serializer, serializers.ListSerializer):
+            return [row]
+        rows = list(list_serializer.instance or [])
+        if row not in rows:
+            return [row]
+        # the values are set on the row objects being serialized
+        return [row if other_row.id == row.id else other_row for other_row in rows
+                if other_row.id not in self.translated_row_ids]
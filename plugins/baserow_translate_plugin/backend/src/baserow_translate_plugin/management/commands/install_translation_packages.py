@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from baserow_translate_plugin import packages
+
+
+class Command(BaseCommand):
+    help = (
+        "Installs argos translate language packages, either from a directory containing "
+        ".argosmodel files, or for the given language pairs (e.g. en:fr fr:en) from a local "
+        "index file or the argos package index."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "language_pairs",
+            nargs="*",
+            help="Language pairs to install, formatted as source:target, e.g. en:fr",
+        )
+        parser.add_argument(
+            "--from-dir",
+            type=str,
+            help="Install all the .argosmodel files found in this directory.",
+        )
+        parser.add_argument(
+            "--index",
+            type=str,
+            help="Local package index file to look up the language pairs in, instead of "
+            "downloading the argos package index.",
+        )
+
+    def handle(self, *args, **options):
+        language_pairs = []
+        for language_pair in options["language_pairs"]:
+            if language_pair.count(":") != 1:
+                raise CommandError(f"Invalid language pair {language_pair}, expected e.g. en:fr")
+            language_pairs.append(language_pair.split(":"))
+
+        if options["from_dir"]:
+            for path in packages.install_packages_from_dir(options["from_dir"]):
+                self.stdout.write(f"Installed {path}")
+
+        language_pairs = [(from_code, to_code) for from_code, to_code in language_pairs
+                          if not packages.is_package_installed(from_code, to_code)]
+        if len(language_pairs) == 0:
+            return
+
+        available_packages = packages.get_available_packages(options["index"])
+        for from_code, to_code in language_pairs:
+            try:
+                packages.install_package(from_code, to_code,
+                                         available_packages=available_packages)
+            except ValueError as e:
+                raise CommandError(str(e))
+            self.stdout.write(f"Installed {from_code} to {to_code}")
@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from baserow_translate_plugin.translation_service import TranslationServer
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs the translation service, which keeps the translation models loaded in this "
+        "process and translates batches of texts for the other Baserow processes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--socket",
+            type=str,
+            default=settings.BASEROW_TRANSLATE_PLUGIN_TRANSLATION_SERVICE_SOCKET,
+            help="Path of the unix socket to listen on.",
+        )
+
+    def handle(self, *args, **options):
+        socket_path = options["socket"]
+        if not socket_path:
+            raise CommandError(
+                "Provide --socket or set BASEROW_TRANSLATE_PLUGIN_TRANSLATION_SERVICE_SOCKET"
+            )
+        server = TranslationServer(socket_path)
+        self.stdout.write(f"Translation service listening on {socket_path}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
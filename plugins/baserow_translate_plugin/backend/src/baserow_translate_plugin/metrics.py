@@ -0,0 +1,231 @@
+"""
+simple in-process metrics (counters, histograms and gauges: engine calls and latencies, cache
+hits / misses etc), so that we can see what the plugin is doing without logging every single
+call. render_prometheus() exports them in the prometheus text format, see the metrics API
+endpoint. every process (web, celery workers) records its own metrics in memory, and when the
+endpoint is enabled they're summed in the database (see metrics_store.py), so that the endpoint
+shows the work done by all the processes.
+"""
+
+import contextvars
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+PREFIX = 'baserow_translate_plugin_'
+
+# latencies, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# batch sizes, rows
+SIZE_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 10000)
+
+_lock = threading.Lock()
+_counters = Counter()
+# key -> [count per bucket, sum, count]
+_histograms = {}
+_histogram_buckets = {}
+_gauges = {}
+
+# the process which started the metrics_store exporter, it has to run in every forked process
+_exporter_pid = None
+# the samples already added to the database totals, see metrics_store.py
+_exported_samples = {}
+# the type of the field whose cells are being computed, see field_type()
+_field_type = contextvars.ContextVar('metrics_field_type', default='')
+
+
+def get_key(name, labels):
+    return (name, tuple(sorted(labels.items())))
+
+
+def ensure_exporter():
+    """starts the metrics_store exporter in this process, if it isn't running yet"""
+    global _exporter_pid
+    if _exporter_pid == os.getpid():
+        return
+    with _lock:
+        if _exporter_pid == os.getpid():
+            return
+        _exporter_pid = os.getpid()
+    # a forked process inherits the metrics of its parent, which exports them itself
+    set_exported_samples(get_samples())
+    from .metrics_store import start_exporter
+    start_exporter()
+
+
+@contextmanager
+def field_type(type):
+    """the engine and chatgpt metrics recorded within get a field_type label"""
+    token = _field_type.set(type)
+    try:
+        yield
+    finally:
+        _field_type.reset(token)
+
+
+def get_field_type():
+    return _field_type.get()
+
+
+def increment(name, value=1, **labels):
+    ensure_exporter()
+    key = get_key(name, labels)
+    with _lock:
+        _counters[key] += value
+
+
+def get_counter(name, **labels):
+    key = get_key(name, labels)
+    with _lock:
+        return _counters[key]
+
+
+def get_counters():
+    """returns a list of (name, labels dict, value)"""
+    with _lock:
+        return [(name, dict(labels), value) for (name, labels), value in _counters.items()]
+
+
+def observe(name, value, buckets=DEFAULT_BUCKETS, **labels):
+    """record a value in a histogram, the buckets are fixed by the first observation"""
+    ensure_exporter()
+    key = get_key(name, labels)
+    with _lock:
+        buckets = _histogram_buckets.setdefault(name, buckets)
+        if key not in _histograms:
+            _histograms[key] = [[0] * len(buckets), 0, 0]
+        histogram = _histograms[key]
+        for i, upper_bound in enumerate(buckets):
+            if value <= upper_bound:
+                histogram[0][i] += 1
+        histogram[1] += value
+        histogram[2] += 1
+
+
+def get_histogram(name, **labels):
+    """returns (count, sum)"""
+    key = get_key(name, labels)
+    with _lock:
+        if key not in _histograms:
+            return 0, 0
+        return _histograms[key][2], _histograms[key][1]
+
+
+@contextmanager
+def timer(name, **labels):
+    """records the duration in the {name}_seconds histogram, and exceptions in the
+    {name}_errors counter"""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        increment(f'{name}_errors', **labels)
+        raise
+    finally:
+        observe(f'{name}_seconds', time.perf_counter() - start, **labels)
+
+
+def set_gauge(name, value, **labels):
+    key = get_key(name, labels)
+    with _lock:
+        _gauges[key] = value
+
+
+def get_gauge(name, **labels):
+    key = get_key(name, labels)
+    with _lock:
+        return _gauges.get(key)
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+        _histogram_buckets.clear()
+        _gauges.clear()
+        _exported_samples.clear()
+
+
+def get_samples():
+    """the counters and histograms, as a dict of (family, kind, suffix, labels, le, position)
+    -> value. a family is the name in the "# TYPE" line, position orders its samples"""
+    samples = {}
+    with _lock:
+        for (name, labels), value in _counters.items():
+            samples[(f'{name}_total', 'counter', '', labels, '', 0)] = value
+        for (name, labels), (bucket_counts, total, count) in _histograms.items():
+            buckets = _histogram_buckets[name]
+            for position, (upper_bound, bucket_count) in enumerate(zip(buckets, bucket_counts)):
+                samples[(name, 'histogram', '_bucket', labels, str(upper_bound), position)] = \
+                    bucket_count
+            samples[(name, 'histogram', '_bucket', labels, '+Inf', len(buckets))] = count
+            samples[(name, 'histogram', '_sum', labels, '', len(buckets) + 1)] = total
+            samples[(name, 'histogram', '_count', labels, '', len(buckets) + 2)] = count
+    return samples
+
+
+def get_unexported_samples():
+    """returns (samples, what they gained since they were last exported)"""
+    samples = get_samples()
+    with _lock:
+        exported_samples = dict(_exported_samples)
+    changes = {}
+    for key, value in samples.items():
+        exported = exported_samples.get(key, 0)
+        # less than exported: reset() was called
+        change = value - exported if value >= exported else value
+        # new samples are exported even when 0, e.g. the empty buckets of a histogram
+        if change != 0 or key not in exported_samples:
+            changes[key] = change
+    return samples, changes
+
+
+def set_exported_samples(samples):
+    with _lock:
+        _exported_samples.clear()
+        _exported_samples.update(samples)
+
+
+def format_labels(labels):
+    if len(labels) == 0:
+        return ''
+    escape = lambda value: str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in labels) + '}'
+
+
+def format_value(value):
+    # the database stores floats, counts are shown as integers
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def render_prometheus(samples=None):
+    """the metrics, in the prometheus text exposition format. samples (see get_samples)
+    default to the ones of this process, the gauges are always this process' ones"""
+    if samples == None:
+        samples = get_samples()
+    with _lock:
+        gauges = sorted(_gauges.items())
+
+    lines = []
+    typed = set()
+    for (family, kind, suffix, labels, le, position), value in sorted(
+            samples.items(), key=lambda item: (item[0][0], item[0][3], item[0][5])):
+        metric_name = f'{PREFIX}{family}'
+        if metric_name not in typed:
+            lines.append(f'# TYPE {metric_name} {kind}')
+            typed.add(metric_name)
+        sample_labels = labels + (('le', le),) if le != '' else labels
+        lines.append(f'{metric_name}{suffix}{format_labels(sample_labels)} {format_value(value)}')
+
+    for (name, labels), value in gauges:
+        metric_name = f'{PREFIX}{name}'
+        if metric_name not in typed:
+            lines.append(f'# TYPE {metric_name} gauge')
+            typed.add(metric_name)
+        lines.append(f'{metric_name}{format_labels(labels)} {format_value(value)}')
+
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,86 @@
+"""
+the metrics of every process (web, celery workers) summed in the database, so that the
+metrics endpoint shows the full-table jobs, the dirty queue and the calls made by the celery
+workers, not only what the web process answering the scrape did. each process keeps recording
+its metrics in memory (metrics.py), and a background thread adds what they gained to the
+database totals every BASEROW_TRANSLATE_PLUGIN_METRICS_EXPORT_SECONDS. only runs when the
+metrics endpoint is enabled.
+"""
+
+import atexit
+import json
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection
+
+from . import metrics
+from .models import MetricTotal
+
+logger = logging.getLogger(__name__)
+
+_export_lock = threading.Lock()
+
+
+def start_exporter():
+    if not settings.BASEROW_TRANSLATE_PLUGIN_METRICS_TOKEN:
+        return
+    threading.Thread(target=run_exporter, name='baserow-translate-plugin-metrics',
+                     daemon=True).start()
+    # what was recorded since the last export, when the worker is stopped
+    atexit.register(export_quietly)
+
+
+def run_exporter():
+    while True:
+        time.sleep(settings.BASEROW_TRANSLATE_PLUGIN_METRICS_EXPORT_SECONDS)
+        export_quietly()
+        # this thread's connection, it would time out before the next export
+        connection.close()
+
+
+def export_quietly():
+    try:
+        export()
+    except Exception:
+        logger.exception('could not export the metrics')
+
+
+def export():
+    """add what the metrics of this process gained since the last export to the totals"""
+    with _export_lock:
+        samples, changes = metrics.get_unexported_samples()
+        if len(changes) > 0:
+            add_to_totals(changes)
+        metrics.set_exported_samples(samples)
+
+
+def add_to_totals(changes):
+    table_name = connection.ops.quote_name(MetricTotal._meta.db_table)
+    rows = sorted(((family, kind, suffix, dump_labels(labels), le, position, value)
+                   for (family, kind, suffix, labels, le, position), value in changes.items()),
+                  key=lambda row: row[:6])
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table_name} (family, kind, suffix, labels, le, position, value) '
+            'VALUES ' + ', '.join(['(%s, %s, %s, %s, %s, %s, %s)'] * len(rows))
+            + ' ON CONFLICT (family, suffix, labels, le) '
+              f'DO UPDATE SET value = {table_name}.value + EXCLUDED.value',
+            [value for row in rows for value in row]
+        )
+
+
+def dump_labels(labels):
+    return json.dumps([[name, str(value)] for name, value in labels])
+
+
+def load_samples():
+    """the totals of all the processes, in the format of metrics.get_samples"""
+    return {
+        (total.family, total.kind, total.suffix,
+         tuple(tuple(label) for label in json.loads(total.labels)), total.le, total.position):
+            total.value
+        for total in MetricTotal.objects.all()
+    }
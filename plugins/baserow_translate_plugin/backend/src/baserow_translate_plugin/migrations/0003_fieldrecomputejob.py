@@ -0,0 +1,31 @@
+# Generated by Django 3.2.13 on 2026-10-18 09:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('database', '0119_field_tsvector_column_created'),
+        ('baserow_translate_plugin', '0002_chatgptfield'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FieldRecomputeJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('state', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('finished', 'Finished'), ('cancelled', 'Cancelled'), ('failed', 'Failed')], default='pending', max_length=32)),
+                ('progress_percentage', models.IntegerField(default=0)),
+                ('last_row_id', models.PositiveIntegerField(blank=True, help_text='Checkpoint: id of the last row that was processed, the job resumes after it.', null=True)),
+                ('error', models.TextField(blank=True, default='')),
+                ('created_on', models.DateTimeField(auto_now_add=True)),
+                ('updated_on', models.DateTimeField(auto_now=True)),
+                ('field', models.ForeignKey(help_text='The field whose values are being recomputed.', on_delete=django.db.models.deletion.CASCADE, related_name='+', to='database.field')),
+            ],
+            options={
+                'ordering': ('-id',),
+            },
+        ),
+    ]
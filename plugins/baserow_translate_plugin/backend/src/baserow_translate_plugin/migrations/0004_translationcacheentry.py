@@ -0,0 +1,27 @@
+# Generated by Django 3.2.13 on 2026-10-18 10:05
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('baserow_translate_plugin', '0003_fieldrecomputejob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TranslationCacheEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(help_text='sha256 of the engine version, language pair and normalized text.', max_length=64, unique=True)),
+                ('source_language', models.CharField(max_length=255)),
+                ('target_language', models.CharField(max_length=255)),
+                ('engine_version', models.CharField(max_length=255)),
+                ('translated_text', models.TextField()),
+                ('created_on', models.DateTimeField(auto_now_add=True)),
+                ('last_used_on', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 3.2.13 on 2026-10-18 11:20
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('baserow_translate_plugin', '0004_translationcacheentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChatGPTCacheEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(help_text='sha256 of the model, parameters and expanded prompt.', max_length=64, unique=True)),
+                ('model', models.CharField(max_length=255)),
+                ('completion', models.TextField()),
+                ('created_on', models.DateTimeField(auto_now_add=True)),
+                ('last_used_on', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
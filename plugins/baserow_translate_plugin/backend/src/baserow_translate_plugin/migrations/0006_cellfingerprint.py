@@ -0,0 +1,27 @@
+# Generated by Django 3.2.13 on 2026-10-18 12:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('database', '0119_field_tsvector_column_created'),
+        ('baserow_translate_plugin', '0005_chatgptcacheentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CellFingerprint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('row_id', models.PositiveIntegerField()),
+                ('fingerprint', models.CharField(max_length=64)),
+                ('field', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='database.field')),
+            ],
+            options={
+                'unique_together': {('field', 'row_id')},
+            },
+        ),
+    ]
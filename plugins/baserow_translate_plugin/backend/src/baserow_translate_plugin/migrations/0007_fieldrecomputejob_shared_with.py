@@ -0,0 +1,19 @@
+# Generated by Django 3.2.13 on 2026-10-18 13:10
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('baserow_translate_plugin', '0006_cellfingerprint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fieldrecomputejob',
+            name='shared_with',
+            field=models.ForeignKey(blank=True, help_text='The job whose pass over the table also computes this field.', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='baserow_translate_plugin.fieldrecomputejob'),
+        ),
+    ]
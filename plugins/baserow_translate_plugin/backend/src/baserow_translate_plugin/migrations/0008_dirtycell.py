@@ -0,0 +1,28 @@
+# Generated by Django 3.2.13 on 2026-10-18 13:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('database', '0119_field_tsvector_column_created'),
+        ('baserow_translate_plugin', '0007_fieldrecomputejob_shared_with'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DirtyCell',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('row_id', models.PositiveIntegerField()),
+                ('due_on', models.DateTimeField(db_index=True, help_text="The cell is recomputed once it hasn't been edited until this time.")),
+                ('created_on', models.DateTimeField(auto_now_add=True)),
+                ('field', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='database.field')),
+            ],
+            options={
+                'unique_together': {('field', 'row_id')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.13 on 2026-10-18 14:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('baserow_translate_plugin', '0008_dirtycell'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='translationfield',
+            name='engine',
+            field=models.CharField(blank=True, default='', help_text='Translation engine, empty for the default engine.', max_length=32),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.13 on 2026-10-18 16:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('baserow_translate_plugin', '0009_translationfield_engine'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='translationfield',
+            name='lazy',
+            field=models.BooleanField(default=False, help_text='Translate the cells when they are read instead of for the whole table.'),
+        ),
+    ]
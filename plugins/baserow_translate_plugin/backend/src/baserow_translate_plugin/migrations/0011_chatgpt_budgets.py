@@ -0,0 +1,41 @@
+# Generated by Django 3.2.13 on 2026-10-18 17:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('database', '0119_field_tsvector_column_created'),
+        ('baserow_translate_plugin', '0010_translationfield_lazy'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatgptfield',
+            name='token_budget',
+            field=models.PositiveIntegerField(default=0, help_text='Maximum number of tokens used by this field per month, 0 for no limit.'),
+        ),
+        migrations.AddField(
+            model_name='fieldrecomputejob',
+            name='estimated_tokens',
+            field=models.BigIntegerField(blank=True, help_text='Pre-flight estimate of the chatgpt tokens needed by the job.', null=True),
+        ),
+        migrations.AlterField(
+            model_name='fieldrecomputejob',
+            name='state',
+            field=models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('finished', 'Finished'), ('cancelled', 'Cancelled'), ('failed', 'Failed'), ('paused', 'Paused')], default='pending', max_length=32),
+        ),
+        migrations.CreateModel(
+            name='ChatGPTUsage',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('workspace_id', models.PositiveIntegerField(db_index=True, null=True)),
+                ('model', models.CharField(max_length=255)),
+                ('tokens', models.PositiveIntegerField()),
+                ('created_on', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('field', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='database.field')),
+            ],
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.2.13 on 2026-10-18 21:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('baserow_translate_plugin', '0011_chatgpt_budgets'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MetricTotal',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('family', models.CharField(max_length=255)),
+                ('kind', models.CharField(max_length=16)),
+                ('suffix', models.CharField(max_length=16)),
+                ('labels', models.TextField()),
+                ('le', models.CharField(blank=True, max_length=32)),
+                ('position', models.IntegerField(default=0)),
+                ('value', models.FloatField(default=0)),
+            ],
+            options={
+                'unique_together': {('family', 'suffix', 'labels', 'le')},
+            },
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 from baserow.contrib.database.fields.models import Field
 
@@ -23,6 +24,16 @@ class TranslationField(Field):
         default="",
         help_text="Target Language",
     )
+    engine = models.CharField(
+        max_length=32,
+        blank=True,
+        default="",
+        help_text="Translation engine, empty for the default engine.",
+    )
+    lazy = models.BooleanField(
+        default=False,
+        help_text="Translate the cells when they are read instead of for the whole table.",
+    )
 
 class ChatGPTField(Field):
     prompt = models.CharField(
@@ -31,4 +42,170 @@ class ChatGPTField(Field):
         default="",
         help_text="Prompt for chatgpt",
     )
+    token_budget = models.PositiveIntegerField(
+        default=0,
+        help_text="Maximum number of tokens used by this field per month, 0 for no limit.",
+    )
+
+
+class FieldRecomputeJob(models.Model):
+    """keeps track of a full-table recomputation of a translation / chatgpt field. these run
+    in a celery worker, so that creating or editing a field doesn't block the HTTP request"""
+
+    STATE_PENDING = 'pending'
+    STATE_RUNNING = 'running'
+    STATE_FINISHED = 'finished'
+    STATE_CANCELLED = 'cancelled'
+    STATE_FAILED = 'failed'
+    STATE_PAUSED = 'paused'
+    STATE_CHOICES = [
+        (STATE_PENDING, 'Pending'),
+        (STATE_RUNNING, 'Running'),
+        (STATE_FINISHED, 'Finished'),
+        (STATE_CANCELLED, 'Cancelled'),
+        (STATE_FAILED, 'Failed'),
+        (STATE_PAUSED, 'Paused'),
+    ]
+
+    field = models.ForeignKey(
+        Field,
+        on_delete=models.CASCADE,
+        help_text="The field whose values are being recomputed.",
+        related_name='+'
+    )
+    state = models.CharField(
+        max_length=32,
+        choices=STATE_CHOICES,
+        default=STATE_PENDING,
+    )
+    progress_percentage = models.IntegerField(
+        default=0,
+    )
+    last_row_id = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text="Checkpoint: id of the last row that was processed, the job resumes after it.",
+    )
+    shared_with = models.ForeignKey(
+        'self',
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        help_text="The job whose pass over the table also computes this field.",
+        related_name='+'
+    )
+    error = models.TextField(
+        blank=True,
+        default="",
+    )
+    estimated_tokens = models.BigIntegerField(
+        null=True,
+        blank=True,
+        help_text="Pre-flight estimate of the chatgpt tokens needed by the job.",
+    )
+    created_on = models.DateTimeField(auto_now_add=True)
+    updated_on = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ('-id',)
+
+
+class TranslationCacheEntry(models.Model):
+    """translation memory, see cache.py"""
+
+    key = models.CharField(
+        max_length=64,
+        unique=True,
+        help_text="sha256 of the engine version, language pair and normalized text.",
+    )
+    source_language = models.CharField(max_length=255)
+    target_language = models.CharField(max_length=255)
+    engine_version = models.CharField(max_length=255)
+    translated_text = models.TextField()
+    created_on = models.DateTimeField(auto_now_add=True)
+    last_used_on = models.DateTimeField(default=timezone.now, db_index=True)
+
+
+class ChatGPTCacheEntry(models.Model):
+    """chatgpt completions for a fully expanded prompt, see cache.py"""
+
+    key = models.CharField(
+        max_length=64,
+        unique=True,
+        help_text="sha256 of the model, parameters and expanded prompt.",
+    )
+    model = models.CharField(max_length=255)
+    completion = models.TextField()
+    created_on = models.DateTimeField(auto_now_add=True)
+    last_used_on = models.DateTimeField(default=timezone.now, db_index=True)
+
+
+class CellFingerprint(models.Model):
+    """hash of the inputs (source value / prompt field values plus field settings) a
+    translation / chatgpt cell was last computed from, see fingerprints.py"""
+
+    field = models.ForeignKey(
+        Field,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    row_id = models.PositiveIntegerField()
+    fingerprint = models.CharField(max_length=64)
+
+    class Meta:
+        unique_together = ('field', 'row_id')
+
+
+class DirtyCell(models.Model):
+    """a cell whose inputs were edited, waiting to be recomputed by a celery worker, see
+    dirty_queue.py"""
+
+    field = models.ForeignKey(
+        Field,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    row_id = models.PositiveIntegerField()
+    due_on = models.DateTimeField(
+        db_index=True,
+        help_text="The cell is recomputed once it hasn't been edited until this time.",
+    )
+    created_on = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('field', 'row_id')
+
+
+class ChatGPTUsage(models.Model):
+    """usage ledger: the tokens used by the chatgpt requests made for a field, see budgets.py"""
+
+    field = models.ForeignKey(
+        Field,
+        null=True,
+        on_delete=models.SET_NULL,
+        related_name='+'
+    )
+    # kept when the field is deleted, it still counts towards the workspace budget
+    workspace_id = models.PositiveIntegerField(null=True, db_index=True)
+    model = models.CharField(max_length=255)
+    tokens = models.PositiveIntegerField()
+    created_on = models.DateTimeField(auto_now_add=True, db_index=True)
+
+
+class MetricTotal(models.Model):
+    """a metrics sample summed over all the processes, see metrics_store.py"""
+
+    family = models.CharField(max_length=255)
+    # counter or histogram
+    kind = models.CharField(max_length=16)
+    # '', '_bucket', '_sum' or '_count'
+    suffix = models.CharField(max_length=16)
+    # json list of [name, value] pairs
+    labels = models.TextField()
+    le = models.CharField(max_length=32, blank=True)
+    # order of the histogram samples
+    position = models.IntegerField(default=0)
+    value = models.FloatField(default=0)
 
+    class Meta:
+        unique_together = ('family', 'suffix', 'labels', 'le')
@@ -0,0 +1,62 @@
+"""
+installing argos translate language packages. this involves network access (the package
+index and the packages themselves are downloaded), so it's never done when a process starts:
+use the install_translation_packages management command, or let the first translation of a
+language pair install what it needs (BASEROW_TRANSLATE_PLUGIN_AUTO_INSTALL_PACKAGES).
+packages need to be installed by the user id running baserow, as their data is stored in
+$HOME/.local/share/argos-translate/
+"""
+
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+
+def is_package_installed(from_code, to_code):
+    import argostranslate.package
+
+    return any(package.from_code == from_code and package.to_code == to_code
+               for package in argostranslate.package.get_installed_packages())
+
+
+def get_available_packages(index_path=None):
+    """the packages listed in a local index file (same format as the argos package index), or
+    in the remote argos index, which gets downloaded"""
+    import argostranslate.package
+
+    if index_path != None:
+        with open(index_path) as f:
+            return [argostranslate.package.AvailablePackage(metadata) for metadata in json.load(f)]
+    argostranslate.package.update_package_index()
+    return argostranslate.package.get_available_packages()
+
+
+def install_package(from_code, to_code, index_path=None, available_packages=None):
+    import argostranslate.package
+
+    if available_packages == None:
+        available_packages = get_available_packages(index_path)
+    package_to_install = next(
+        filter(lambda x: x.from_code == from_code and x.to_code == to_code, available_packages),
+        None
+    )
+    if package_to_install == None:
+        raise ValueError(f'no argos translate package available for {from_code} to {to_code}')
+    logger.info(f'installing argos translate package {from_code} to {to_code}')
+    argostranslate.package.install_from_path(package_to_install.download())
+
+
+def install_packages_from_dir(directory):
+    """install all the .argosmodel files found in the directory, returns their paths"""
+    import argostranslate.package
+
+    installed = []
+    for file_name in sorted(os.listdir(directory)):
+        if file_name.endswith('.argosmodel'):
+            path = os.path.join(directory, file_name)
+            logger.info(f'installing argos translate package {path}')
+            argostranslate.package.install_from_path(path)
+            installed.append(path)
+    return installed
@@ -0,0 +1,81 @@
+"""
+full-table translations can use several cores: the texts which need translating are split
+into shards, and each shard is translated by a worker process of a pool. every worker keeps
+its own translators loaded (see translators.py), and the pool is kept around between chunks
+and jobs. database access stays in the calling process, the workers only translate.
+"""
+
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+def init_worker():
+    # spawned workers start from scratch, the translators need the django settings
+    import django
+
+    django.setup()
+
+
+def translate_shard(texts, source_language, target_language):
+    """runs in a worker process"""
+    from .translators import translate_batch
+
+    return translate_batch(texts, source_language, target_language)
+
+
+def create_pool(processes, initializer=init_worker):
+    # spawn rather than fork: the parent may hold locks or database connections in other
+    # threads, which a forked child would inherit in an unusable state
+    return ProcessPoolExecutor(max_workers=processes,
+                               mp_context=multiprocessing.get_context('spawn'),
+                               initializer=initializer)
+
+
+def split_into_shards(items, shard_count):
+    """split into at most shard_count contiguous shards of (almost) equal size, keeping the
+    order"""
+    shard_count = max(1, min(shard_count, len(items)))
+    shard_size, remainder = divmod(len(items), shard_count)
+    shards = []
+    start = 0
+    for i in range(shard_count):
+        end = start + shard_size + (1 if i < remainder else 0)
+        shards.append(items[start:end])
+        start = end
+    return shards
+
+
+def translate_in_processes(texts, source_language, target_language, pool, processes,
+                           shard_function=translate_shard):
+    """translate the texts with the worker processes of the pool, returns the translations
+    in the same order"""
+    shards = split_into_shards(texts, processes)
+    results = pool.map(shard_function, shards, [source_language] * len(shards),
+                       [target_language] * len(shards))
+    return [translation for shard_result in results for translation in shard_result]
+
+
+_pool = None
+_pool_processes = None
+_pool_lock = threading.Lock()
+
+
+def get_pool(processes):
+    global _pool, _pool_processes
+    with _pool_lock:
+        if _pool == None or _pool_processes != processes:
+            if _pool != None:
+                _pool.shutdown(wait=False)
+            logger.info(f'starting translation process pool with {processes} processes')
+            _pool = create_pool(processes)
+            _pool_processes = processes
+        return _pool
+
+
+def translate_batch(texts, source_language, target_language, processes):
+    return translate_in_processes(texts, source_language, target_language, get_pool(processes),
+                                  processes)
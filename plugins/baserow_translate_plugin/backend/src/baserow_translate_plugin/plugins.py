@@ -5,3 +5,13 @@ from django.urls import path, include
 
 class BaserowTranslatePlugin(Plugin):
     type = "baserow_translate_plugin"
+
+    def get_api_urls(self):
+        from .api import urls as api_urls
+
+        return [
+            path(
+                "baserow_translate_plugin/",
+                include(api_urls, namespace=self.type),
+            ),
+        ]
@@ -0,0 +1,61 @@
+"""
+chatgpt prompts reference fields by name, e.g. 'Translate text into French: {English}'.
+instead of searching the prompt for field names and replacing them for every row, the prompt
+is parsed once into literal parts and field references, the field names are resolved to
+their db columns, and each row is rendered in a single pass.
+"""
+
+import hashlib
+import re
+
+from .cache import LRUCache
+
+FIELD_VARIABLE_RE = re.compile(r'{(.*?)}')
+
+
+def get_fields_in_prompt(prompt):
+    return FIELD_VARIABLE_RE.findall(prompt)
+
+
+class CompiledPromptTemplate:
+    def __init__(self, prompt, lookup_db_column):
+        """lookup_db_column returns the db column of the field with the given name"""
+        # with a capturing group, re.split alternates literal text and field names
+        parts = FIELD_VARIABLE_RE.split(prompt)
+        self.prompt = prompt
+        self.literals = parts[0::2]
+        self.field_names = parts[1::2]
+        self.db_columns = [lookup_db_column(field_name) for field_name in self.field_names]
+        # the columns needed to render a row, without duplicates
+        self.source_db_columns = list(dict.fromkeys(self.db_columns))
+
+    def render(self, row):
+        pieces = [self.literals[0]]
+        for db_column, literal in zip(self.db_columns, self.literals[1:]):
+            value = getattr(row, db_column)
+            if value != None:
+                pieces.append(str(value))
+            pieces.append(literal)
+        return ''.join(pieces)
+
+
+# (field id, prompt hash) -> CompiledPromptTemplate
+_compiled_templates = LRUCache(1024)
+
+
+def get_compiled_template(field_id, prompt, lookup_db_column):
+    """returns the compiled template for this version of the field's prompt"""
+    key = (field_id, hashlib.sha256(prompt.encode('utf-8')).hexdigest())
+    template = _compiled_templates.get(key)
+    if template == None:
+        template = CompiledPromptTemplate(prompt, lookup_db_column)
+        _compiled_templates.set(key, template)
+    return template
+
+
+def invalidate_compiled_templates(field_id):
+    """a field referenced by the prompt changed (e.g. was renamed), the field names need to be
+    resolved again"""
+    with _compiled_templates.lock:
+        for key in [key for key in _compiled_templates.entries.keys() if key[0] == field_id]:
+            del _compiled_templates.entries[key]
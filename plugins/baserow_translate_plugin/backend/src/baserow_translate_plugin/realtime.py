@@ -0,0 +1,65 @@
+"""
+while a full-table recomputation runs, the rows which were just written are sent to the
+clients viewing the table as rows_updated events, so that they see the values appear chunk
+by chunk, instead of every client refetching the whole table at the very end. events are
+coalesced so that we send at most one every BASEROW_TRANSLATE_PLUGIN_REALTIME_UPDATE_INTERVAL
+seconds.
+"""
+
+import time
+
+from django.conf import settings
+
+from baserow.contrib.database.api.rows.serializers import (
+    RowSerializer,
+    get_row_serializer_class,
+)
+from baserow.ws.registries import page_registry
+
+
+class RowsUpdatedBroadcaster:
+    def __init__(self, table, table_model, target_field_ids, interval=None):
+        """target_field_ids are the db columns of the recomputed fields"""
+        if interval == None:
+            interval = settings.BASEROW_TRANSLATE_PLUGIN_REALTIME_UPDATE_INTERVAL
+        self.table = table
+        self.target_field_ids = target_field_ids
+        self.interval = interval
+        field_ids = [field_object['field'].id for field_object in table_model._field_objects.values()
+                     if field_object['field'].db_column in target_field_ids]
+        # only the id, order and recomputed values of each row are sent
+        self.serializer_class = get_row_serializer_class(table_model, RowSerializer,
+                                                         is_response=True, field_ids=field_ids)
+        self.rows_before_update = []
+        self.rows = []
+        self.last_sent = time.monotonic()
+
+    def add(self, rows, values_before_update):
+        """rows were written, values_before_update is a dict of row id -> dict of db column ->
+        previous value"""
+        serialized_rows = self.serializer_class(rows, many=True).data
+        for serialized_row in serialized_rows:
+            serialized_row_before_update = dict(serialized_row)
+            serialized_row_before_update.update(values_before_update.get(serialized_row['id'], {}))
+            self.rows_before_update.append(serialized_row_before_update)
+            self.rows.append(serialized_row)
+        if time.monotonic() - self.last_sent >= self.interval:
+            self.flush()
+
+    def flush(self):
+        if len(self.rows) == 0:
+            return
+        page_registry.get('table').broadcast(
+            {
+                'type': 'rows_updated',
+                'table_id': self.table.id,
+                'rows_before_update': self.rows_before_update,
+                'rows': self.rows,
+                'metadata': {},
+            },
+            None,
+            table_id=self.table.id,
+        )
+        self.rows_before_update = []
+        self.rows = []
+        self.last_sent = time.monotonic()
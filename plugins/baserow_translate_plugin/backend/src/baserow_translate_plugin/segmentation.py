@@ -0,0 +1,67 @@
+"""
+long texts (multi-paragraph descriptions) are split into segments (lines and sentences)
+before being translated: the models are much faster, and don't truncate, when given a
+sentence at a time, and sentences shared between cells only need to be translated once.
+the whitespace between segments is kept as it is, so that line breaks survive translation.
+"""
+
+import re
+
+from django.conf import settings
+
+# a separator is either any whitespace containing a line break, or the whitespace after a
+# sentence ending punctuation. this is very rough (e.g. "Mr. Smith" gets split) but good
+# enough for translation
+SEPARATOR_RE = re.compile(r'(\s*\n\s*|(?<=[.!?])\s+)')
+
+
+def split_text(text, max_segment_length=None):
+    """returns (prefix, parts, suffix). prefix and suffix are the leading / trailing
+    whitespace, parts alternates segments to translate and the separators between them"""
+    if max_segment_length == None:
+        max_segment_length = settings.BASEROW_TRANSLATE_PLUGIN_MAX_SEGMENT_LENGTH
+    stripped = text.strip()
+    prefix = text[:len(text) - len(text.lstrip())]
+    suffix = text[len(text.rstrip()):] if len(stripped) > 0 else ''
+
+    parts = []
+    for i, part in enumerate(SEPARATOR_RE.split(stripped)):
+        if i % 2 == 1:
+            parts.append(part)
+        else:
+            parts.extend(split_long_segment(part, max_segment_length))
+    return prefix, parts, suffix
+
+
+def split_long_segment(segment, max_length):
+    """a sentence which is still too long gets split on spaces, returns segments and
+    separators alternating"""
+    parts = []
+    while len(segment) > max_length:
+        cut = segment.rfind(' ', 0, max_length)
+        if cut <= 0:
+            # no space to split on
+            parts.extend([segment[:max_length], ''])
+            segment = segment[max_length:]
+        else:
+            parts.extend([segment[:cut], ' '])
+            segment = segment[cut + 1:]
+    parts.append(segment)
+    return parts
+
+
+def get_segments(parts):
+    return parts[0::2]
+
+
+def join_text(prefix, parts, suffix, translated_segments):
+    """put the text back together, translated_segments is a dict of segment -> translation,
+    segments missing from it are kept as they are"""
+    pieces = [prefix]
+    for i, part in enumerate(parts):
+        if i % 2 == 1:
+            pieces.append(part)
+        else:
+            pieces.append(translated_segments.get(part, part))
+    pieces.append(suffix)
+    return ''.join(pieces)
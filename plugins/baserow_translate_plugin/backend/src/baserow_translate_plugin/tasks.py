@@ -0,0 +1,42 @@
+from datetime import timedelta
+
+from baserow.config.celery import app
+
+
+# acks_late: if the worker dies in the middle of a large table, the task is delivered again
+# and resumes from the job's checkpoint.
+@app.task(bind=True, queue="export", acks_late=True)
+def run_recompute_job_task(self, job_id):
+    from .jobs import run_recompute_job
+
+    run_recompute_job(job_id)
+
+
+@app.task(bind=True)
+def evict_caches_task(self):
+    from .cache import get_translation_cache, get_chatgpt_cache
+
+    get_translation_cache().evict()
+    get_chatgpt_cache().evict()
+
+
+@app.task(bind=True)
+def process_dirty_cells_task(self):
+    from .dirty_queue import process_due_cells
+
+    process_due_cells()
+
+
+# noinspection PyUnusedLocal
+@app.on_after_finalize.connect
+def setup_periodic_tasks(sender, **kwargs):
+    sender.add_periodic_task(
+        timedelta(hours=1),
+        evict_caches_task.s(),
+    )
+    # each queued cell schedules its own processing, this catches the ones whose task was
+    # lost (e.g. worker restart)
+    sender.add_periodic_task(
+        timedelta(minutes=1),
+        process_dirty_cells_task.s(),
+    )
@@ -0,0 +1,32 @@
+"""
+tracing spans around the expensive operations (recomputing rows after a dependency update,
+full-table recomputations). when opentelemetry is installed (and configured, e.g. by
+opentelemetry-instrument), the spans are exported with it. in any case their durations are
+recorded in the span_seconds histogram of metrics.py.
+"""
+
+from contextlib import contextmanager
+
+from . import metrics
+
+try:
+    from opentelemetry import trace
+
+    tracer = trace.get_tracer('baserow_translate_plugin')
+except ImportError:
+    tracer = None
+
+
+@contextmanager
+def span(name, labels=None, **attributes):
+    """labels are added to the metrics and to the span, attributes (e.g. ids) to the span only,
+    so that the metrics don't get one series per field / row"""
+    labels = labels or {}
+    with metrics.timer('span', span=name, **labels):
+        if tracer == None:
+            yield None
+        else:
+            with tracer.start_as_current_span(f'baserow_translate_plugin.{name}') as current_span:
+                for key, value in {**labels, **attributes}.items():
+                    current_span.set_attribute(key, value)
+                yield current_span
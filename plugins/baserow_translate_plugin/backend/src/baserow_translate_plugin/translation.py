@@ -1,80 +1,529 @@
-""" 
-this file contains translation logic, interfacing with actual libraries or REST APIs 
+"""
+this file contains translation logic, interfacing with actual libraries or REST APIs
 responsible for translation
 """
 
+import functools
 import logging
 
+from django.conf import settings
+from django.db import transaction
+
 from baserow.contrib.database.table.models import Table
-from baserow.contrib.database.table.signals import table_updated
 
-import argostranslate.translate
 import openai
 
+from . import engines
+from . import segmentation
+from . import metrics
+from . import chatgpt_batching
+from .budgets import TokenUsage, check_budget, count_tokens, estimate_prompt_tokens, record_usage
+from .cache import get_translation_cache, get_chatgpt_cache
+from .chatgpt_scheduler import get_scheduler as get_chatgpt_scheduler
+from .fingerprints import compute_fingerprint, get_changed_fingerprints, store_fingerprints
+from .prompt_templates import CompiledPromptTemplate, get_compiled_template
+from .realtime import RowsUpdatedBroadcaster
+
 logger = logging.getLogger(__name__)
 
 TEST_MODE = False
 
-def translate(text, source_language, target_language):
+# language pairs without a direct model are translated through this language
+PIVOT_LANGUAGE = 'en'
+
+CHATGPT_MODEL = "gpt-3.5-turbo"
+# extra parameters for ChatCompletion.create, they're part of the completions cache key
+CHATGPT_PARAMETERS = {}
+
+def translate(text, source_language, target_language, engine=None):
+    return translate_many([text], source_language, target_language, engine=engine)[0]
+
+
+def translate_many(texts, source_language, target_language, parallel=False, engine=None):
+    """translate a list of texts, returns the translations in the same order. parallel: use
+    the translation process pool, for large batches. engine: type of the translation engine,
+    None for the default one (see engines.py)"""
+    return translate_many_targets(texts, source_language, [target_language], parallel,
+                                  engine)[target_language]
+
+
+def translate_many_targets(texts, source_language, target_languages, parallel=False,
+                           engine=None):
+    """translate a list of texts into several languages, returns a dict of target language ->
+    translations in the same order. the texts are split into segments (lines and sentences, see
+    segmentation.py) once for all the targets, and each distinct segment is only translated
+    once per target (tables tend to repeat the same category names / labels, and long texts the
+    same sentences), looking it up in the translation memory first. targets without a direct
+    model share one translation of the segments into the pivot language. None and blank texts
+    are returned as they are, without involving the engine"""
+    distinct_texts = list(dict.fromkeys(text for text in texts if needs_translation(text)))
+    if len(distinct_texts) == 0:
+        return {target_language: list(texts) for target_language in target_languages}
+
+    split_texts = {text: segmentation.split_text(text) for text in distinct_texts}
+    distinct_segments = list(dict.fromkeys(
+        segment
+        for prefix, parts, suffix in split_texts.values()
+        for segment in segmentation.get_segments(parts)
+        if needs_translation(segment)))
+
+    translation_cache = get_translation_cache()
+    # segment -> translation into the pivot language, shared by the targets which need it
+    pivot_translations = {}
+    result = {}
+    for target_language in target_languages:
+        engine_version = get_engine_version(source_language, target_language, engine)
+        segment_translations = translation_cache.get_many(distinct_segments, source_language,
+                                                          target_language, engine_version)
+        missing_segments = [segment for segment in distinct_segments
+                            if segment not in segment_translations]
+        new_translations = {}
+        if len(missing_segments) > 0:
+            if target_language == PIVOT_LANGUAGE:
+                # the other targets may already have translated these into the pivot language.
+                # the translation memory was just looked up, and is written below
+                translated_segments = translate_into_pivot(missing_segments, source_language,
+                                                           pivot_translations, parallel, engine,
+                                                           use_cache=False)
+            elif needs_pivot(source_language, target_language, engine):
+                translated_segments = translate_through_pivot(missing_segments, source_language,
+                                                              target_language, pivot_translations,
+                                                              parallel, engine)
+            else:
+                translated_segments = translate_batch_uncached(missing_segments, source_language,
+                                                               target_language, parallel, engine)
+            new_translations = dict(zip(missing_segments, translated_segments))
+        translation_cache.set_many(new_translations, source_language, target_language,
+                                   engine_version)
+        segment_translations.update(new_translations)
+
+        translations = {text: segmentation.join_text(prefix, parts, suffix, segment_translations)
+                        for text, (prefix, parts, suffix) in split_texts.items()}
+        result[target_language] = [translations.get(text, text) for text in texts]
+    return result
+
+
+def needs_pivot(source_language, target_language, engine=None):
+    """whether the language pair has to be translated through the pivot language"""
+    if PIVOT_LANGUAGE in (source_language, target_language):
+        return False
+    return not has_direct_model(source_language, target_language, engine)
+
+
+def has_direct_model(source_language, target_language, engine=None):
+    return get_translation_engine(engine).has_direct_model(source_language, target_language)
+
+
+def translate_into_pivot(segments, source_language, pivot_translations, parallel=False,
+                         engine=None, use_cache=True):
+    """returns the translations into the pivot language. they're looked up in
+    pivot_translations (segment -> translation into the pivot language, shared by the targets
+    of one call) and in the translation memory, so that translating the same source into
+    several languages, even through separate fields or calls, only goes through the
+    source -> pivot model once per segment"""
+    missing_segments = [segment for segment in segments if segment not in pivot_translations]
+    reused_count = len(segments) - len(missing_segments)
+    if len(missing_segments) > 0 and use_cache:
+        translation_cache = get_translation_cache()
+        engine_version = get_engine_version(source_language, PIVOT_LANGUAGE, engine)
+        cached_translations = translation_cache.get_many(missing_segments, source_language,
+                                                         PIVOT_LANGUAGE, engine_version)
+        pivot_translations.update(cached_translations)
+        reused_count += len(cached_translations)
+        missing_segments = [segment for segment in missing_segments
+                            if segment not in pivot_translations]
+    if len(missing_segments) > 0:
+        new_translations = dict(zip(missing_segments, translate_batch_uncached(
+            missing_segments, source_language, PIVOT_LANGUAGE, parallel, engine)))
+        if use_cache:
+            translation_cache.set_many(new_translations, source_language, PIVOT_LANGUAGE,
+                                       engine_version)
+        pivot_translations.update(new_translations)
+
+    # each reused segment is a sentence the source -> pivot model didn't have to translate
+    labels = {'source_language': source_language, 'pivot_language': PIVOT_LANGUAGE}
+    metrics.increment('translation_pivot_segments_reused', reused_count, **labels)
+    metrics.increment('translation_pivot_segments_translated', len(missing_segments), **labels)
+    return [pivot_translations[segment] for segment in segments]
+
+
+def translate_through_pivot(segments, source_language, target_language, pivot_translations,
+                            parallel=False, engine=None):
+    """translate source -> pivot -> target. pivot_translations (segment -> translation into the
+    pivot language) is filled in, and reused when translating into other targets"""
+    translate_into_pivot(segments, source_language, pivot_translations, parallel, engine)
+    pivot_texts = list(dict.fromkeys(pivot_translations[segment] for segment in segments))
+    translated_pivot_texts = dict(zip(pivot_texts, translate_batch_uncached(
+        pivot_texts, PIVOT_LANGUAGE, target_language, parallel, engine)))
+    return [translated_pivot_texts[pivot_translations[segment]] for segment in segments]
+
+
+def needs_translation(text):
+    return text != None and len(text.strip()) > 0
+
+
+def translate_batch_uncached(texts, source_language, target_language, parallel=False,
+                             engine=None):
+    translation_engine = get_translation_engine(engine)
+    logger.debug(f'translating {len(texts)} texts from {source_language} to {target_language} '
+                 f'with {translation_engine.type}')
+    labels = {'engine': translation_engine.type, 'field_type': metrics.get_field_type(),
+              'source_language': source_language, 'target_language': target_language}
+    metrics.increment('translation_engine_calls', **labels)
+    metrics.increment('translation_engine_characters', sum(len(text) for text in texts), **labels)
+    metrics.observe('translation_engine_batch_size', len(texts), metrics.SIZE_BUCKETS, **labels)
+    with metrics.timer('translation_engine', **labels):
+        return engines.translate_in_batches(translation_engine, texts, source_language,
+                                            target_language, parallel)
+
+
+def get_translation_engine(engine=None):
     if TEST_MODE:
-        return f'translation ({source_language} to {target_language}): {text}'
-    else:
-        # call argos translate
-        logger.info(f'translating [{text}] from {source_language} to {target_language}')
-        return argostranslate.translate.translate(text, source_language, target_language)
+        return engines.translation_engine_registry.get('fake')
+    return engines.get_engine(engine)
+
+
+def get_engine_version(source_language, target_language, engine=None):
+    """identifies the engine and models used to translate this language pair, so that
+    switching engines or upgrading models doesn't return stale translations from the cache"""
+    return get_translation_engine(engine).get_version(source_language, target_language)
 
 
-def translate_all_rows(table_id, source_field_id, target_field_id, source_language, target_language):
+def translate_all_rows(table_id, source_field_id, target_field_id, source_language, target_language,
+                       start_after_row_id=None, progress=None, chunk_size=None, field_id=None,
+                       engine=None):
+    """returns False if the progress callback asked us to stop (job cancelled). when field_id
+    is given, cells whose source value didn't change since they were last computed are
+    skipped"""
+    return translate_all_rows_multi(table_id, source_field_id, source_language,
+                                    [(target_field_id, target_language, field_id)],
+                                    start_after_row_id, progress, chunk_size, engine)
+
+
+def translate_all_rows_multi(table_id, source_field_id, source_language, targets,
+                             start_after_row_id=None, progress=None, chunk_size=None,
+                             engine=None):
+    """translate the source field into several target fields in a single pass over the table:
+    the rows are read once, the source texts are deduplicated once, and each chunk is written
+    with one bulk UPDATE. targets is a list of (target_field_id, target_language, field_id),
+    field_id can be None, in which case that target doesn't skip unchanged cells"""
     base_queryset = Table.objects
     # Didn't see like we needed to select the workspace for every row that we get?
     table = base_queryset.get(id=table_id)
     # https://docs.djangoproject.com/en/4.0/ref/models/querysets/
     table_model = table.get_model()
-    for row in table_model.objects.all():
-        text = getattr(row, source_field_id)
-        translated_text = translate(text, source_language, target_language)
-        setattr(row, target_field_id, translated_text)
-        row.save()
-    # notify the front-end that rows have been updated
-    table_updated.send(None, table=table, user=None, force_table_refresh=True)
+
+    step = get_translation_step(source_field_id, source_language, targets, engine)
+    return update_all_rows_in_chunks(table, table_model, [step], start_after_row_id, progress,
+                                     chunk_size)
+
+
+def get_translation_step(source_field_id, source_language, targets, engine=None):
+    """the RecomputeStep translating the source field into the targets, see
+    translate_all_rows_multi"""
+    target_languages = {target_field_id: target_language
+                        for target_field_id, target_language, field_id in targets}
+
+    def translate_chunk(rows_by_target):
+        # the source texts of all the targets, each target only needs some of the rows
+        rows = list({row.id: row for target_rows in rows_by_target.values()
+                     for row in target_rows}.values())
+        texts = [getattr(row, source_field_id) for row in rows]
+        chunk_target_languages = list(dict.fromkeys(
+            target_languages[target_field_id]
+            for target_field_id, target_rows in rows_by_target.items() if len(target_rows) > 0))
+        translated_texts = translate_many_targets(texts, source_language, chunk_target_languages,
+                                                  parallel=True, engine=engine)
+        for target_field_id, target_rows in rows_by_target.items():
+            translations = dict(zip(texts, translated_texts.get(target_languages[target_field_id], [])))
+            for row in target_rows:
+                text = getattr(row, source_field_id)
+                setattr(row, target_field_id, translations.get(text, text))
+
+    recompute_targets = []
+    for target_field_id, target_language, field_id in targets:
+        fingerprint_row = None
+        if field_id != None:
+            fingerprint_row = make_translation_fingerprint_row(source_field_id, source_language,
+                                                               target_language, engine)
+        recompute_targets.append(RecomputeTarget(target_field_id, field_id, fingerprint_row))
+
+    return RecomputeStep([source_field_id], recompute_targets, translate_chunk)
+
+
+def make_translation_fingerprint_row(source_field_id, source_language, target_language,
+                                     engine=None):
+    settings_fingerprint = get_translation_settings_fingerprint(source_language, target_language,
+                                                                engine)
+    return lambda row: compute_fingerprint(settings_fingerprint, getattr(row, source_field_id))
+
+
+def get_translation_settings_fingerprint(source_language, target_language, engine=None):
+    return compute_fingerprint(source_language, target_language,
+                               get_engine_version(source_language, target_language, engine))
+
+
+def iterate_row_chunks(table_model, column_names, start_after_row_id=None, chunk_size=None):
+    """stream the rows of the table by primary key range, chunk_size rows at a time, only
+    loading the columns we need. this keeps memory flat no matter how large the table is"""
+    if chunk_size == None:
+        chunk_size = settings.BASEROW_TRANSLATE_PLUGIN_CHUNK_SIZE
+    # order is needed to send the rows to the front-end
+    queryset = table_model.objects.order_by('id').only('id', 'order', *column_names)
+    last_row_id = start_after_row_id
+    while True:
+        chunk_queryset = queryset
+        if last_row_id != None:
+            chunk_queryset = queryset.filter(id__gt=last_row_id)
+        rows = list(chunk_queryset[:chunk_size])
+        if len(rows) == 0:
+            return
+        yield rows
+        last_row_id = rows[-1].id
+
+
+class RecomputeTarget:
+    """a field recomputed by update_all_rows_in_chunks. target_field_id is its db column. when
+    field_id and fingerprint_row are given, only the rows whose fingerprint changed are
+    computed"""
+
+    def __init__(self, target_field_id, field_id=None, fingerprint_row=None):
+        self.target_field_id = target_field_id
+        self.field_id = field_id
+        self.fingerprint_row = fingerprint_row
+
+
+class RecomputeStep:
+    """computes one or more targets from the source columns. compute_chunk receives a dict of
+    target_field_id -> rows to compute, and sets the target values on the rows"""
+
+    def __init__(self, source_column_names, targets, compute_chunk):
+        self.source_column_names = source_column_names
+        self.targets = targets
+        self.compute_chunk = compute_chunk
+        # label of the engine / chatgpt metrics, set by chains.update_all_rows
+        self.field_type = ''
+
+
+def update_all_rows_in_chunks(table, table_model, steps, start_after_row_id=None, progress=None,
+                              chunk_size=None):
+    """the full-table pipeline: read a chunk of rows, let each step set its target values on
+    them, then write the whole chunk back with one bulk UPDATE. steps is a list of RecomputeStep
+    in dependency order: a step can use the columns computed by the steps before it, it sees
+    their new values since the rows are shared (see chains.py). the chunk and its checkpoint
+    are committed together, so a resumed job never skips or redoes rows. the rows which were
+    written are sent to the front-end as we go.
+    returns False if the progress callback asked us to stop (job cancelled)"""
+    queryset = table_model.objects.all()
+    rows_total = queryset.count()
+    rows_done = 0
+    if start_after_row_id != None:
+        rows_done = queryset.filter(id__lte=start_after_row_id).count()
+
+    target_field_ids = [target.target_field_id for step in steps for target in step.targets]
+    broadcaster = RowsUpdatedBroadcaster(table, table_model, target_field_ids)
+    completed = True
+    source_column_names = [column for step in steps for column in step.source_column_names]
+    column_names = list(dict.fromkeys(source_column_names + target_field_ids))
+    try:
+        for chunk in iterate_row_chunks(table_model, column_names, start_after_row_id, chunk_size):
+            # the values before any step changes them
+            values_before_update = {row.id: {column: getattr(row, column)
+                                             for column in target_field_ids}
+                                    for row in chunk}
+            updated_row_ids = set()
+            updated_columns = []
+            # field_id -> changed fingerprints, stored once the chunk is written
+            changed_fingerprints = {}
+            for step in steps:
+                rows_by_target = {}
+                for target in step.targets:
+                    target_rows = chunk
+                    if target.fingerprint_row != None:
+                        # computed after the previous steps, with the new values of their
+                        # columns
+                        changed_fingerprints[target.field_id] = get_changed_fingerprints(
+                            target.field_id,
+                            {row.id: target.fingerprint_row(row) for row in chunk})
+                        target_rows = [row for row in chunk
+                                       if row.id in changed_fingerprints[target.field_id]]
+                    rows_by_target[target.target_field_id] = target_rows
+                    if len(target_rows) > 0:
+                        updated_columns.append(target.target_field_id)
+                        updated_row_ids.update(row.id for row in target_rows)
+                if any(len(target_rows) > 0 for target_rows in rows_by_target.values()):
+                    with metrics.field_type(step.field_type):
+                        step.compute_chunk(rows_by_target)
+
+            rows = [row for row in chunk if row.id in updated_row_ids]
+            values_before_update = {row.id: {column: values_before_update[row.id][column]
+                                             for column in updated_columns}
+                                    for row in rows}
+            with transaction.atomic():
+                if len(rows) > 0:
+                    # unlike row.save(), this doesn't write every column of the row, and
+                    # doesn't send any row signals
+                    table_model.objects.bulk_update(rows, fields=updated_columns)
+                    for field_id, fingerprints in changed_fingerprints.items():
+                        store_fingerprints(field_id, fingerprints)
+                rows_done += len(chunk)
+                if progress != None and not progress(chunk[-1].id, rows_done, rows_total):
+                    completed = False
+            if len(rows) > 0:
+                # notify the front-end that these rows have been updated
+                broadcaster.add(rows, values_before_update)
+            if not completed:
+                break
+    finally:
+        # the chunks already written are sent even if a later one fails
+        broadcaster.flush()
+    return completed
+
 
 def chatgpt(prompt):
+    return chatgpt_many([prompt])[0]
+
+
+def chatgpt_many(prompts, field=None):
+    """query chatgpt for a list of prompts, returns the results in the same order. identical
+    prompts are only sent once, and prompts which were already answered come from the cache.
+    when the chatgpt field is given, its budgets are checked first (raises
+    budgets.BudgetExceeded) and the tokens used are recorded, see budgets.py"""
+    distinct_prompts = list(dict.fromkeys(prompts))
+    model = get_chatgpt_model()
+    chatgpt_cache = get_chatgpt_cache()
+    completions = chatgpt_cache.get_many(distinct_prompts, model, CHATGPT_PARAMETERS)
+    missing_prompts = [prompt for prompt in distinct_prompts if prompt not in completions]
+    if len(missing_prompts) > 0:
+        usage = TokenUsage()
+        if field != None:
+            check_budget(field, estimate_prompt_tokens(missing_prompts))
+        try:
+            new_completions = dict(zip(missing_prompts,
+                                       chatgpt_batch_uncached(missing_prompts, usage)))
+        finally:
+            # also when some of the requests failed, the others were paid for
+            if field != None:
+                record_usage(field, model, usage.tokens)
+        chatgpt_cache.set_many(new_completions, model, CHATGPT_PARAMETERS)
+        completions.update(new_completions)
+    return [completions[prompt] for prompt in prompts]
+
+
+def get_chatgpt_model():
     if TEST_MODE or openai.api_key == None:
-        return f'chatgpt: {prompt}'
+        return 'test'
+    return CHATGPT_MODEL
+
+
+def chatgpt_batch_uncached(prompts, usage=None):
+    """sends the prompts concurrently, see chatgpt_scheduler.py. the tokens used are added to
+    usage (budgets.TokenUsage)"""
+    if TEST_MODE or openai.api_key == None:
+        results = [f'chatgpt: {prompt}' for prompt in prompts]
+        if usage != None:
+            for prompt, result in zip(prompts, results):
+                usage.add(count_tokens(prompt) + count_tokens(result))
+        return results
+    # the requests are sent by the scheduler's threads, which don't see the caller's field type
+    call_api = functools.partial(call_chatgpt_api, field_type=metrics.get_field_type())
+    if settings.BASEROW_TRANSLATE_PLUGIN_CHATGPT_BATCH_TOKENS > 0 and len(prompts) > 1:
+        # several prompts per request, see chatgpt_batching.py
+        return chatgpt_batching.run_batched(prompts, get_chatgpt_scheduler(), call_api,
+                                            usage=usage)
     else:
-        # call OpenAI chatgpt
-        logger.info(f'calling chatgpt with prompt [{prompt}]')
-        chat_completion = openai.ChatCompletion.create(model="gpt-3.5-turbo", messages=[{"role": "user", "content": prompt}])
-        return chat_completion['choices'][0]['message']['content']
+        return get_chatgpt_scheduler().run(prompts, call_api, usage)
+
+
+def call_chatgpt_api(prompt, field_type=''):
+    # call OpenAI chatgpt
+    logger.debug(f'calling chatgpt with prompt [{prompt}]')
+    labels = {'model': CHATGPT_MODEL, 'field_type': field_type}
+    metrics.increment('chatgpt_api_calls', **labels)
+    metrics.increment('chatgpt_api_characters', len(prompt), **labels)
+    with metrics.timer('chatgpt_api', **labels):
+        chat_completion = openai.ChatCompletion.create(model=CHATGPT_MODEL, messages=[{"role": "user", "content": prompt}], **CHATGPT_PARAMETERS)
+    total_tokens = chat_completion.get('usage', {}).get('total_tokens')
+    if total_tokens != None:
+        metrics.increment('chatgpt_api_tokens', total_tokens, **labels)
+    return chat_completion['choices'][0]['message']['content'], total_tokens
 
 
-def chatgpt_all_rows(table_id, target_field_id, prompt, prompt_field_names):
+def chatgpt_all_rows(table_id, target_field_id, prompt, start_after_row_id=None, progress=None,
+                     chunk_size=None, field_id=None):
+    """returns False if the progress callback asked us to stop (job cancelled). when field_id
+    is given, cells whose prompt field values didn't change since they were last computed are
+    skipped"""
     base_queryset = Table.objects
     table = base_queryset.get(id=table_id)
     table_model = table.get_model()
 
-    # we'll build this map on the first row
-    field_name_to_field_id_map = {}
+    step = get_chatgpt_step(table_model, target_field_id, prompt, field_id)
+    return update_all_rows_in_chunks(table, table_model, [step], start_after_row_id, progress,
+                                     chunk_size)
+
 
-    for row in table_model.objects.all():
-        # do we need to build the map ?
-        if len(field_name_to_field_id_map) == 0:
-            for field in row.get_fields():
-                field_name_to_field_id_map[field.name] = field.db_column
+def get_chatgpt_step(table_model, target_field_id, prompt, field_id=None, field=None):
+    """the RecomputeStep querying chatgpt for the target field, see chatgpt_all_rows. when the
+    chatgpt field is given, its token budgets apply"""
+    prompt_template = get_chatgpt_prompt_template(table_model, prompt, field_id)
 
+    def chatgpt_chunk(rows_by_target):
+        rows = rows_by_target[target_field_id]
         # full expand the prompt
-        expanded_prompt = prompt
-        for field_name in prompt_field_names:
-            internal_field_name = field_name_to_field_id_map[field_name]
-            field_value = getattr(row, internal_field_name)
-            if field_value == None:
-                field_value = ''
-            expanded_prompt = expanded_prompt.replace('{' + field_name + '}', field_value)
-
-        # call chatgpt api, and save row.
-        chatgpt_result = chatgpt(expanded_prompt)
-        setattr(row, target_field_id, chatgpt_result)
-        row.save()
-
-    # notify the front-end that rows have been updated
-    table_updated.send(None, table=table, user=None, force_table_refresh=True)    
\ No newline at end of file
+        expanded_prompts = [prompt_template.render(row) for row in rows]
+
+        # call chatgpt api
+        chatgpt_results = chatgpt_many(expanded_prompts, field)
+        for row, chatgpt_result in zip(rows, chatgpt_results):
+            setattr(row, target_field_id, chatgpt_result)
+
+    fingerprint_row = None
+    if field_id != None:
+        fingerprint_row = make_chatgpt_fingerprint_row(prompt, prompt_template)
+
+    return RecomputeStep(prompt_template.source_db_columns,
+                         [RecomputeTarget(target_field_id, field_id, fingerprint_row)],
+                         chatgpt_chunk)
+
+
+def get_chatgpt_prompt_template(table_model, prompt, field_id=None):
+    # map field names to internal field names, so that we only load the columns which are
+    # present in the prompt
+    field_name_to_field_id_map = {}
+    for field_object in table_model._field_objects.values():
+        field = field_object['field']
+        field_name_to_field_id_map[field.name] = field.db_column
+    lookup_db_column = lambda field_name: field_name_to_field_id_map[field_name]
+    if field_id != None:
+        return get_compiled_template(field_id, prompt, lookup_db_column)
+    return CompiledPromptTemplate(prompt, lookup_db_column)
+
+
+def make_chatgpt_fingerprint_row(prompt, prompt_template):
+    settings_fingerprint = get_chatgpt_settings_fingerprint(prompt)
+    return lambda row: compute_fingerprint(
+        settings_fingerprint, *[getattr(row, db_column) for db_column in prompt_template.source_db_columns])
+
+
+def estimate_chatgpt_all_rows(table_model, prompt, field_id, start_after_row_id=None,
+                              chunk_size=None):
+    """pre-flight estimate of the tokens chatgpt_all_rows would use, without calling chatgpt:
+    the prompts of the cells whose fingerprint changed are counted locally (see budgets.py).
+    cached answers aren't taken into account, and cells computed from other plugin fields
+    being recomputed in the same pass can't be known in advance"""
+    prompt_template = get_chatgpt_prompt_template(table_model, prompt, field_id)
+    fingerprint_row = make_chatgpt_fingerprint_row(prompt, prompt_template)
+    tokens = 0
+    for chunk in iterate_row_chunks(table_model, prompt_template.source_db_columns,
+                                    start_after_row_id, chunk_size):
+        changed_fingerprints = get_changed_fingerprints(
+            field_id, {row.id: fingerprint_row(row) for row in chunk})
+        prompts = set(prompt_template.render(row) for row in chunk
+                      if row.id in changed_fingerprints)
+        tokens += estimate_prompt_tokens(prompts)
+    return tokens
+
+
+def get_chatgpt_settings_fingerprint(prompt):
+    return compute_fingerprint(prompt, get_chatgpt_model(), CHATGPT_PARAMETERS)
@@ -0,0 +1,74 @@
+"""
+every process which translates in-process loads its own copy of the argos models (8 gunicorn
+workers plus 4 celery workers means 12 copies). instead, a single translation service process
+can own the models, and the other processes send it batches of texts over a unix socket.
+start it with the run_translation_service management command and point
+BASEROW_TRANSLATE_PLUGIN_TRANSLATION_SERVICE_SOCKET at the same socket.
+
+the protocol is one JSON object per line:
+request  {"texts": [...], "source_language": "en", "target_language": "fr"}
+response {"translations": [...]} or {"error": "..."}
+"""
+
+import json
+import logging
+import os
+import socket
+import socketserver
+
+logger = logging.getLogger(__name__)
+
+
+class TranslationServiceError(Exception):
+    pass
+
+
+class TranslationRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        # a client can send several requests on the same connection
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                translations = self.server.translate_batch(
+                    request['texts'], request['source_language'], request['target_language'])
+                response = {'translations': translations}
+            except Exception as e:
+                logger.exception('translation request failed')
+                response = {'error': f'{type(e).__name__}: {e}'}
+            self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+
+class TranslationServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, translate_batch=None):
+        if translate_batch == None:
+            from .translators import translate_batch
+        self.translate_batch = translate_batch
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        super().__init__(socket_path, TranslationRequestHandler)
+
+
+def translate_batch(texts, source_language, target_language, socket_path, timeout=None):
+    """send a batch of texts to the translation service, returns the translations in the same
+    order"""
+    request = {'texts': texts, 'source_language': source_language,
+               'target_language': target_language}
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.settimeout(timeout)
+            client.connect(socket_path)
+            client.sendall(json.dumps(request).encode('utf-8') + b'\n')
+            with client.makefile('rb') as f:
+                line = f.readline()
+    except OSError as e:
+        raise TranslationServiceError(f'could not reach the translation service at '
+                                      f'{socket_path}: {e}')
+    if len(line) == 0:
+        raise TranslationServiceError('the translation service closed the connection')
+    response = json.loads(line)
+    if 'error' in response:
+        raise TranslationServiceError(response['error'])
+    return response['translations']
@@ -0,0 +1,157 @@
+"""
+argostranslate.translate.translate() resolves the installed languages and builds the
+translation chain on every call, then translates a single text. here we load the model of
+each language pair once per process, keep it around, and send many sentences through
+CTranslate2 in a single batched call. the texts are split into sentences beforehand, by
+translation.translate_many (see segmentation.py).
+"""
+
+import logging
+import os
+import threading
+
+from django.conf import settings
+
+from . import packages
+
+logger = logging.getLogger(__name__)
+
+class ArgosTranslator:
+    """translates one language pair using the installed argos package. when there is a direct
+    package for the pair, its CTranslate2 model and sentencepiece tokenizer are used directly,
+    otherwise we go through the argos translation chain (which pivots through english)"""
+
+    def __init__(self, source_language, target_language):
+        import argostranslate.package
+        import argostranslate.translate
+
+        self.source_language = source_language
+        self.target_language = target_language
+        self.ct2_translator = None
+        self.argos_translation = None
+
+        package = next(
+            filter(lambda x: x.from_code == source_language and x.to_code == target_language,
+                   argostranslate.package.get_installed_packages()),
+            None
+        )
+        sentencepiece_path = None
+        if package != None:
+            sentencepiece_path = os.path.join(package.package_path, 'sentencepiece.model')
+
+        if sentencepiece_path != None and os.path.exists(sentencepiece_path):
+            import ctranslate2
+            import sentencepiece
+
+            logger.info(f'loading translation model {source_language} to {target_language}')
+            self.ct2_translator = ctranslate2.Translator(
+                os.path.join(package.package_path, 'model'), device='cpu')
+            self.tokenizer = sentencepiece.SentencePieceProcessor(model_file=sentencepiece_path)
+            self.target_prefix = getattr(package, 'target_prefix', '') or ''
+        else:
+            self.argos_translation = argostranslate.translate.get_translation_from_codes(
+                source_language, target_language)
+            if self.argos_translation == None:
+                raise ValueError(f'no translation package installed for {source_language} '
+                                 f'to {target_language}')
+
+    def translate_batch(self, texts):
+        """texts are translated in one batch, they should already be split into sentences"""
+        if self.ct2_translator == None:
+            return [self.argos_translation.translate(text) for text in texts]
+        return self.translate_sentences([text.strip() for text in texts])
+
+    def translate_sentences(self, sentences):
+        if len(sentences) == 0:
+            return []
+        tokenized = [self.tokenizer.encode(sentence, out_type=str) for sentence in sentences]
+        target_prefix = None
+        if self.target_prefix != '':
+            target_prefix = [[self.target_prefix]] * len(tokenized)
+        results = self.ct2_translator.translate_batch(
+            tokenized,
+            target_prefix=target_prefix,
+            replace_unknowns=True,
+            max_batch_size=settings.BASEROW_TRANSLATE_PLUGIN_MAX_BATCH_SIZE,
+            beam_size=4,
+            num_hypotheses=1,
+            length_penalty=0.2,
+        )
+        translated = []
+        for result in results:
+            tokens = result.hypotheses[0]
+            if self.target_prefix != '' and len(tokens) > 0 and tokens[0] == self.target_prefix:
+                tokens = tokens[1:]
+            translated.append(self.tokenizer.decode(tokens))
+        return translated
+
+
+# (source_language, target_language) -> ArgosTranslator, loaded once per process
+_translators = {}
+# (source_language, target_language) -> lock held while that pair's package is installed and its
+# model loaded, so that slow loads don't hold up the other pairs
+_pair_locks = {}
+# only guards the dicts above
+_translators_lock = threading.Lock()
+# argos writes the package index and the installed packages to shared files
+_install_lock = threading.Lock()
+
+
+def get_translator(source_language, target_language):
+    """the model is loaded the first time a language pair is used"""
+    language_pair = (source_language, target_language)
+    with _translators_lock:
+        if language_pair in _translators:
+            return _translators[language_pair]
+        pair_lock = _pair_locks.setdefault(language_pair, threading.Lock())
+    with pair_lock:
+        # another thread may have loaded it while we were waiting
+        with _translators_lock:
+            if language_pair in _translators:
+                return _translators[language_pair]
+        install_package_if_missing(source_language, target_language)
+        translator = ArgosTranslator(source_language, target_language)
+        with _translators_lock:
+            _translators[language_pair] = translator
+        return translator
+
+
+# language pairs for which the argos index has no package, so that we don't download the index
+# again every time
+_unavailable_packages = set()
+
+
+def install_package_if_missing(source_language, target_language):
+    """returns whether a direct package is installed for this language pair"""
+    language_pair = (source_language, target_language)
+    if packages.is_package_installed(source_language, target_language):
+        return True
+    if not settings.BASEROW_TRANSLATE_PLUGIN_AUTO_INSTALL_PACKAGES:
+        return False
+    with _install_lock:
+        if language_pair in _unavailable_packages:
+            return False
+        if packages.is_package_installed(source_language, target_language):
+            return True
+        try:
+            packages.install_package(source_language, target_language)
+        except ValueError:
+            # no direct package, we'll have to pivot through english
+            logger.warning(f'no package available for {source_language} to {target_language}')
+            _unavailable_packages.add(language_pair)
+            return False
+    # the installed packages are part of the engine versions
+    from .engines import translation_engine_registry
+    translation_engine_registry.get('argos').clear_versions()
+    return True
+
+
+def has_direct_package(source_language, target_language):
+    """whether the language pair can be translated without pivoting. this only looks at the
+    installed packages: it's called when a row is updated, which mustn't wait for a download"""
+    return packages.is_package_installed(source_language, target_language)
+
+
+def translate_batch(texts, source_language, target_language):
+    """translate a list of texts, returns the translations in the same order"""
+    return get_translator(source_language, target_language).translate_batch(texts)
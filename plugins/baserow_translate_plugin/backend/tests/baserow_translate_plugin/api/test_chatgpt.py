@@ -1,10 +1,12 @@
 import pytest
 import pprint
 import pdb
+from django.db.models import QuerySet, Sum
 from django.shortcuts import reverse
 from rest_framework.status import HTTP_200_OK
 
 import baserow_translate_plugin.translation
+from baserow_translate_plugin.models import ChatGPTUsage, FieldRecomputeJob
 
 @pytest.mark.django_db(transaction=True)
 def test_add_chatgpt_field(api_client, data_fixture):
@@ -278,4 +280,301 @@ def test_chatgpt_update_all_rows(api_client, data_fixture):
     result_count = response_data['count']
     # check the last two rows
     assert response_data['results'][result_count-2][f'field_{chatgpt_field_id}'] == 'chatgpt: Translate text into French: Hello'
-    assert response_data['results'][result_count-1][f'field_{chatgpt_field_id}'] == 'chatgpt: Translate text into French: Goodbye'
\ No newline at end of file
+    assert response_data['results'][result_count-1][f'field_{chatgpt_field_id}'] == 'chatgpt: Translate text into French: Goodbye'
+
+@pytest.mark.django_db(transaction=True)
+def test_chained_fields_recomputed_in_one_pass(api_client, data_fixture, mocker):
+    """a chatgpt field using a translation field is recomputed in the same pass as the
+    translation, with the new translations"""
+    baserow_translate_plugin.translation.TEST_MODE = True
+    user, token = data_fixture.create_user_and_token()
+    table = data_fixture.create_database_table(user=user)
+    english_text_field = data_fixture.create_text_field(table=table, name='English')
+
+    response = api_client.post(
+        f'/api/database/rows/table/{table.id}/batch/?user_field_names=true',
+        {'items': [{'English': 'Hello'}, {'English': 'Goodbye'}]},
+        format="json",
+        HTTP_AUTHORIZATION=f"JWT {token}",
+    )
+    assert response.status_code == HTTP_200_OK
+
+    response = api_client.post(
+        reverse("api:database:fields:list", kwargs={"table_id": table.id}),
+        {'name': 'Translation', 'type': 'translation', 'source_field_id': english_text_field.id,
+         'source_language': 'en', 'target_language': 'fr'},
+        format="json",
+        HTTP_AUTHORIZATION=f"JWT {token}",
+    )
+    assert response.status_code == HTTP_200_OK
+    translation_field_id = response.json()['id']
+    response = api_client.post(
+        reverse("api:database:fields:list", kwargs={"table_id": table.id}),
+        {'name': 'Summary', 'type': 'chatgpt', 'prompt': 'Summarize: {Translation}'},
+        format="json",
+        HTTP_AUTHORIZATION=f"JWT {token}",
+    )
+    assert response.status_code == HTTP_200_OK
+
+    update_all_rows_in_chunks = mocker.spy(baserow_translate_plugin.translation,
+                                           'update_all_rows_in_chunks')
+    response = api_client.patch(
+        reverse("api:database:fields:item", kwargs={"field_id": translation_field_id}),
+        {'target_language': 'de'},
+        format="json",
+        HTTP_AUTHORIZATION=f"JWT {token}",
+    )
+    assert response.status_code == HTTP_200_OK
+    # the translation and the chatgpt field, in that order, in a single pass
+    assert update_all_rows_in_chunks.call_count == 1
+    steps = update_all_rows_in_chunks.call_args[0][2]
+    assert len(steps) == 2
+
+    response = api_client.get(
+        f'/api/database/rows/table/{table.id}/?user_field_names=true',
+        format="json",
+        HTTP_AUTHORIZATION=f"JWT {token}",
+    )
+    assert response.status_code == HTTP_200_OK
+    assert [row['Summary'] for row in response.json()['results']] == [
+        'chatgpt: Summarize: translation (en to de): Hello',
+        'chatgpt: Summarize: translation (en to de): Goodbye',
+    ]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_chained_fields_updated_with_the_row(api_client, data_fixture, mocker):
+    """editing the source cell updates the translation and the chatgpt field using it, through
+    baserow's update collector rather than separate UPDATEs"""
+    baserow_translate_plugin.translation.TEST_MODE = True
+    user, token = data_fixture.create_user_and_token()
+    table = data_fixture.create_database_table(user=user)
+    english_text_field = data_fixture.create_text_field(table=table, name='English')
+
+    response = api_client.post(
+        reverse("api:database:fields:list", kwargs={"table_id": table.id}),
+        {'name': 'Translation', 'type': 'translation', 'source_field_id': english_text_field.id,
+         'source_language': 'en', 'target_language': 'fr'},
+        format="json",
+        HTTP_AUTHORIZATION=f"JWT {token}",
+    )
+    assert response.status_code == HTTP_200_OK
+    response = api_client.post(
+        reverse("api:database:fields:list", kwargs={"table_id": table.id}),
+        {'name': 'Summary', 'type': 'chatgpt', 'prompt': 'Summarize: {Translation}'},
+        format="json",
+        HTTP_AUTHORIZATION=f"JWT {token}",
+    )
+    assert response.status_code == HTTP_200_OK
+
+    response = api_client.post(
+        f'/api/database/rows/table/{table.id}/?user_field_names=true',
+        {'English': 'Hello'},
+        format="json",
+        HTTP_AUTHORIZATION=f"JWT {token}",
+    )
+    assert response.status_code == HTTP_200_OK
+    row_id = response.json()['id']
+
+    bulk_update = mocker.spy(QuerySet, 'bulk_update')
+    response = api_client.patch(
+        f'/api/database/rows/table/{table.id}/{row_id}/?user_field_names=true',
+        {'English': 'Goodbye'},
+        format="json",
+        HTTP_AUTHORIZATION=f"JWT {token}",
+    )
+    assert response.status_code == HTTP_200_OK
+    assert response.json()['Translation'] == 'translation (en to fr): Goodbye'
+    assert response.json()['Summary'] == 'chatgpt: Summarize: translation (en to fr): Goodbye'
+    assert bulk_update.call_count == 0
+
+
+@pytest.mark.django_db(transaction=True)
+def test_lazy_field_translated_for_its_dependants(api_client, data_fixture):
+    """a lazy translation used by a chatgpt field is translated when its source cell changes,
+    so that the chatgpt field doesn't get the old translation"""
+    baserow_translate_plugin.translation.TEST_MODE = True
+    user, token = data_fixture.create_user_and_token()
+    table = data_fixture.create_database_table(user=user)
+    english_text_field = data_fixture.create_text_field(table=table, name='English')
+
+    response = api_client.post(
+        reverse("api:database:fields:list", kwargs={"table_id": table.id}),
+        {'name': 'Translation', 'type': 'translation', 'source_field_id': english_text_field.id,
+         'source_language': 'en', 'target_language': 'fr', 'lazy': True},
+        format="json",
+        HTTP_AUTHORIZATION=f"JWT {token}",
+    )
+    assert response.status_code == HTTP_200_OK
+    translation_field_id = response.json()['id']
+    response = api_client.post(
+        reverse("api:database:fields:list", kwargs={"table_id": table.id}),
+        {'name': 'Summary', 'type': 'chatgpt', 'prompt': 'Summarize: {Translation}'},
+        format="json",
+        HTTP_AUTHORIZATION=f"JWT {token}",
+    )
+    assert response.status_code == HTTP_200_OK
+
+    response = api_client.post(
+        f'/api/database/rows/table/{table.id}/?user_field_names=true',
+        {'English': 'Hello'},
+        format="json",
+        HTTP_AUTHORIZATION=f"JWT {token}",
+    )
+    assert response.status_code == HTTP_200_OK
+    row_id = response.json()['id']
+
+    response = api_client.patch(
+        f'/api/database/rows/table/{table.id}/{row_id}/?user_field_names=true',
+        {'English': 'Goodbye'},
+        format="json",
+        HTTP_AUTHORIZATION=f"JWT {token}",
+    )
+    assert response.status_code == HTTP_200_OK
+    assert response.json()['Summary'] == 'chatgpt: Summarize: translation (en to fr): Goodbye'
+    # stored, not only serialized
+    row = table.get_model().objects.get(id=row_id)
+    assert getattr(row, f'field_{translation_field_id}') == 'translation (en to fr): Goodbye'
+
+
+@pytest.mark.django_db(transaction=True)
+def test_chatgpt_token_budget(api_client, data_fixture):
+    """a job which doesn't fit in the field's token budget is paused, and resumed when the
+    budget is raised"""
+    baserow_translate_plugin.translation.TEST_MODE = True
+    user, token = data_fixture.create_user_and_token()
+    table = data_fixture.create_database_table(user=user)
+    data_fixture.create_text_field(table=table, name='English')
+
+    response = api_client.post(
+        f'/api/database/rows/table/{table.id}/batch/?user_field_names=true',
+        {'items': [{'English': 'Hello'}, {'English': 'Goodbye'}]},
+        format="json",
+        HTTP_AUTHORIZATION=f"JWT {token}",
+    )
+    assert response.status_code == HTTP_200_OK
+    row_ids = [row['id'] for row in response.json()['items']]
+
+    # the prompts and their estimated answers need more than 10 tokens
+    response = api_client.post(
+        reverse("api:database:fields:list", kwargs={"table_id": table.id}),
+        {'name': 'Summary', 'type': 'chatgpt', 'prompt': 'Summarize: {English}',
+         'token_budget': 10},
+        format="json",
+        HTTP_AUTHORIZATION=f"JWT {token}",
+    )
+    assert response.status_code == HTTP_200_OK
+    assert response.json()['token_budget'] == 10
+    chatgpt_field_id = response.json()['id']
+
+    response = api_client.get(
+        reverse("api:baserow_translate_plugin:recompute_job",
+                kwargs={'field_id': chatgpt_field_id}),
+        format="json",
+        HTTP_AUTHORIZATION=f"JWT {token}",
+    )
+    job = response.json()
+    assert job['state'] == 'paused'
+    assert job['estimated_tokens'] > 10
+    assert job['estimated_cost'] > 0
+    assert ChatGPTUsage.objects.filter(field_id=chatgpt_field_id).count() == 0
+
+    # edited cells aren't recomputed either
+    response = api_client.patch(
+        f'/api/database/rows/table/{table.id}/{row_ids[0]}/?user_field_names=true',
+        {'English': 'Good morning'},
+        format="json",
+        HTTP_AUTHORIZATION=f"JWT {token}",
+    )
+    assert response.status_code == HTTP_200_OK
+    assert response.json()['Summary'] == None
+
+    # no limit
+    response = api_client.patch(
+        reverse("api:database:fields:item", kwargs={"field_id": chatgpt_field_id}),
+        {'token_budget': 0},
+        format="json",
+        HTTP_AUTHORIZATION=f"JWT {token}",
+    )
+    assert response.status_code == HTTP_200_OK
+    response = api_client.get(
+        f'/api/database/rows/table/{table.id}/?user_field_names=true',
+        format="json",
+        HTTP_AUTHORIZATION=f"JWT {token}",
+    )
+    assert [row['Summary'] for row in response.json()['results']] == [
+        'chatgpt: Summarize: Good morning', 'chatgpt: Summarize: Goodbye']
+    assert FieldRecomputeJob.objects.get(field_id=chatgpt_field_id).state == 'finished'
+    assert ChatGPTUsage.objects.filter(
+        field_id=chatgpt_field_id).aggregate(tokens=Sum('tokens'))['tokens'] > 0
+
+
+@pytest.mark.django_db(transaction=True)
+def test_chatgpt_token_budget_edited_cell(api_client, data_fixture):
+    """a cell edited while the budget is exhausted is left to a paused job, and recomputed when
+    the budget is raised"""
+    baserow_translate_plugin.translation.TEST_MODE = True
+    user, token = data_fixture.create_user_and_token()
+    table = data_fixture.create_database_table(user=user)
+    data_fixture.create_text_field(table=table, name='English')
+
+    response = api_client.post(
+        f'/api/database/rows/table/{table.id}/batch/?user_field_names=true',
+        {'items': [{'English': 'Hello'}, {'English': 'Goodbye'}]},
+        format="json",
+        HTTP_AUTHORIZATION=f"JWT {token}",
+    )
+    assert response.status_code == HTTP_200_OK
+    row_ids = [row['id'] for row in response.json()['items']]
+
+    response = api_client.post(
+        reverse("api:database:fields:list", kwargs={"table_id": table.id}),
+        {'name': 'Summary', 'type': 'chatgpt', 'prompt': 'Summarize: {English}'},
+        format="json",
+        HTTP_AUTHORIZATION=f"JWT {token}",
+    )
+    assert response.status_code == HTTP_200_OK
+    chatgpt_field_id = response.json()['id']
+    assert FieldRecomputeJob.objects.get(field_id=chatgpt_field_id).state == 'finished'
+
+    # less than the first job used
+    response = api_client.patch(
+        reverse("api:database:fields:item", kwargs={"field_id": chatgpt_field_id}),
+        {'token_budget': 10},
+        format="json",
+        HTTP_AUTHORIZATION=f"JWT {token}",
+    )
+    assert response.status_code == HTTP_200_OK
+
+    response = api_client.patch(
+        f'/api/database/rows/table/{table.id}/{row_ids[0]}/?user_field_names=true',
+        {'English': 'Good morning'},
+        format="json",
+        HTTP_AUTHORIZATION=f"JWT {token}",
+    )
+    assert response.status_code == HTTP_200_OK
+    assert response.json()['Summary'] == 'chatgpt: Summarize: Hello'
+    response = api_client.get(
+        reverse("api:baserow_translate_plugin:recompute_job",
+                kwargs={'field_id': chatgpt_field_id}),
+        format="json",
+        HTTP_AUTHORIZATION=f"JWT {token}",
+    )
+    assert response.json()['state'] == 'paused'
+    assert response.json()['error'] != ''
+
+    response = api_client.patch(
+        reverse("api:database:fields:item", kwargs={"field_id": chatgpt_field_id}),
+        {'token_budget': 0},
+        format="json",
+        HTTP_AUTHORIZATION=f"JWT {token}",
+    )
+    assert response.status_code == HTTP_200_OK
+    response = api_client.get(
+        f'/api/database/rows/table/{table.id}/?user_field_names=true',
+        format="json",
+        HTTP_AUTHORIZATION=f"JWT {token}",
+    )
+    assert [row['Summary'] for row in response.json()['results']] == [
+        'chatgpt: Summarize: Good morning', 'chatgpt: Summarize: Goodbye']
+    assert FieldRecomputeJob.objects.filter(field_id=chatgpt_field_id).first().state == 'finished'
@@ -2,9 +2,13 @@ import pytest
 import pprint
 import pdb
 from django.shortcuts import reverse
-from rest_framework.status import HTTP_200_OK
+from django.utils import timezone
+from rest_framework.status import HTTP_200_OK, HTTP_400_BAD_REQUEST
 
 import baserow_translate_plugin.translation
+from baserow_translate_plugin import dirty_queue, fingerprints, jobs, metrics
+from baserow_translate_plugin.cache import get_translation_cache
+from baserow_translate_plugin.models import DirtyCell, FieldRecomputeJob
 
 @pytest.mark.django_db(transaction=True)
 def test_add_language_field(api_client, data_fixture):
@@ -268,3 +272,488 @@ def test_create_multiple_rows(api_client, data_fixture):
     assert response.status_code == HTTP_200_OK, response.content
     assert response_data['items'][0][f'field_{spanish_translation_field_id}'] == 'translation (en to es): Hello'
     assert response_data['items'][1][f'field_{spanish_translation_field_id}'] == 'translation (en to es): Bye bye'    
+
+
+@pytest.mark.django_db(transaction=True)
+def test_update_all_rows_background_job(api_client, data_fixture):
+    """creating a translation field schedules a background job which recomputes all rows,
+    its progress can be retrieved through the API"""
+
+    baserow_translate_plugin.translation.TEST_MODE = True
+
+    user, token = data_fixture.create_user_and_token()
+    database = data_fixture.create_database_application(user=user)
+    table = data_fixture.create_database_table(user=user, database=database)
+    english_text_field = data_fixture.create_text_field(table=table, name='English')
+
+    # enter two rows of english text
+    # ==============================
+
+    url = f'/api/database/rows/table/{table.id}/batch/'
+    rows = [
+        {f"field_{english_text_field.id}": "Hello"},
+        {f"field_{english_text_field.id}": "Bye bye"},
+    ]
+    response = api_client.post(
+        url,
+        {'items': rows},
+        format="json",
+        HTTP_AUTHORIZATION=f"JWT {token}",
+    )
+    assert response.status_code == HTTP_200_OK, response.content
+    last_row_id = response.json()['items'][1]['id']
+
+    # add french translation field, the celery task runs eagerly in tests
+    # ===================================================================
+
+    field_data = {
+        'name': 'French',
+        'type': 'translation',
+        'source_field_id': english_text_field.id,
+        'source_language': 'en',
+        'target_language': 'fr'}
+    response = api_client.post(
+        reverse("api:database:fields:list", kwargs={"table_id": table.id}),
+        field_data,
+        format="json",
+        HTTP_AUTHORIZATION=f"JWT {token}",
+    )
+    assert response.status_code == HTTP_200_OK
+    french_translation_field_id = response.json()['id']
+
+    # the job should be finished, with its checkpoint on the last row
+    # ===============================================================
+
+    response = api_client.get(
+        reverse("api:baserow_translate_plugin:recompute_job",
+                kwargs={'field_id': french_translation_field_id}),
+        format="json",
+        HTTP_AUTHORIZATION=f"JWT {token}",
+    )
+    assert response.status_code == HTTP_200_OK
+    job = response.json()
+    assert job['state'] == 'finished'
+    assert job['progress_percentage'] == 100
+    assert job['last_row_id'] == last_row_id
+
+    response = api_client.get(
+        reverse("api:database:rows:list", kwargs={"table_id": table.id}),
+        format="json",
+        HTTP_AUTHORIZATION=f"JWT {token}",
+    )
+    response_rows = response.json()['results']
+    assert response_rows[0][f'field_{french_translation_field_id}'] == 'translation (en to fr): Hello'
+    assert response_rows[1][f'field_{french_translation_field_id}'] == 'translation (en to fr): Bye bye'
+
+
+@pytest.mark.django_db(transaction=True)
+def test_skip_recomputation_when_inputs_unchanged(api_client, data_fixture, mocker):
+    baserow_translate_plugin.translation.TEST_MODE = True
+
+    user, token = data_fixture.create_user_and_token()
+    database = data_fixture.create_database_application(user=user)
+    table = data_fixture.create_database_table(user=user, database=database)
+    english_text_field = data_fixture.create_text_field(table=table, name='English')
+
+    field_data = {
+        'name': 'French',
+        'type': 'translation',
+        'source_field_id': english_text_field.id,
+        'source_language': 'en',
+        'target_language': 'fr'}
+    response = api_client.post(
+        reverse("api:database:fields:list", kwargs={"table_id": table.id}),
+        field_data,
+        format="json",
+        HTTP_AUTHORIZATION=f"JWT {token}",
+    )
+    assert response.status_code == HTTP_200_OK
+    french_translation_field_id = response.json()['id']
+
+    response = api_client.post(
+        reverse("api:database:rows:list", kwargs={"table_id": table.id}),
+        {f"field_{english_text_field.id}": "Hello"},
+        format="json",
+        HTTP_AUTHORIZATION=f"JWT {token}",
+    )
+    assert response.status_code == HTTP_200_OK
+    table_row_id = response.json()['id']
+
+    # renaming the field doesn't recompute the table
+    # ==============================================
+
+    assert FieldRecomputeJob.objects.filter(field_id=french_translation_field_id).count() == 1
+    response = api_client.patch(
+        reverse("api:database:fields:item", kwargs={"field_id": french_translation_field_id}),
+        {'name': 'Français'},
+        format="json",
+        HTTP_AUTHORIZATION=f"JWT {token}",
+    )
+    assert response.status_code == HTTP_200_OK
+    assert FieldRecomputeJob.objects.filter(field_id=french_translation_field_id).count() == 1
+
+    # writing the same source value again doesn't translate anything
+    # ==============================================================
+
+    translate_many = mocker.spy(baserow_translate_plugin.translation, 'translate_many')
+    response = api_client.patch(
+        reverse("api:database:rows:item", kwargs={"table_id": table.id, 'row_id': table_row_id}),
+        {f"field_{english_text_field.id}": "Hello"},
+        format="json",
+        HTTP_AUTHORIZATION=f"JWT {token}",
+    )
+    assert response.status_code == HTTP_200_OK
+    assert response.json()[f'field_{french_translation_field_id}'] == 'translation (en to fr): Hello'
+    translate_many.assert_called_once_with([], 'en', 'fr', engine='')
+
+    # changing the target language recomputes the table
+    # =================================================
+
+    response = api_client.patch(
+        reverse("api:database:fields:item", kwargs={"field_id": french_translation_field_id}),
+        {'target_language': 'es'},
+        format="json",
+        HTTP_AUTHORIZATION=f"JWT {token}",
+    )
+    assert response.status_code == HTTP_200_OK
+    assert FieldRecomputeJob.objects.filter(field_id=french_translation_field_id).count() == 2
+
+
+@pytest.mark.django_db(transaction=True)
+def test_update_all_rows_sends_rows_updated(api_client, data_fixture, mocker):
+    """the rows recomputed in the background are sent to the front-end as rows_updated
+    events, instead of forcing every client to refresh the whole table"""
+
+    baserow_translate_plugin.translation.TEST_MODE = True
+    broadcast_to_channel_group = mocker.patch("baserow.ws.registries.broadcast_to_channel_group")
+
+    user, token = data_fixture.create_user_and_token()
+    database = data_fixture.create_database_application(user=user)
+    table = data_fixture.create_database_table(user=user, database=database)
+    english_text_field = data_fixture.create_text_field(table=table, name='English')
+
+    url = f'/api/database/rows/table/{table.id}/batch/'
+    rows = [
+        {f"field_{english_text_field.id}": "Hello"},
+        {f"field_{english_text_field.id}": "Bye bye"},
+    ]
+    response = api_client.post(
+        url,
+        {'items': rows},
+        format="json",
+        HTTP_AUTHORIZATION=f"JWT {token}",
+    )
+    assert response.status_code == HTTP_200_OK, response.content
+    row_ids = [row['id'] for row in response.json()['items']]
+
+    field_data = {
+        'name': 'French',
+        'type': 'translation',
+        'source_field_id': english_text_field.id,
+        'source_language': 'en',
+        'target_language': 'fr'}
+    response = api_client.post(
+        reverse("api:database:fields:list", kwargs={"table_id": table.id}),
+        field_data,
+        format="json",
+        HTTP_AUTHORIZATION=f"JWT {token}",
+    )
+    assert response.status_code == HTTP_200_OK
+    french_translation_field_id = response.json()['id']
+
+    payloads = [call[0][1] for call in broadcast_to_channel_group.delay.call_args_list]
+    rows_updated = [payload for payload in payloads if payload['type'] == 'rows_updated']
+    assert len(rows_updated) == 1
+    assert rows_updated[0]['table_id'] == table.id
+    assert [row['id'] for row in rows_updated[0]['rows']] == row_ids
+    assert rows_updated[0]['rows'][0][f'field_{french_translation_field_id}'] == \
+        'translation (en to fr): Hello'
+    assert rows_updated[0]['rows_before_update'][0][f'field_{french_translation_field_id}'] == None
+    assert not any(payload.get('force_table_refresh') for payload in payloads)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_translations_of_same_source_share_one_pass(api_client, data_fixture, mocker):
+    """pending recomputations of several translations of the same source field are done in a
+    single pass over the table"""
+
+    baserow_translate_plugin.translation.TEST_MODE = True
+
+    user, token = data_fixture.create_user_and_token()
+    database = data_fixture.create_database_application(user=user)
+    table = data_fixture.create_database_table(user=user, database=database)
+    english_text_field = data_fixture.create_text_field(table=table, name='English')
+
+    url = f'/api/database/rows/table/{table.id}/batch/'
+    response = api_client.post(
+        url,
+        {'items': [{f"field_{english_text_field.id}": "Hello"}]},
+        format="json",
+        HTTP_AUTHORIZATION=f"JWT {token}",
+    )
+    assert response.status_code == HTTP_200_OK, response.content
+
+    translation_field_ids = {}
+    for name, target_language in [('French', 'fr'), ('German', 'de')]:
+        response = api_client.post(
+            reverse("api:database:fields:list", kwargs={"table_id": table.id}),
+            {'name': name, 'type': 'translation', 'source_field_id': english_text_field.id,
+             'source_language': 'en', 'target_language': target_language},
+            format="json",
+            HTTP_AUTHORIZATION=f"JWT {token}",
+        )
+        assert response.status_code == HTTP_200_OK
+        translation_field_ids[target_language] = response.json()['id']
+
+    # both fields need recomputing, e.g. after the source field changed
+    # =================================================================
+
+    french_job = FieldRecomputeJob.objects.create(field_id=translation_field_ids['fr'])
+    german_job = FieldRecomputeJob.objects.create(field_id=translation_field_ids['de'])
+    fingerprints.clear_fingerprints(translation_field_ids['fr'])
+    fingerprints.clear_fingerprints(translation_field_ids['de'])
+
+    translate_many_targets = mocker.spy(baserow_translate_plugin.translation, 'translate_many_targets')
+    jobs.run_recompute_job(french_job.id)
+
+    # one pass translated into both languages
+    translate_many_targets.assert_called_once_with(['Hello'], 'en', ['fr', 'de'], parallel=True,
+                                                   engine='')
+    french_job.refresh_from_db()
+    german_job.refresh_from_db()
+    assert french_job.state == 'finished'
+    assert german_job.state == 'finished'
+    assert german_job.shared_with_id == french_job.id
+
+    # the german job's own task has nothing left to do
+    jobs.run_recompute_job(german_job.id)
+    assert translate_many_targets.call_count == 1
+
+    response = api_client.get(
+        f'/api/database/rows/table/{table.id}/',
+        format="json",
+        HTTP_AUTHORIZATION=f"JWT {token}",
+    )
+    row = response.json()['results'][0]
+    assert row[f"field_{translation_field_ids['fr']}"] == 'translation (en to fr): Hello'
+    assert row[f"field_{translation_field_ids['de']}"] == 'translation (en to de): Hello'
+
+
+@pytest.mark.django_db(transaction=True)
+def test_async_dependency_updates_are_debounced(api_client, data_fixture, mocker, settings):
+    """with async dependency updates, edits of a source cell are queued, and several edits
+    within the debounce window result in a single translation"""
+
+    baserow_translate_plugin.translation.TEST_MODE = True
+    settings.BASEROW_TRANSLATE_PLUGIN_ASYNC_DEPENDENCY_UPDATES = True
+    settings.BASEROW_TRANSLATE_PLUGIN_DEBOUNCE_SECONDS = 60
+
+    user, token = data_fixture.create_user_and_token()
+    database = data_fixture.create_database_application(user=user)
+    table = data_fixture.create_database_table(user=user, database=database)
+    english_text_field = data_fixture.create_text_field(table=table, name='English')
+
+    response = api_client.post(
+        reverse("api:database:fields:list", kwargs={"table_id": table.id}),
+        {'name': 'French', 'type': 'translation', 'source_field_id': english_text_field.id,
+         'source_language': 'en', 'target_language': 'fr'},
+        format="json",
+        HTTP_AUTHORIZATION=f"JWT {token}",
+    )
+    assert response.status_code == HTTP_200_OK
+    french_translation_field_id = response.json()['id']
+
+    response = api_client.post(
+        f'/api/database/rows/table/{table.id}/?user_field_names=true',
+        {'English': 'Hel'},
+        format="json",
+        HTTP_AUTHORIZATION=f"JWT {token}",
+    )
+    assert response.status_code == HTTP_200_OK
+    row_id = response.json()['id']
+    # not translated within the request
+    assert response.json()['French'] == None
+
+    translate_many = mocker.spy(baserow_translate_plugin.translation, 'translate_many')
+    for text in ['Hell', 'Hello']:
+        response = api_client.patch(
+            f'/api/database/rows/table/{table.id}/{row_id}/?user_field_names=true',
+            {'English': text},
+            format="json",
+            HTTP_AUTHORIZATION=f"JWT {token}",
+        )
+        assert response.status_code == HTTP_200_OK
+
+    # the queued task runs eagerly in tests, but the debounce delay isn't over yet
+    assert DirtyCell.objects.filter(field_id=french_translation_field_id).count() == 1
+    assert translate_many.call_count == 0
+
+    # once the delay is over, the latest value is translated once
+    DirtyCell.objects.update(due_on=timezone.now())
+    dirty_queue.process_due_cells()
+    translate_many.assert_called_once_with(['Hello'], 'en', 'fr', engine='')
+    assert DirtyCell.objects.count() == 0
+
+    response = api_client.get(
+        f'/api/database/rows/table/{table.id}/{row_id}/?user_field_names=true',
+        format="json",
+        HTTP_AUTHORIZATION=f"JWT {token}",
+    )
+    assert response.json()['French'] == 'translation (en to fr): Hello'
+
+
+@pytest.mark.django_db(transaction=True)
+def test_translation_field_engine(api_client, data_fixture, settings):
+    """the translation engine can be selected per field"""
+
+    baserow_translate_plugin.translation.TEST_MODE = False
+    settings.BASEROW_TRANSLATE_PLUGIN_FAKE_ENGINE_LATENCY_MS = 0
+
+    user, token = data_fixture.create_user_and_token()
+    database = data_fixture.create_database_application(user=user)
+    table = data_fixture.create_database_table(user=user, database=database)
+    english_text_field = data_fixture.create_text_field(table=table, name='English')
+
+    field_data = {
+        'name': 'French',
+        'type': 'translation',
+        'source_field_id': english_text_field.id,
+        'source_language': 'en',
+        'target_language': 'fr',
+        'engine': 'unknown'}
+    response = api_client.post(
+        reverse("api:database:fields:list", kwargs={"table_id": table.id}),
+        field_data,
+        format="json",
+        HTTP_AUTHORIZATION=f"JWT {token}",
+    )
+    assert response.status_code == HTTP_400_BAD_REQUEST
+
+    field_data['engine'] = 'fake'
+    response = api_client.post(
+        reverse("api:database:fields:list", kwargs={"table_id": table.id}),
+        field_data,
+        format="json",
+        HTTP_AUTHORIZATION=f"JWT {token}",
+    )
+    assert response.status_code == HTTP_200_OK
+    assert response.json()['engine'] == 'fake'
+
+    response = api_client.post(
+        f'/api/database/rows/table/{table.id}/?user_field_names=true',
+        {'English': 'Hello'},
+        format="json",
+        HTTP_AUTHORIZATION=f"JWT {token}",
+    )
+    assert response.status_code == HTTP_200_OK
+    assert response.json()['French'] == 'translation (en to fr): Hello'
+
+
+@pytest.mark.django_db(transaction=True)
+def test_metrics_endpoint(api_client, data_fixture, settings):
+    baserow_translate_plugin.translation.TEST_MODE = True
+    get_translation_cache().clear()
+    metrics.reset()
+
+    user, token = data_fixture.create_user_and_token()
+    table = data_fixture.create_database_table(user=user)
+    english_text_field = data_fixture.create_text_field(table=table, name='English')
+    response = api_client.post(
+        reverse("api:database:fields:list", kwargs={"table_id": table.id}),
+        {'name': 'French', 'type': 'translation', 'source_field_id': english_text_field.id,
+         'source_language': 'en', 'target_language': 'fr'},
+        format="json",
+        HTTP_AUTHORIZATION=f"JWT {token}",
+    )
+    assert response.status_code == HTTP_200_OK
+    response = api_client.post(
+        f'/api/database/rows/table/{table.id}/?user_field_names=true',
+        {'English': 'Hello'},
+        format="json",
+        HTTP_AUTHORIZATION=f"JWT {token}",
+    )
+    assert response.status_code == HTTP_200_OK
+
+    url = reverse("api:baserow_translate_plugin:metrics")
+    # disabled without a token
+    settings.BASEROW_TRANSLATE_PLUGIN_METRICS_TOKEN = ''
+    assert api_client.get(url).status_code == 404
+
+    settings.BASEROW_TRANSLATE_PLUGIN_METRICS_TOKEN = 'secret'
+    assert api_client.get(url, HTTP_AUTHORIZATION='Bearer wrong').status_code == 401
+
+    response = api_client.get(url, HTTP_AUTHORIZATION='Bearer secret')
+    assert response.status_code == HTTP_200_OK
+    lines = response.content.decode().splitlines()
+    assert ('baserow_translate_plugin_translation_engine_calls_total'
+            '{engine="fake",field_type="translation",source_language="en",target_language="fr"} 1'
+            ) in lines
+    assert 'baserow_translate_plugin_cells_recomputed_total{field_type="translation"} 1' in lines
+    assert 'baserow_translate_plugin_dirty_cells 0' in lines
+    assert any(line.startswith('baserow_translate_plugin_span_seconds_count'
+                               '{field_type="translation",span="row_of_dependency_updated"}')
+               for line in lines)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_lazy_translation_field(api_client, data_fixture, mocker):
+    """lazy fields are only translated for the rows being read, in one batch"""
+    baserow_translate_plugin.translation.TEST_MODE = True
+    user, token = data_fixture.create_user_and_token()
+    table = data_fixture.create_database_table(user=user)
+    english_text_field = data_fixture.create_text_field(table=table, name='English')
+
+    response = api_client.post(
+        f'/api/database/rows/table/{table.id}/batch/?user_field_names=true',
+        {'items': [{'English': 'Hello'}, {'English': 'Goodbye'}, {'English': 'Thanks'}]},
+        format="json",
+        HTTP_AUTHORIZATION=f"JWT {token}",
+    )
+    assert response.status_code == HTTP_200_OK
+
+    translate_many = mocker.spy(baserow_translate_plugin.translation, 'translate_many')
+    response = api_client.post(
+        reverse("api:database:fields:list", kwargs={"table_id": table.id}),
+        {'name': 'French', 'type': 'translation', 'source_field_id': english_text_field.id,
+         'source_language': 'en', 'target_language': 'fr', 'lazy': True},
+        format="json",
+        HTTP_AUTHORIZATION=f"JWT {token}",
+    )
+    assert response.status_code == HTTP_200_OK
+    assert response.json()['lazy'] == True
+    french_field_id = response.json()['id']
+    # nothing translated yet
+    assert translate_many.call_count == 0
+    assert FieldRecomputeJob.objects.filter(field_id=french_field_id).count() == 0
+
+    response = api_client.get(
+        f'/api/database/rows/table/{table.id}/?user_field_names=true&size=2',
+        format="json",
+        HTTP_AUTHORIZATION=f"JWT {token}",
+    )
+    assert response.status_code == HTTP_200_OK
+    assert [row['French'] for row in response.json()['results']] == [
+        'translation (en to fr): Hello',
+        'translation (en to fr): Goodbye',
+    ]
+    # the page, in one batch
+    translate_many.assert_called_once_with(['Hello', 'Goodbye'], 'en', 'fr', engine='')
+
+    # the translations were stored, the third row is still pending
+    model = table.get_model()
+    assert [getattr(row, f'field_{french_field_id}')
+            for row in model.objects.order_by('id')] == [
+        'translation (en to fr): Hello',
+        'translation (en to fr): Goodbye',
+        None,
+    ]
+
+    # reading the page again doesn't translate anything
+    response = api_client.get(
+        f'/api/database/rows/table/{table.id}/?user_field_names=true&size=2',
+        format="json",
+        HTTP_AUTHORIZATION=f"JWT {token}",
+    )
+    assert response.status_code == HTTP_200_OK
+    assert translate_many.call_count == 2
+    assert translate_many.call_args[0][0] == []
@@ -0,0 +1,106 @@
+"""
+shared by the benchmarks: a deterministic fake engine with configurable latency, standing in
+for argos translate and the chatgpt API, and synthetic tables. the benchmarks are skipped by
+default, run them with `pytest -m benchmark`, the timings are shown at the end. sizes and
+latencies come from environment variables, e.g.
+
+BENCHMARK_TABLE_ROWS=1000000 BENCHMARK_ENGINE_CALL_LATENCY_MS=50 pytest -m benchmark baserow_translate_plugin/benchmarks
+"""
+
+import math
+import os
+import time
+
+from django.conf import settings
+
+from baserow.contrib.database.fields.handler import FieldHandler
+
+from baserow_translate_plugin.chatgpt_scheduler import estimate_tokens
+
+TABLE_ROWS = int(os.getenv('BENCHMARK_TABLE_ROWS', '10000'))
+# fixed cost of each call to the engine (loading the batch, HTTP round-trip)
+CALL_LATENCY = float(os.getenv('BENCHMARK_ENGINE_CALL_LATENCY_MS', '20')) / 1000
+# cost of each text within a call
+TEXT_LATENCY = float(os.getenv('BENCHMARK_ENGINE_TEXT_LATENCY_MS', '0.5')) / 1000
+# one in this many rows has a distinct source text, tables repeat values
+DISTINCT_EVERY = int(os.getenv('BENCHMARK_DISTINCT_EVERY', '10'))
+
+# the timings, shown at the end of the run (see conftest.py)
+results = []
+
+
+class FakeEngine:
+    """translations and completions are derived from the input, so results can be checked.
+    counts the calls and texts, to compare with the timings"""
+
+    def __init__(self, call_latency, text_latency):
+        self.call_latency = call_latency
+        self.text_latency = text_latency
+        self.calls = 0
+        self.texts = 0
+
+    def translate_batch(self, texts, source_language, target_language, parallel=False,
+                        engine=None):
+        self.calls += 1
+        self.texts += len(texts)
+        time.sleep(self.call_latency + self.text_latency * len(texts))
+        return [f'{target_language}: {text}' for text in texts]
+
+    def chatgpt_batch(self, prompts, usage=None):
+        # one request per prompt, BASEROW_TRANSLATE_PLUGIN_CHATGPT_CONCURRENCY at a time
+        self.calls += len(prompts)
+        self.texts += len(prompts)
+        rounds = math.ceil(len(prompts) / settings.BASEROW_TRANSLATE_PLUGIN_CHATGPT_CONCURRENCY)
+        time.sleep(rounds * self.call_latency + self.text_latency * len(prompts))
+        completions = [f'completion: {prompt}' for prompt in prompts]
+        if usage != None:
+            # what the API would report, see budgets.TokenUsage
+            for prompt, completion in zip(prompts, completions):
+                usage.add(estimate_tokens(prompt) + estimate_tokens(completion))
+        return completions
+
+
+def synthetic_text(i):
+    return f'Product number {i // DISTINCT_EVERY} is very useful. It comes in many colors.'
+
+
+def create_synthetic_table(data_fixture, rows):
+    """returns (user, table, source field), the source field is filled with rows texts"""
+    user = data_fixture.create_user()
+    database = data_fixture.create_database_application(user=user)
+    table = data_fixture.create_database_table(user=user, database=database)
+    source_field = data_fixture.create_text_field(table=table, name='English')
+    model = table.get_model()
+    model.objects.bulk_create(
+        [model(**{source_field.db_column: synthetic_text(i)}, order=i + 1) for i in range(rows)],
+        batch_size=10000
+    )
+    return user, table, source_field
+
+
+def create_translation_field(user, table, source_field, target_language='fr'):
+    # the recompute job is only started when the transaction commits, which doesn't happen
+    # in these (non transactional) tests
+    return FieldHandler().create_field(user, table, 'translation', name=f'Translation {target_language}',
+                                       source_field_id=source_field.id, source_language='en',
+                                       target_language=target_language)
+
+
+def create_chatgpt_field(user, table, source_field):
+    return FieldHandler().create_field(user, table, 'chatgpt', name='Summary',
+                                       prompt=f'Summarize in one word: {{{source_field.name}}}')
+
+
+def measure(function):
+    start = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start, result
+
+
+def report(name, rows, seconds, engine=None):
+    line = f'{name}: {seconds:.3f}s, {rows / seconds:.0f} rows/s'
+    if engine != None:
+        line += f', {engine.calls} engine calls, {engine.texts} texts'
+        engine.calls = 0
+        engine.texts = 0
+    results.append(line)
@@ -0,0 +1,29 @@
+"""
+the fake_engine fixture replaces the translation engine and the chatgpt API with the fake
+engine from benchmark_utils.py. the timings reported by the benchmarks are shown at the end of
+the run
+"""
+
+import pytest
+
+import baserow_translate_plugin.translation
+
+from benchmark_utils import CALL_LATENCY, TEXT_LATENCY, FakeEngine, results
+
+
+@pytest.fixture
+def fake_engine(mocker):
+    baserow_translate_plugin.translation.TEST_MODE = True
+    engine = FakeEngine(CALL_LATENCY, TEXT_LATENCY)
+    mocker.patch.object(baserow_translate_plugin.translation, 'translate_batch_uncached',
+                        engine.translate_batch)
+    mocker.patch.object(baserow_translate_plugin.translation, 'chatgpt_batch_uncached',
+                        engine.chatgpt_batch)
+    return engine
+
+
+def pytest_terminal_summary(terminalreporter):
+    if len(results) > 0:
+        terminalreporter.section('benchmarks')
+        for line in results:
+            terminalreporter.write_line(line)
@@ -0,0 +1,56 @@
+"""
+full-table recomputation (translate_all_rows / chatgpt_all_rows) on a synthetic table of
+BENCHMARK_TABLE_ROWS rows (10k by default, try 1M): with an empty translation memory, and
+again with nothing changed, where every row is skipped.
+"""
+
+import pytest
+
+import baserow_translate_plugin.translation
+from baserow_translate_plugin.cache import get_translation_cache, get_chatgpt_cache
+
+from benchmark_utils import TABLE_ROWS, create_synthetic_table, create_translation_field, \
+    create_chatgpt_field, measure, report
+
+pytestmark = pytest.mark.benchmark
+
+
+@pytest.mark.django_db
+def test_translate_all_rows_benchmark(data_fixture, fake_engine):
+    user, table, source_field = create_synthetic_table(data_fixture, TABLE_ROWS)
+    field = create_translation_field(user, table, source_field)
+    get_translation_cache().clear()
+
+    def run():
+        return baserow_translate_plugin.translation.translate_all_rows(
+            table.id, source_field.db_column, field.db_column, 'en', 'fr', field_id=field.id)
+
+    seconds, completed = measure(run)
+    assert completed
+    report('translate_all_rows, cold', TABLE_ROWS, seconds, fake_engine)
+
+    seconds, completed = measure(run)
+    report('translate_all_rows, unchanged', TABLE_ROWS, seconds, fake_engine)
+
+    # the text is translated sentence by sentence
+    row = table.get_model().objects.order_by('id').first()
+    assert getattr(row, field.db_column) == \
+        'fr: Product number 0 is very useful. fr: It comes in many colors.'
+
+
+@pytest.mark.django_db
+def test_chatgpt_all_rows_benchmark(data_fixture, fake_engine):
+    user, table, source_field = create_synthetic_table(data_fixture, TABLE_ROWS)
+    field = create_chatgpt_field(user, table, source_field)
+    get_chatgpt_cache().clear()
+
+    def run():
+        return baserow_translate_plugin.translation.chatgpt_all_rows(
+            table.id, field.db_column, field.prompt, field_id=field.id)
+
+    seconds, completed = measure(run)
+    assert completed
+    report('chatgpt_all_rows, cold', TABLE_ROWS, seconds, fake_engine)
+
+    seconds, completed = measure(run)
+    report('chatgpt_all_rows, unchanged', TABLE_ROWS, seconds, fake_engine)
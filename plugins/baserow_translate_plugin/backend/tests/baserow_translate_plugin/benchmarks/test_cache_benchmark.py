@@ -0,0 +1,57 @@
+"""
+translation memory and completions cache lookups: entries found in the in-process LRU, and
+entries only found in the database (e.g. computed by another worker), plus translate_many
+end to end when every text is cached.
+"""
+
+import pytest
+
+import baserow_translate_plugin.translation
+from baserow_translate_plugin.cache import TranslationCache, ChatGPTCache, get_translation_cache
+
+from benchmark_utils import DISTINCT_EVERY, synthetic_text, measure, report
+
+ENTRIES = 10000
+
+pytestmark = pytest.mark.benchmark
+
+
+@pytest.mark.django_db
+def test_translation_cache_benchmark(fake_engine):
+    texts = [synthetic_text(i * DISTINCT_EVERY) for i in range(ENTRIES)]
+    cache = TranslationCache(ENTRIES, ENTRIES * 10)
+    cache.set_many({text: f'fr: {text}' for text in texts}, 'en', 'fr', 'test')
+
+    seconds, found = measure(lambda: cache.get_many(texts, 'en', 'fr', 'test'))
+    assert len(found) == ENTRIES
+    report('translation cache, LRU hits', ENTRIES, seconds)
+
+    # a new process: empty LRU, same database
+    database_cache = TranslationCache(ENTRIES, ENTRIES * 10)
+    seconds, found = measure(lambda: database_cache.get_many(texts, 'en', 'fr', 'test'))
+    assert len(found) == ENTRIES
+    report('translation cache, database hits', ENTRIES, seconds)
+
+    get_translation_cache().clear()
+    baserow_translate_plugin.translation.translate_many(texts, 'en', 'fr')
+    fake_engine.calls = 0
+    fake_engine.texts = 0
+    seconds, _ = measure(lambda: baserow_translate_plugin.translation.translate_many(texts, 'en', 'fr'))
+    assert fake_engine.calls == 0
+    report('translate_many, all cached', ENTRIES, seconds)
+
+
+@pytest.mark.django_db
+def test_chatgpt_cache_benchmark():
+    prompts = [f'Summarize in one word: {synthetic_text(i * DISTINCT_EVERY)}' for i in range(ENTRIES)]
+    cache = ChatGPTCache(ENTRIES, ENTRIES * 10)
+    cache.set_many({prompt: 'Useful' for prompt in prompts}, 'test', {})
+
+    seconds, found = measure(lambda: cache.get_many(prompts, 'test', {}))
+    assert len(found) == ENTRIES
+    report('chatgpt cache, LRU hits', ENTRIES, seconds)
+
+    database_cache = ChatGPTCache(ENTRIES, ENTRIES * 10)
+    seconds, found = measure(lambda: database_cache.get_many(prompts, 'test', {}))
+    assert len(found) == ENTRIES
+    report('chatgpt cache, database hits', ENTRIES, seconds)
@@ -0,0 +1,52 @@
+"""
+row_of_dependency_updated, which runs within each row create / update request, for batches
+of 1, 100 and 10k rows: with an empty translation memory, with every text in the translation
+memory, and with nothing changed since the last computation.
+"""
+
+import pytest
+
+from baserow.contrib.database.fields.dependencies.update_collector import FieldUpdateCollector
+from baserow.contrib.database.fields.field_cache import FieldCache
+from baserow.contrib.database.fields.registries import field_type_registry
+
+from baserow_translate_plugin import fingerprints
+from baserow_translate_plugin.cache import get_translation_cache, get_chatgpt_cache
+
+from benchmark_utils import create_synthetic_table, create_translation_field, \
+    create_chatgpt_field, measure, report
+
+pytestmark = pytest.mark.benchmark
+
+
+def run_dependency_update(field, table, rows):
+    field_type = field_type_registry.get_by_model(field)
+    update_collector = FieldUpdateCollector(table, starting_row_ids=[row.id for row in rows])
+    field_cache = FieldCache()
+    field_type.row_of_dependency_updated(field, rows, update_collector, field_cache, [])
+    update_collector.apply_updates_and_get_updated_fields(field_cache)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('batch_size', [1, 100, 10000])
+@pytest.mark.parametrize('field_kind', ['translation', 'chatgpt'])
+def test_row_of_dependency_updated_benchmark(data_fixture, fake_engine, batch_size, field_kind):
+    user, table, source_field = create_synthetic_table(data_fixture, batch_size)
+    if field_kind == 'translation':
+        field = create_translation_field(user, table, source_field)
+    else:
+        field = create_chatgpt_field(user, table, source_field)
+    rows = list(table.get_model().objects.all())
+    get_translation_cache().clear()
+    get_chatgpt_cache().clear()
+
+    name = f'{field_kind} row_of_dependency_updated, {batch_size} rows'
+    seconds, _ = measure(lambda: run_dependency_update(field, table, rows))
+    report(f'{name}, cold', batch_size, seconds, fake_engine)
+
+    fingerprints.clear_fingerprints(field.id)
+    seconds, _ = measure(lambda: run_dependency_update(field, table, rows))
+    report(f'{name}, cached', batch_size, seconds, fake_engine)
+
+    seconds, _ = measure(lambda: run_dependency_update(field, table, rows))
+    report(f'{name}, unchanged', batch_size, seconds, fake_engine)
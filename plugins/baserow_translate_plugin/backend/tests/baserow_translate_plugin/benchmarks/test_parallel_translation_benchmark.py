@@ -0,0 +1,52 @@
+"""
+throughput of the translation process pool with 1/2/4/8 processes, using a CPU-bound fake
+translation (~1ms per text). run with `pytest -m benchmark`.
+"""
+
+import time
+
+import pytest
+
+from baserow_translate_plugin.parallel import create_pool, split_into_shards, \
+    translate_in_processes
+
+from benchmark_utils import results
+
+TEXTS = 1000
+
+
+def fake_translate_shard(texts, source_language, target_language):
+    result = []
+    for text in texts:
+        deadline = time.process_time() + 0.001
+        while time.process_time() < deadline:
+            pass
+        result.append(f'{target_language}: {text}')
+    return result
+
+
+def test_split_into_shards():
+    assert split_into_shards([1, 2, 3, 4, 5], 2) == [[1, 2, 3], [4, 5]]
+    assert split_into_shards([1, 2], 4) == [[1], [2]]
+    assert split_into_shards([], 4) == [[]]
+
+
+@pytest.mark.benchmark
+def test_parallel_translation_benchmark():
+    texts = [f'text {i}' for i in range(TEXTS)]
+    expected = [f'fr: {text}' for text in texts]
+    for processes in [1, 2, 4, 8]:
+        pool = create_pool(processes, initializer=None)
+        try:
+            # start the workers before measuring
+            translate_in_processes(texts[:processes], 'en', 'fr', pool, processes,
+                                   shard_function=fake_translate_shard)
+            start = time.perf_counter()
+            result = translate_in_processes(texts, 'en', 'fr', pool, processes,
+                                            shard_function=fake_translate_shard)
+            elapsed = time.perf_counter() - start
+        finally:
+            pool.shutdown()
+        assert result == expected
+        results.append(f'parallel translation, {processes} processes: '
+                       f'{TEXTS / elapsed:.0f} texts/s')
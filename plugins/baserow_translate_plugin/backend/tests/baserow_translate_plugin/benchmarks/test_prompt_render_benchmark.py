@@ -0,0 +1,48 @@
+"""
+micro-benchmark: cost per row of expanding a chatgpt prompt. run with `pytest -m benchmark`.
+"""
+
+import re
+import timeit
+from types import SimpleNamespace
+
+import pytest
+
+from baserow_translate_plugin.prompt_templates import CompiledPromptTemplate
+
+from benchmark_utils import results
+
+PROMPT = 'Translate the {Category} product "{Name}" into {Language}. Description: {Description}'
+COLUMNS = {'Category': 'field_1', 'Name': 'field_2', 'Language': 'field_3',
+           'Description': 'field_4'}
+ROWS = 10000
+
+
+def make_rows():
+    return [SimpleNamespace(field_1='Kitchen', field_2=f'Product {i}', field_3='French',
+                            field_4='A very useful product. ' * 5) for i in range(ROWS)]
+
+
+def render_with_replace(prompt, rows):
+    """how prompts used to be expanded"""
+    results = []
+    for row in rows:
+        expanded_prompt = prompt
+        for field_name in re.findall(r'{(.*?)}', prompt):
+            field_value = getattr(row, COLUMNS[field_name])
+            expanded_prompt = expanded_prompt.replace('{' + field_name + '}', field_value)
+        results.append(expanded_prompt)
+    return results
+
+
+@pytest.mark.benchmark
+def test_prompt_render_benchmark():
+    rows = make_rows()
+    template = CompiledPromptTemplate(PROMPT, lambda field_name: COLUMNS[field_name])
+    assert [template.render(row) for row in rows] == render_with_replace(PROMPT, rows)
+
+    replace_time = min(timeit.repeat(lambda: render_with_replace(PROMPT, rows), number=1, repeat=3))
+    compiled_time = min(timeit.repeat(lambda: [template.render(row) for row in rows], number=1,
+                                      repeat=3))
+    results.append(f'prompt rendering, per row: str.replace {replace_time / ROWS * 1e6:.2f}us, '
+                   f'compiled template {compiled_time / ROWS * 1e6:.2f}us')
@@ -0,0 +1,99 @@
+from datetime import timedelta
+
+import pytest
+from freezegun import freeze_time
+
+import baserow_translate_plugin.translation
+from baserow_translate_plugin import metrics
+from baserow_translate_plugin.cache import LRUCache, ChatGPTCache, get_translation_cache, \
+    get_chatgpt_cache
+from baserow_translate_plugin.models import TranslationCacheEntry, ChatGPTCacheEntry
+
+
+def test_lru_cache_evicts_least_recently_used():
+    lru = LRUCache(2)
+    lru.set('a', 1)
+    lru.set('b', 2)
+    # 'a' becomes the most recently used
+    assert lru.get('a') == 1
+    lru.set('c', 3)
+    assert lru.get('b') == None
+    assert lru.get('a') == 1
+    assert lru.get('c') == 3
+
+
+@pytest.mark.django_db
+def test_translation_cache(mocker):
+    baserow_translate_plugin.translation.TEST_MODE = True
+    get_translation_cache().clear()
+    metrics.reset()
+    translate_batch_uncached = mocker.spy(baserow_translate_plugin.translation, 'translate_batch_uncached')
+
+    labels = {'source_language': 'en', 'target_language': 'fr'}
+
+    # first call: nothing in the cache
+    result = baserow_translate_plugin.translation.translate_many(['Hello', 'Bye bye'], 'en', 'fr')
+    assert result == ['translation (en to fr): Hello', 'translation (en to fr): Bye bye']
+    # both texts are translated in a single batch
+    translate_batch_uncached.assert_called_once_with(['Hello', 'Bye bye'], 'en', 'fr', False, None)
+    assert TranslationCacheEntry.objects.count() == 2
+    assert metrics.get_counter('translation_cache_misses', **labels) == 2
+
+    # second call: served by the in-process LRU, the engine isn't called
+    result = baserow_translate_plugin.translation.translate_many(['Hello'], 'en', 'fr')
+    assert result == ['translation (en to fr): Hello']
+    assert translate_batch_uncached.call_count == 1
+    assert metrics.get_counter('translation_cache_hits', **labels) == 1
+
+    # another process, with an empty LRU, finds it in the database
+    get_translation_cache().lru.clear()
+    result = baserow_translate_plugin.translation.translate_many(['Bye bye'], 'en', 'fr')
+    assert result == ['translation (en to fr): Bye bye']
+    assert translate_batch_uncached.call_count == 1
+    assert metrics.get_counter('translation_cache_hits', **labels) == 2
+
+    # only keep the most recently used entry
+    assert get_translation_cache().evict(max_entries=1) == 1
+    assert list(TranslationCacheEntry.objects.values_list('translated_text', flat=True)) == [
+        'translation (en to fr): Bye bye']
+
+
+@pytest.mark.django_db
+def test_chatgpt_cache(mocker):
+    baserow_translate_plugin.translation.TEST_MODE = True
+    get_chatgpt_cache().clear()
+    chatgpt_batch_uncached = mocker.spy(baserow_translate_plugin.translation,
+                                        'chatgpt_batch_uncached')
+
+    prompts = ['Translate: Hello', 'Translate: Bye', 'Translate: Hello']
+    result = baserow_translate_plugin.translation.chatgpt_many(prompts)
+    assert result == ['chatgpt: Translate: Hello', 'chatgpt: Translate: Bye',
+                      'chatgpt: Translate: Hello']
+    # identical prompts are only sent once
+    chatgpt_batch_uncached.assert_called_once_with(['Translate: Hello', 'Translate: Bye'],
+                                                   mocker.ANY)
+    assert ChatGPTCacheEntry.objects.count() == 2
+
+    # the field gets re-saved, nothing is sent to chatgpt
+    result = baserow_translate_plugin.translation.chatgpt_many(prompts)
+    assert result == ['chatgpt: Translate: Hello', 'chatgpt: Translate: Bye',
+                      'chatgpt: Translate: Hello']
+    assert chatgpt_batch_uncached.call_count == 1
+
+
+@pytest.mark.django_db
+def test_chatgpt_cache_ttl():
+    chatgpt_cache = ChatGPTCache(lru_size=10, max_entries=10, ttl=timedelta(days=1))
+
+    with freeze_time('2026-01-01 12:00'):
+        chatgpt_cache.set_many({'prompt': 'completion'}, 'gpt-3.5-turbo', {})
+        assert chatgpt_cache.get_many(['prompt'], 'gpt-3.5-turbo', {}) == {'prompt': 'completion'}
+        # other parameters: another key
+        assert chatgpt_cache.get_many(['prompt'], 'gpt-3.5-turbo', {'temperature': 0}) == {}
+
+    with freeze_time('2026-01-03 12:00'):
+        # expired, both in the LRU and in the database
+        assert chatgpt_cache.get_many(['prompt'], 'gpt-3.5-turbo', {}) == {}
+        chatgpt_cache.lru.clear()
+        assert chatgpt_cache.get_many(['prompt'], 'gpt-3.5-turbo', {}) == {}
+        assert chatgpt_cache.evict() == 1
@@ -0,0 +1,56 @@
+import json
+
+import pytest
+
+from baserow_translate_plugin.chatgpt_batching import BATCH_INSTRUCTIONS, MalformedBatchResponse, \
+    build_batch_prompt, pack_prompts, parse_batch_response, run_batched
+
+
+class SequentialScheduler:
+    def run(self, prompts, call, usage=None):
+        return [call(prompt)[0] for prompt in prompts]
+
+
+def test_pack_prompts():
+    # each prompt is 1 token + the overhead of 4
+    assert pack_prompts(['a', 'b', 'c', 'd', 'e'], max_tokens=10, max_prompts=20) == [
+        ['a', 'b'], ['c', 'd'], ['e']]
+    assert pack_prompts(['a', 'b', 'c'], max_tokens=1000, max_prompts=2) == [['a', 'b'], ['c']]
+    # too large for a batch
+    long_prompt = 'x' * 400
+    assert pack_prompts(['a', long_prompt, 'b'], max_tokens=50, max_prompts=20) == [
+        ['a'], [long_prompt], ['b']]
+
+
+def test_parse_batch_response():
+    assert parse_batch_response('["un", "deux"]', 2) == ['un', 'deux']
+    assert parse_batch_response('```json\n["un", "deux"]\n```', 2) == ['un', 'deux']
+    with pytest.raises(MalformedBatchResponse):
+        parse_batch_response('["un"]', 2)
+    with pytest.raises(MalformedBatchResponse):
+        parse_batch_response('un, deux', 2)
+    with pytest.raises(MalformedBatchResponse):
+        parse_batch_response('["un", 2]', 2)
+
+
+def test_run_batched_falls_back_to_single_prompts():
+    requests = []
+
+    def call(prompt):
+        requests.append(prompt)
+        if prompt.startswith(BATCH_INSTRUCTIONS.format(count=2)):
+            batch = json.loads(prompt[prompt.index('['):])
+            if 'broken' in batch:
+                return 'I cannot answer that', 10
+            return json.dumps([prompt.upper() for prompt in batch]), 10
+        return prompt.upper(), 5
+
+    prompts = ['one', 'two', 'three', 'broken']
+    results = run_batched(prompts, SequentialScheduler(), call, max_tokens=1000, max_prompts=2)
+    assert results == ['ONE', 'TWO', 'THREE', 'BROKEN']
+    assert requests == [
+        build_batch_prompt(['one', 'two']),
+        build_batch_prompt(['three', 'broken']),
+        'three',
+        'broken',
+    ]
@@ -0,0 +1,87 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import openai
+import pytest
+
+import baserow_translate_plugin.translation
+from baserow_translate_plugin.chatgpt_scheduler import ChatGPTScheduler, TokenBucket
+
+
+class StubOpenAIHandler(BaseHTTPRequestHandler):
+    """answers chat completions with the upper-cased prompt, the first request for each
+    prompt gets a 429"""
+
+    rate_limited_prompts = set()
+    lock = threading.Lock()
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        prompt = body['messages'][0]['content']
+        with self.lock:
+            first_request = prompt not in self.rate_limited_prompts
+            self.rate_limited_prompts.add(prompt)
+        if first_request:
+            self.send_json(429, {'error': {'message': 'Rate limit reached', 'type': 'requests'}},
+                           {'Retry-After': '0'})
+        else:
+            self.send_json(200, {
+                'id': 'chatcmpl-stub',
+                'object': 'chat.completion',
+                'choices': [{'index': 0, 'finish_reason': 'stop',
+                             'message': {'role': 'assistant', 'content': prompt.upper()}}],
+                'usage': {'prompt_tokens': 5, 'completion_tokens': 5, 'total_tokens': 10},
+            })
+
+    def send_json(self, status, data, headers={}):
+        content = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stub_openai_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubOpenAIHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    previous_api_base, previous_api_key = openai.api_base, openai.api_key
+    openai.api_base = f'http://127.0.0.1:{server.server_port}/v1'
+    openai.api_key = 'stub'
+    yield server
+    openai.api_base, openai.api_key = previous_api_base, previous_api_key
+    server.shutdown()
+
+
+def test_scheduler_retries_and_keeps_order(stub_openai_server):
+    scheduler = ChatGPTScheduler(concurrency=4, requests_per_minute=0, tokens_per_minute=0,
+                                 max_retries=3, backoff_seconds=0.01)
+    prompts = [f'prompt {i}' for i in range(10)]
+    results = scheduler.run(prompts, baserow_translate_plugin.translation.call_chatgpt_api)
+    assert results == [f'PROMPT {i}' for i in range(10)]
+
+
+def test_scheduler_gives_up_after_max_retries(stub_openai_server):
+    scheduler = ChatGPTScheduler(concurrency=1, requests_per_minute=0, tokens_per_minute=0,
+                                 max_retries=0)
+    with pytest.raises(openai.error.RateLimitError):
+        scheduler.run(['never seen before'], baserow_translate_plugin.translation.call_chatgpt_api)
+
+
+def test_token_bucket_limits_rate():
+    bucket = TokenBucket(per_minute=600)
+    # the bucket starts full
+    bucket.acquire(600)
+    start = time.monotonic()
+    # 10 units per second
+    bucket.acquire(2)
+    assert time.monotonic() - start >= 0.15
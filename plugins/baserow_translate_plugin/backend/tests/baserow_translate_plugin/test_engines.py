@@ -0,0 +1,132 @@
+import json
+import sys
+import threading
+from types import SimpleNamespace
+
+import responses
+
+from baserow_translate_plugin.engines import TranslationEngine, ArgosEngine, LibreTranslateEngine, \
+    MarianEngine, split_into_batches, translate_in_batches
+
+
+def test_split_into_batches():
+    assert split_into_batches([1, 2, 3, 4, 5], 2) == [[1, 2], [3, 4], [5]]
+    assert split_into_batches([1, 2, 3], None) == [[1, 2, 3]]
+    assert split_into_batches([1, 2, 3], 5) == [[1, 2, 3]]
+
+
+def test_translate_in_batches():
+    """texts are sent in batches of the engine's max batch size, translations keep the order"""
+
+    class RecordingEngine(TranslationEngine):
+        type = 'recording'
+        max_batch_size = 2
+        concurrency = 3
+
+        def __init__(self):
+            super().__init__()
+            self.batches = []
+            self.lock = threading.Lock()
+
+        def translate_batch(self, texts, source_language, target_language, parallel=False):
+            with self.lock:
+                self.batches.append(texts)
+            return [text.upper() for text in texts]
+
+    engine = RecordingEngine()
+    texts = ['a', 'b', 'c', 'd', 'e']
+    assert translate_in_batches(engine, texts, 'en', 'fr') == ['A', 'B', 'C', 'D', 'E']
+    assert sorted(engine.batches) == [['a', 'b'], ['c', 'd'], ['e']]
+
+
+@responses.activate
+def test_libretranslate_engine(settings):
+    settings.BASEROW_TRANSLATE_PLUGIN_LIBRETRANSLATE_URL = 'http://libretranslate:5000/'
+    settings.BASEROW_TRANSLATE_PLUGIN_LIBRETRANSLATE_API_KEY = 'secret'
+    responses.add(responses.POST, 'http://libretranslate:5000/translate',
+                  json={'translatedText': ['Bonjour', 'Au revoir']})
+
+    engine = LibreTranslateEngine()
+    assert engine.translate_batch(['Hello', 'Bye'], 'en', 'fr') == ['Bonjour', 'Au revoir']
+    assert json.loads(responses.calls[0].request.body) == {
+        'q': ['Hello', 'Bye'], 'source': 'en', 'target': 'fr', 'format': 'text',
+        'api_key': 'secret'}
+    assert engine.get_version('en', 'fr') == 'libretranslate:http://libretranslate:5000/'
+
+
+def test_argos_engine_version(mocker):
+    """only the packages used for the pair are part of its version"""
+    get_installed_packages = mocker.patch('argostranslate.package.get_installed_packages')
+    mocker.patch('baserow_translate_plugin.engines.get_packages_mtime', return_value=1)
+    package = lambda from_code, to_code, version: mocker.Mock(
+        from_code=from_code, to_code=to_code, package_version=version)
+    get_installed_packages.return_value = [package('en', 'fr', '1.0'), package('de', 'en', '1.2')]
+
+    engine = ArgosEngine()
+    assert engine.get_version('en', 'fr') == 'argos:en-fr-1.0'
+    # no direct package, through english
+    assert engine.get_version('de', 'fr') == 'argos:de-en-1.2,en-fr-1.0'
+    assert engine.get_version('fr', 'es') == 'argos:'
+    # remembered, even without packages
+    get_installed_packages.reset_mock()
+    assert engine.get_version('fr', 'es') == 'argos:'
+    assert get_installed_packages.call_count == 0
+
+    # installing an unrelated package doesn't change the versions
+    get_installed_packages.return_value.append(package('en', 'de', '1.1'))
+    engine.clear_versions()
+    assert engine.get_version('en', 'fr') == 'argos:en-fr-1.0'
+    assert engine.get_version('de', 'fr') == 'argos:de-en-1.2,en-fr-1.0'
+
+
+def test_argos_engine_version_package_installed_by_another_process(mocker):
+    """the versions are computed again when the package directory changes"""
+    get_installed_packages = mocker.patch('argostranslate.package.get_installed_packages')
+    get_installed_packages.return_value = []
+    get_packages_mtime = mocker.patch('baserow_translate_plugin.engines.get_packages_mtime',
+                                      return_value=1)
+
+    engine = ArgosEngine()
+    assert engine.get_version('en', 'fr') == 'argos:'
+
+    get_installed_packages.return_value = [
+        mocker.Mock(from_code='en', to_code='fr', package_version='1.0')]
+    assert engine.get_version('en', 'fr') == 'argos:'
+    get_packages_mtime.return_value = 2
+    assert engine.get_version('en', 'fr') == 'argos:en-fr-1.0'
+
+
+def test_marian_engine(mocker, settings, tmp_path):
+    """the sentences are sent to the model with the end of sentence token, in one batch"""
+    settings.BASEROW_TRANSLATE_PLUGIN_MARIAN_MODELS_DIR = str(tmp_path)
+
+    class FakeTokenizer:
+        def __init__(self, model_file):
+            self.model_file = model_file
+
+        def encode(self, text, out_type=None):
+            return text.split(' ')
+
+        def decode(self, tokens):
+            return ' '.join(tokens).upper()
+
+    ctranslate2 = mocker.MagicMock()
+    # the model answers with the tokens it was given, minus the end of sentence token
+    ctranslate2.Translator.return_value.translate_batch.side_effect = \
+        lambda tokenized, **kwargs: [SimpleNamespace(hypotheses=[tokens[:-1]])
+                                     for tokens in tokenized]
+    mocker.patch.dict(sys.modules, {
+        'ctranslate2': ctranslate2,
+        'sentencepiece': SimpleNamespace(SentencePieceProcessor=FakeTokenizer),
+    })
+
+    engine = MarianEngine()
+    assert engine.translate_batch(['Hallo Welt.', ' Tschüss. '], 'de', 'fr') == [
+        'HALLO WELT.', 'TSCHÜSS.']
+    ctranslate2.Translator.assert_called_once_with(str(tmp_path / 'de-fr'), device='cpu')
+    translate_batch = ctranslate2.Translator.return_value.translate_batch
+    assert translate_batch.call_count == 1
+    assert translate_batch.call_args[0][0] == [['Hallo', 'Welt.', '</s>'], ['Tschüss.', '</s>']]
+    # the model is kept loaded
+    engine.translate_batch(['Hallo.'], 'de', 'fr')
+    assert ctranslate2.Translator.call_count == 1
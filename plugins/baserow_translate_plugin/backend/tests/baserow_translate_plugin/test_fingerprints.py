@@ -0,0 +1,62 @@
+import threading
+import time
+
+import pytest
+from django.db import connection, transaction
+
+from baserow_translate_plugin.fingerprints import get_changed_fingerprints, store_fingerprints
+from baserow_translate_plugin.models import CellFingerprint
+
+
+@pytest.mark.django_db
+def test_store_fingerprints(data_fixture):
+    field = data_fixture.create_text_field()
+    store_fingerprints(field.id, {1: 'a', 2: 'b'})
+    store_fingerprints(field.id, {2: 'c', 3: 'd'})
+    assert dict(CellFingerprint.objects.filter(field=field).values_list(
+        'row_id', 'fingerprint')) == {1: 'a', 2: 'c', 3: 'd'}
+    assert get_changed_fingerprints(field.id, {1: 'a', 2: 'b', 4: 'e'}) == {2: 'b', 4: 'e'}
+
+
+@pytest.mark.django_db(transaction=True)
+def test_store_fingerprints_concurrent_writers(data_fixture):
+    """e.g. a row edit while the full-table job writes the same cell: the second writer waits
+    for the first one's transaction, then overwrites its fingerprint"""
+    field = data_fixture.create_text_field()
+    first_stored = threading.Event()
+    second_started = threading.Event()
+    errors = []
+
+    def first_writer():
+        try:
+            with transaction.atomic():
+                store_fingerprints(field.id, {1: 'first', 2: 'first'})
+                first_stored.set()
+                second_started.wait(timeout=5)
+                # the second writer is now waiting on our rows
+                time.sleep(0.2)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            connection.close()
+
+    def second_writer():
+        try:
+            first_stored.wait(timeout=5)
+            second_started.set()
+            with transaction.atomic():
+                store_fingerprints(field.id, {2: 'second', 3: 'second'})
+        except Exception as e:
+            errors.append(e)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=first_writer), threading.Thread(target=second_writer)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert dict(CellFingerprint.objects.filter(field=field).values_list(
+        'row_id', 'fingerprint')) == {1: 'first', 2: 'second', 3: 'second'}
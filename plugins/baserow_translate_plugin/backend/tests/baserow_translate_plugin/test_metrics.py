@@ -0,0 +1,57 @@
+import pytest
+
+from baserow_translate_plugin import metrics, metrics_store
+
+
+def test_render_prometheus():
+    metrics.reset()
+    metrics.increment('translation_engine_calls', engine='fake', source_language='en',
+                      target_language='fr')
+    metrics.observe('translation_engine_batch_size', 3, metrics.SIZE_BUCKETS, engine='fake')
+    metrics.set_gauge('dirty_cells', 7)
+
+    output = metrics.render_prometheus()
+    lines = output.splitlines()
+    assert '# TYPE baserow_translate_plugin_translation_engine_calls_total counter' in lines
+    assert ('baserow_translate_plugin_translation_engine_calls_total'
+            '{engine="fake",source_language="en",target_language="fr"} 1') in lines
+    assert 'baserow_translate_plugin_translation_engine_batch_size_bucket{engine="fake",le="2"} 0' in lines
+    assert 'baserow_translate_plugin_translation_engine_batch_size_bucket{engine="fake",le="5"} 1' in lines
+    assert 'baserow_translate_plugin_translation_engine_batch_size_bucket{engine="fake",le="+Inf"} 1' in lines
+    assert 'baserow_translate_plugin_translation_engine_batch_size_sum{engine="fake"} 3' in lines
+    assert 'baserow_translate_plugin_dirty_cells 7' in lines
+
+
+def test_timer_records_errors():
+    metrics.reset()
+    with metrics.timer('chatgpt_api', model='test'):
+        pass
+    with pytest.raises(ValueError):
+        with metrics.timer('chatgpt_api', model='test'):
+            raise ValueError('failed')
+
+    count, total = metrics.get_histogram('chatgpt_api_seconds', model='test')
+    assert count == 2
+    assert metrics.get_counter('chatgpt_api_errors', model='test') == 1
+
+
+@pytest.mark.django_db
+def test_export_sums_processes():
+    metrics.reset()
+    metrics.increment('chatgpt_api_calls', model='test', field_type='chatgpt')
+    metrics.observe('chatgpt_batch_size', 3, metrics.SIZE_BUCKETS)
+    metrics_store.export()
+    # nothing new since the last export
+    metrics_store.export()
+
+    # another process, with its own metrics
+    metrics.reset()
+    metrics.increment('chatgpt_api_calls', 2, model='test', field_type='chatgpt')
+    metrics_store.export()
+
+    lines = metrics.render_prometheus(metrics_store.load_samples()).splitlines()
+    assert ('baserow_translate_plugin_chatgpt_api_calls_total'
+            '{field_type="chatgpt",model="test"} 3') in lines
+    assert 'baserow_translate_plugin_chatgpt_batch_size_bucket{le="5"} 1' in lines
+    assert 'baserow_translate_plugin_chatgpt_batch_size_sum 3' in lines
+    assert 'baserow_translate_plugin_chatgpt_batch_size_count 1' in lines
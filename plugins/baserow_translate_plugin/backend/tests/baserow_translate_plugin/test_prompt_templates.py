@@ -0,0 +1,43 @@
+from types import SimpleNamespace
+
+from baserow_translate_plugin.prompt_templates import CompiledPromptTemplate, \
+    get_compiled_template, get_fields_in_prompt, invalidate_compiled_templates
+
+
+def test_get_fields_in_prompt():
+    assert get_fields_in_prompt('Translate text into {Translation Language}: {Input Text}') == [
+        'Translation Language', 'Input Text']
+
+
+def test_render():
+    columns = {'Translation Language': 'field_1', 'Input Text': 'field_2'}
+    template = CompiledPromptTemplate('Translate {Input Text} into {Translation Language}: {Input Text}',
+                                      lambda field_name: columns[field_name])
+    assert template.source_db_columns == ['field_2', 'field_1']
+
+    row = SimpleNamespace(field_1='Italian', field_2='{Translation Language}')
+    # values are inserted as they are, even when they look like a field reference
+    assert template.render(row) == 'Translate {Translation Language} into Italian: {Translation Language}'
+
+    row = SimpleNamespace(field_1=None, field_2=42)
+    assert template.render(row) == 'Translate 42 into : 42'
+
+
+def test_compiled_template_cache():
+    lookups = []
+
+    def lookup_db_column(field_name):
+        lookups.append(field_name)
+        return 'field_1'
+
+    first = get_compiled_template(1001, 'Summarize: {Text}', lookup_db_column)
+    second = get_compiled_template(1001, 'Summarize: {Text}', lookup_db_column)
+    assert first is second
+    assert lookups == ['Text']
+
+    # new version of the prompt
+    third = get_compiled_template(1001, 'Summarize in French: {Text}', lookup_db_column)
+    assert third is not first
+
+    invalidate_compiled_templates(1001)
+    assert get_compiled_template(1001, 'Summarize: {Text}', lookup_db_column) is not first
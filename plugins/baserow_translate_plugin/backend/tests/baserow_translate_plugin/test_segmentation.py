@@ -0,0 +1,42 @@
+import pytest
+
+import baserow_translate_plugin.translation
+from baserow_translate_plugin.cache import get_translation_cache
+from baserow_translate_plugin.segmentation import split_text, get_segments, join_text
+
+
+def test_split_text():
+    text = '  Hello. How are you?\n\nFine!  Thanks \n'
+    prefix, parts, suffix = split_text(text, max_segment_length=1000)
+    assert prefix == '  '
+    assert suffix == ' \n'
+    assert parts == ['Hello.', ' ', 'How are you?', '\n\n', 'Fine!', '  ', 'Thanks']
+    assert get_segments(parts) == ['Hello.', 'How are you?', 'Fine!', 'Thanks']
+    # putting it back together without translations gives the original text
+    assert join_text(prefix, parts, suffix, {}) == text
+
+
+def test_split_long_sentence():
+    prefix, parts, suffix = split_text('one two three four', max_segment_length=9)
+    assert get_segments(parts) == ['one two', 'three', 'four']
+    assert join_text(prefix, parts, suffix, {}) == 'one two three four'
+
+    prefix, parts, suffix = split_text('abcdefghij', max_segment_length=4)
+    assert get_segments(parts) == ['abcd', 'efgh', 'ij']
+    assert join_text(prefix, parts, suffix, {}) == 'abcdefghij'
+
+
+@pytest.mark.django_db
+def test_translate_many_segments(mocker):
+    baserow_translate_plugin.translation.TEST_MODE = True
+    get_translation_cache().clear()
+    translate_batch_uncached = mocker.spy(baserow_translate_plugin.translation, 'translate_batch_uncached')
+
+    result = baserow_translate_plugin.translation.translate_many(
+        ['Hello. Bye.', 'Hello.\nSee you'], 'en', 'fr')
+    assert result == [
+        'translation (en to fr): Hello. translation (en to fr): Bye.',
+        'translation (en to fr): Hello.\ntranslation (en to fr): See you',
+    ]
+    # sentences shared between texts are translated once
+    translate_batch_uncached.assert_called_once_with(['Hello.', 'Bye.', 'See you'], 'en', 'fr', False, None)
@@ -0,0 +1,71 @@
+import pytest
+
+import baserow_translate_plugin.translation
+from baserow_translate_plugin import metrics
+from baserow_translate_plugin.cache import get_translation_cache
+
+
+@pytest.mark.django_db
+def test_translate_many_deduplicates(mocker):
+    baserow_translate_plugin.translation.TEST_MODE = True
+    get_translation_cache().clear()
+    translate_batch_uncached = mocker.spy(baserow_translate_plugin.translation, 'translate_batch_uncached')
+
+    texts = ['Red', 'Green', None, 'Red', '', 'Green', '  ', 'Red']
+    result = baserow_translate_plugin.translation.translate_many(texts, 'en', 'fr')
+    assert result == [
+        'translation (en to fr): Red',
+        'translation (en to fr): Green',
+        None,
+        'translation (en to fr): Red',
+        '',
+        'translation (en to fr): Green',
+        '  ',
+        'translation (en to fr): Red',
+    ]
+    # each distinct value is only translated once, empty values not at all
+    translate_batch_uncached.assert_called_once_with(['Red', 'Green'], 'en', 'fr', False, None)
+
+
+@pytest.mark.django_db
+def test_translate_many_targets_pivot(mocker):
+    """targets without a direct model share the translation into the pivot language"""
+    baserow_translate_plugin.translation.TEST_MODE = True
+    get_translation_cache().clear()
+    mocker.patch.object(baserow_translate_plugin.translation, 'has_direct_model',
+                        lambda source_language, target_language, engine=None: False)
+    translate_batch_uncached = mocker.spy(baserow_translate_plugin.translation, 'translate_batch_uncached')
+
+    result = baserow_translate_plugin.translation.translate_many_targets(
+        ['Hallo', 'Hallo', None], 'de', ['fr', 'es', 'en'])
+    assert result == {
+        'fr': ['translation (en to fr): translation (de to en): Hallo'] * 2 + [None],
+        'es': ['translation (en to es): translation (de to en): Hallo'] * 2 + [None],
+        'en': ['translation (de to en): Hallo'] * 2 + [None],
+    }
+    # de -> en is only done once
+    assert [call.args[1:3] for call in translate_batch_uncached.call_args_list] == [
+        ('de', 'en'), ('en', 'fr'), ('en', 'es')]
+
+
+@pytest.mark.django_db
+def test_pivot_translations_are_cached(mocker):
+    """translating the same source into another language later reuses the cached
+    translation into the pivot language"""
+    baserow_translate_plugin.translation.TEST_MODE = True
+    get_translation_cache().clear()
+    metrics.reset()
+    mocker.patch.object(baserow_translate_plugin.translation, 'has_direct_model',
+                        lambda source_language, target_language, engine=None: False)
+    translate_batch_uncached = mocker.spy(baserow_translate_plugin.translation, 'translate_batch_uncached')
+
+    assert baserow_translate_plugin.translation.translate('Hallo', 'de', 'fr') == \
+        'translation (en to fr): translation (de to en): Hallo'
+    assert baserow_translate_plugin.translation.translate('Hallo', 'de', 'it') == \
+        'translation (en to it): translation (de to en): Hallo'
+    assert [call.args[1:3] for call in translate_batch_uncached.call_args_list] == [
+        ('de', 'en'), ('en', 'fr'), ('en', 'it')]
+
+    labels = {'source_language': 'de', 'pivot_language': 'en'}
+    assert metrics.get_counter('translation_pivot_segments_translated', **labels) == 1
+    assert metrics.get_counter('translation_pivot_segments_reused', **labels) == 1
@@ -0,0 +1,40 @@
+import os
+import threading
+
+import pytest
+
+from baserow_translate_plugin import translation_service
+from baserow_translate_plugin.translation_service import TranslationServer, \
+    TranslationServiceError
+
+
+def fake_translate_batch(texts, source_language, target_language):
+    if target_language == 'xx':
+        raise ValueError('no translation package installed for en to xx')
+    return [f'{source_language}->{target_language}: {text}' for text in texts]
+
+
+@pytest.fixture
+def translation_server(tmp_path):
+    socket_path = str(tmp_path / 'translation.sock')
+    server = TranslationServer(socket_path, translate_batch=fake_translate_batch)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield socket_path
+    server.shutdown()
+    server.server_close()
+
+
+def test_translate_batch_through_service(translation_server):
+    result = translation_service.translate_batch(['Hello', 'Line 1\nLine 2'], 'en', 'fr',
+                                                 translation_server)
+    assert result == ['en->fr: Hello', 'en->fr: Line 1\nLine 2']
+
+
+def test_translation_service_errors(translation_server, tmp_path):
+    with pytest.raises(TranslationServiceError, match='no translation package'):
+        translation_service.translate_batch(['Hello'], 'en', 'xx', translation_server)
+
+    with pytest.raises(TranslationServiceError, match='could not reach'):
+        translation_service.translate_batch(['Hello'], 'en', 'fr',
+                                            os.path.join(str(tmp_path), 'missing.sock'))
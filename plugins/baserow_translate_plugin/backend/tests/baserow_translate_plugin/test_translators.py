@@ -0,0 +1,131 @@
+import sys
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from baserow_translate_plugin import translators
+from baserow_translate_plugin.translators import ArgosTranslator
+
+
+def test_translate_batch_single_call():
+    """all the sentences go through the model in one call"""
+
+    class FakeArgosTranslator(ArgosTranslator):
+        def __init__(self):
+            self.ct2_translator = object()
+            self.calls = []
+
+        def translate_sentences(self, sentences):
+            self.calls.append(sentences)
+            return [sentence.upper() for sentence in sentences]
+
+    translator = FakeArgosTranslator()
+    result = translator.translate_batch(['Hello.', 'Bye.', 'Good morning'])
+    assert result == ['HELLO.', 'BYE.', 'GOOD MORNING']
+    assert translator.calls == [['Hello.', 'Bye.', 'Good morning']]
+
+
+def test_has_direct_package_never_installs(mocker, settings):
+    """it's called when a row is updated, which mustn't wait for a download"""
+    settings.BASEROW_TRANSLATE_PLUGIN_AUTO_INSTALL_PACKAGES = True
+    mocker.patch('baserow_translate_plugin.packages.is_package_installed', return_value=False)
+    install_package = mocker.patch('baserow_translate_plugin.packages.install_package')
+    assert translators.has_direct_package('de', 'fr') == False
+    assert install_package.call_count == 0
+
+
+class FakeTokenizer:
+    """splits on spaces, decodes to upper case"""
+
+    def __init__(self, model_file):
+        self.model_file = model_file
+
+    def encode(self, text, out_type=None):
+        return text.split(' ')
+
+    def decode(self, tokens):
+        return ' '.join(tokens).upper()
+
+
+@pytest.fixture
+def argos_modules(mocker):
+    """argostranslate, ctranslate2 and sentencepiece, mocked"""
+    argostranslate = mocker.MagicMock()
+    ctranslate2 = mocker.MagicMock()
+    # each sentence comes back as its tokens
+    ctranslate2.Translator.return_value.translate_batch.side_effect = \
+        lambda tokenized, **kwargs: [SimpleNamespace(hypotheses=[tokens]) for tokens in tokenized]
+    mocker.patch.dict(sys.modules, {
+        'argostranslate': argostranslate,
+        'argostranslate.package': argostranslate.package,
+        'argostranslate.translate': argostranslate.translate,
+        'ctranslate2': ctranslate2,
+        'sentencepiece': SimpleNamespace(SentencePieceProcessor=FakeTokenizer),
+    })
+    return SimpleNamespace(argostranslate=argostranslate, ctranslate2=ctranslate2)
+
+
+def test_argos_translator_direct_package(argos_modules, tmp_path, mocker):
+    """with a direct package, its model translates the whole batch in one call"""
+    (tmp_path / 'sentencepiece.model').write_text('')
+    argos_modules.argostranslate.package.get_installed_packages.return_value = [
+        mocker.Mock(from_code='en', to_code='fr', package_path=str(tmp_path), target_prefix='')]
+
+    translator = ArgosTranslator('en', 'fr')
+    assert translator.translate_batch(['Hello world.', ' Bye. ', 'Good morning']) == [
+        'HELLO WORLD.', 'BYE.', 'GOOD MORNING']
+    argos_modules.ctranslate2.Translator.assert_called_once_with(str(tmp_path / 'model'),
+                                                                 device='cpu')
+    ct2_translate_batch = argos_modules.ctranslate2.Translator.return_value.translate_batch
+    assert ct2_translate_batch.call_count == 1
+    assert ct2_translate_batch.call_args[0][0] == [['Hello', 'world.'], ['Bye.'],
+                                                   ['Good', 'morning']]
+    assert argos_modules.argostranslate.translate.get_translation_from_codes.call_count == 0
+
+
+def test_argos_translator_chain_fallback(argos_modules):
+    """without a direct package, argos' translation chain is used"""
+    argos_modules.argostranslate.package.get_installed_packages.return_value = []
+    get_translation_from_codes = argos_modules.argostranslate.translate.get_translation_from_codes
+    get_translation_from_codes.return_value.translate.side_effect = lambda text: f'fr: {text}'
+
+    translator = ArgosTranslator('de', 'fr')
+    assert translator.translate_batch(['Hallo.', 'Tschüss.']) == ['fr: Hallo.', 'fr: Tschüss.']
+    get_translation_from_codes.assert_called_once_with('de', 'fr')
+    assert argos_modules.ctranslate2.Translator.call_count == 0
+
+    get_translation_from_codes.return_value = None
+    with pytest.raises(ValueError):
+        ArgosTranslator('de', 'fr')
+
+
+def test_get_translator_per_pair_lock(mocker):
+    """a slow model load doesn't hold up the other language pairs, and each pair is only
+    loaded once"""
+    mocker.patch.dict(translators._translators, clear=True)
+    mocker.patch.dict(translators._pair_locks, clear=True)
+    mocker.patch('baserow_translate_plugin.translators.install_package_if_missing')
+    other_pair_loaded = threading.Event()
+    loaded_pairs = []
+
+    class SlowTranslator:
+        def __init__(self, source_language, target_language):
+            loaded_pairs.append((source_language, target_language))
+            if target_language == 'fr':
+                # loading en -> fr waits for en -> de
+                assert other_pair_loaded.wait(timeout=5)
+
+    mocker.patch('baserow_translate_plugin.translators.ArgosTranslator', SlowTranslator)
+    results = []
+    load_french = lambda: results.append(translators.get_translator('en', 'fr'))
+    threads = [threading.Thread(target=load_french) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    translators.get_translator('en', 'de')
+    other_pair_loaded.set()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(loaded_pairs) == [('en', 'de'), ('en', 'fr')]
+    assert results[0] is results[1]